@@ -0,0 +1,138 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be served before its deadline"""
+
+    def __init__(self, reason: str, retry_after_seconds: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_seconds = retry_after_seconds
+
+
+class AdmissionController:
+    """Bounded-concurrency gate with a bounded FIFO wait queue.
+
+    At most ``max_in_flight`` requests run at once and at most ``max_queue``
+    wait behind them. A request is rejected up front when the queue is full or
+    when the estimated wait (queue position x average service time / slots)
+    plus its own service time would overrun its deadline, and rejected later
+    if it is still queued when that wait budget runs out. Must be used from a single event loop.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, deadline_seconds: float, sample_size: int = 500):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.deadline_seconds = deadline_seconds
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time = None  # EWMA of seconds spent holding a slot
+        self._wait_times: Deque[float] = deque(maxlen=sample_size)
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_queue_seen = 0
+
+    def _estimated_wait(self, position: int) -> float:
+        if self._service_time is None:
+            return 0.0
+        return math.ceil(position / self.max_in_flight) * self._service_time
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._estimated_wait(len(self._waiters) + 1)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(reason, self._retry_after())
+
+    def _release(self, held_seconds: Optional[float] = None) -> None:
+        if held_seconds is not None:
+            self._service_time = held_seconds if self._service_time is None else 0.8 * self._service_time + 0.2 * held_seconds
+
+        # Hand the slot straight to the next live waiter
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self, deadline_seconds: Optional[float] = None):
+        """Hold one slot for the body of the ``async with`` block"""
+        deadline_seconds = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        queued_at = time.monotonic()
+
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("queue full")
+            # Leave room for the request's own service time inside the deadline
+            max_wait = deadline_seconds - (self._service_time or 0.0)
+            if max_wait <= 0 or self._estimated_wait(len(self._waiters) + 1) > max_wait:
+                raise self._reject("deadline would be exceeded")
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.max_queue_seen = max(self.max_queue_seen, len(self._waiters))
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), max_wait)
+            except asyncio.TimeoutError:
+                if waiter.done():
+                    # Granted a slot just as the deadline hit; give it back
+                    self._release()
+                else:
+                    waiter.cancel()
+                    self._waiters.remove(waiter)
+                self.timed_out += 1
+                raise self._reject("timed out waiting for a slot")
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                else:
+                    waiter.cancel()
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                raise
+
+        started_at = time.monotonic()
+        self._wait_times.append(started_at - queued_at)
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started_at)
+
+    def metrics(self) -> dict:
+        """Current queue depth, wait-time percentiles and admission counters"""
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1)
+
+        return {
+            "name": self.name,
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_queue_seen": self.max_queue_seen,
+            "deadline_ms": int(self.deadline_seconds * 1000),
+            "avg_service_ms": round(self._service_time * 1000, 1) if self._service_time is not None else None,
+            "wait_ms_p50": percentile(0.50),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
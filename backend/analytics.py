@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class AnalyticsCache:
+    """Thread-safe TTL cache for computed analytics payloads"""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached value, or None if it is missing or stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the entry closest to expiry when full"""
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest_key = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest_key]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def clear(self) -> None:
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _percent(numerator: np.ndarray, denominator) -> np.ndarray:
+    """Vectorized percentage rounded half-up like Math.round on the frontend"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.broadcast_to(np.asarray(denominator, dtype=np.float64), numerator.shape)
+    rates = np.zeros_like(numerator)
+    np.divide(numerator * 100.0, denominator, out=rates, where=denominator > 0)
+    return np.floor(rates + 0.5).astype(np.int64)
+
+
+def _group_counts(keys: np.ndarray, present: np.ndarray):
+    """Group rows by key and return (unique keys, present counts, total counts)"""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, minlength=len(unique_keys))
+    presents = np.bincount(inverse, weights=present, minlength=len(unique_keys)).astype(np.int64)
+    return unique_keys, presents, totals
+
+
+def compute_teacher_analytics(
+    records: List[dict],
+    total_students: int,
+    student_names: Dict[int, str],
+    class_names: Dict[int, str]
+) -> dict:
+    """Aggregate compact attendance rows into the analytics page payload.
+
+    ``records`` only needs student_id, class_id, attendance_date and status.
+    """
+    if not records:
+        return {
+            "weeklyStats": [],
+            "monthlyStats": [],
+            "studentPerformance": [],
+            "classComparison": [],
+            "trend": {"slope_per_day": 0.0, "points": []},
+            "overallStats": {
+                "totalStudents": total_students,
+                "averageAttendance": 0,
+                "bestDay": "N/A",
+                "worstDay": "N/A",
+                "totalClasses": 0
+            }
+        }
+
+    # Columnar view of the rows
+    dates = np.array([record["attendance_date"] for record in records])
+    student_ids = np.array([record["student_id"] for record in records], dtype=np.int64)
+    class_ids = np.array([record["class_id"] for record in records], dtype=np.int64)
+    present = np.array([record["status"] == "present" for record in records], dtype=np.float64)
+
+    # Per-date series (rate is relative to the whole roster, as before)
+    date_keys, date_present, date_totals = _group_counts(dates, present)
+    date_rates = _percent(date_present, total_students)
+    weekly_stats = [
+        {
+            "date": str(day),
+            "attendanceRate": int(rate),
+            "present": int(count),
+            "absent": int(total_students - count),
+            "day": date.fromisoformat(str(day)).strftime("%a")
+        }
+        for day, rate, count in zip(date_keys, date_rates, date_present)
+    ]
+
+    # Per-student performance
+    student_keys, student_present, student_totals = _group_counts(student_ids, present)
+    student_rates = _percent(student_present, student_totals)
+    order = np.argsort(-student_rates, kind="stable")
+    student_performance = [
+        {
+            "studentId": str(student_keys[i]),
+            "name": student_names.get(int(student_keys[i]), "Unknown"),
+            "attendanceRate": int(student_rates[i]),
+            "present": int(student_present[i]),
+            "total": int(student_totals[i]),
+            "absent": int(student_totals[i] - student_present[i])
+        }
+        for i in order
+    ]
+
+    # Class comparison
+    class_keys, class_present, class_totals = _group_counts(class_ids, present)
+    class_rates = _percent(class_present, class_totals)
+    class_comparison = [
+        {
+            "classId": int(class_id),
+            "className": class_names.get(int(class_id), "Unknown Class"),
+            "attendanceRate": int(rate),
+            "present": int(count),
+            "total": int(total)
+        }
+        for class_id, rate, count, total in zip(class_keys, class_rates, class_present, class_totals)
+    ]
+
+    # Least-squares trend line over the per-date rates
+    ordinals = np.array([date.fromisoformat(str(day)).toordinal() for day in date_keys], dtype=np.float64)
+    if len(ordinals) >= 2:
+        slope, intercept = np.polyfit(ordinals - ordinals[0], date_rates.astype(np.float64), 1)
+    else:
+        slope, intercept = 0.0, float(date_rates[0])
+    fitted = intercept + slope * (ordinals - ordinals[0])
+    trend = {
+        "slope_per_day": round(float(slope), 3),
+        "points": [
+            {"date": str(day), "attendanceRate": round(float(value), 1)}
+            for day, value in zip(date_keys, fitted)
+        ]
+    }
+
+    best_index = int(np.argmax(date_rates))
+    worst_index = int(np.argmin(date_rates))
+
+    return {
+        "weeklyStats": weekly_stats,
+        "monthlyStats": weekly_stats,
+        "studentPerformance": student_performance,
+        "classComparison": class_comparison,
+        "trend": trend,
+        "overallStats": {
+            "totalStudents": total_students,
+            "averageAttendance": int(_percent(present.sum(), len(records))),
+            "bestDay": weekly_stats[best_index]["day"],
+            "worstDay": weekly_stats[worst_index]["day"],
+            "totalClasses": len(date_keys)
+        }
+    }
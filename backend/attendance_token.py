@@ -0,0 +1,71 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+
+
+class InvalidAttendanceToken(Exception):
+    """Raised when a token is malformed, has a bad signature or has expired"""
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+class AttendanceTokenSigner:
+    """Short-lived HMAC-SHA256 tokens carrying claims the API already verified.
+
+    A token is ``base64url(json claims).base64url(signature)``; the claims
+    include ``exp`` (unix seconds). Tokens are not encrypted, so claims must
+    not hold anything the client may not see.
+    """
+
+    def __init__(self, secret: bytes, ttl_seconds: int = 120):
+        self.secret = secret
+        self.ttl_seconds = ttl_seconds
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self.secret, payload.encode("utf-8"), hashlib.sha256).digest())
+
+    def fingerprint(self, value: str) -> str:
+        """Keyed hash of a value (e.g. a session password) to bind a token to it without revealing it"""
+        return _b64encode(hmac.new(self.secret, value.encode("utf-8"), hashlib.sha256).digest()[:12])
+
+    def issue(self, claims: dict, expires_at: Optional[float] = None) -> str:
+        """Sign claims, expiring after ttl_seconds or at expires_at if that is sooner"""
+        exp = time.time() + self.ttl_seconds
+        if expires_at is not None:
+            exp = min(exp, expires_at)
+        payload = _b64encode(json.dumps({**claims, "exp": int(exp)}, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> dict:
+        """Return the claims of a valid, unexpired token"""
+        try:
+            payload, signature = token.split(".")
+        except (AttributeError, ValueError):
+            raise InvalidAttendanceToken("malformed token")
+
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidAttendanceToken("bad signature")
+
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise InvalidAttendanceToken("malformed token")
+
+        if claims.get("exp", 0) <= time.time():
+            raise InvalidAttendanceToken("token expired")
+        return claims
+
+    def extend(self, token: str, **claims) -> str:
+        """Re-sign a valid token with extra claims, keeping its expiry"""
+        current = self.verify(token)
+        expires_at = current.pop("exp")
+        return self.issue({**current, **claims}, expires_at=expires_at)
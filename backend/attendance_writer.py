@@ -0,0 +1,312 @@
+import glob
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# File locks let a worker recover journals left behind by a dead worker
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    fcntl = None
+    FCNTL_AVAILABLE = False
+
+
+class AttendanceWriteBehind:
+    """Write-behind queue for attendance marks backed by an append-only journal.
+
+    ``enqueue`` returns once the mark is fsynced to this worker's journal; a
+    background thread flushes queued rows in batches every ``flush_interval_ms``
+    or as soon as ``batch_size`` rows are waiting. A failed batch is retried
+    row by row: a row that fails while others in the same pass succeed (e.g.
+    a foreign key to a deleted student), or that has failed
+    ``max_row_attempts`` times, is moved to ``dead-letter.jsonl`` in the
+    journal directory so it cannot block later marks. If every row fails the
+    database is assumed unreachable and the batch is retried with backoff.
+    The journal is replayed on startup, so acknowledged marks survive a crash.
+    """
+
+    def __init__(
+        self,
+        flush_batch: Callable[[List[dict]], None],
+        journal_dir: str,
+        flush_interval_ms: int = 200,
+        batch_size: int = 100,
+        max_retry_delay_seconds: float = 10.0,
+        max_row_attempts: int = 20
+    ):
+        self.flush_batch = flush_batch
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_retry_delay = max_retry_delay_seconds
+        self.max_row_attempts = max(1, max_row_attempts)
+
+        self._pending: List[dict] = []
+        self._seq = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._stop = False
+        self._drain_requested = False
+        self.stats = {"enqueued": 0, "flushed_rows": 0, "flushed_batches": 0, "failed_batches": 0, "dead_lettered": 0, "recovered": 0}
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self.journal_path = os.path.join(journal_dir, f"attendance-{os.getpid()}.jsonl")
+        self.dead_letter_path = os.path.join(journal_dir, "dead-letter.jsonl")
+        self._journal = open(self.journal_path, "a+", encoding="utf-8")
+        if FCNTL_AVAILABLE:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        self._recover()
+
+        self._thread = threading.Thread(target=self._flush_loop, name="attendance-write-behind", daemon=True)
+        self._thread.start()
+
+    # Journal
+
+    def _append(self, entry: dict) -> None:
+        with self._journal_lock:
+            self._journal.write(json.dumps(entry) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    @staticmethod
+    def _unflushed(path: str) -> List[dict]:
+        """Return marks in a journal that have no later flush acknowledgement"""
+        marks: Dict[int, dict] = {}
+        with open(path, "r", encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from a crash mid-write
+                if entry.get("op") == "mark":
+                    marks[entry["seq"]] = entry["row"]
+                elif entry.get("op") == "flushed":
+                    for seq in entry["seqs"]:
+                        marks.pop(seq, None)
+        return [marks[seq] for seq in sorted(marks)]
+
+    def _recover(self) -> None:
+        """Re-queue unflushed marks from this worker's journal and from orphaned ones.
+
+        The recovered marks are written to a fresh journal that atomically
+        replaces this worker's before any orphan is removed, so a crash at any
+        point leaves every acknowledged mark in at least one journal.
+        """
+        rows = []
+        orphans = []  # (path, open locked file), held until the rows are re-journaled
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, "attendance-*.jsonl"))):
+            if os.path.abspath(path) == os.path.abspath(self.journal_path):
+                rows.extend(self._unflushed(path))
+                continue
+
+            orphan = open(path, "r+", encoding="utf-8")
+            if FCNTL_AVAILABLE:
+                try:
+                    fcntl.flock(orphan.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    orphan.close()
+                    continue  # Still owned by a live worker
+            rows.extend(self._unflushed(path))
+            orphans.append((path, orphan))
+
+        entries = []
+        for row in rows:
+            self._seq += 1
+            entries.append({"op": "mark", "seq": self._seq, "row": row})
+        self._replace_journal(entries)
+
+        for path, orphan in orphans:
+            os.remove(path)
+            orphan.close()
+
+        self._pending = [{"seq": entry["seq"], "row": entry["row"]} for entry in entries]
+        self.stats["enqueued"] += len(entries)
+        self.stats["recovered"] = len(entries)
+        if entries:
+            print(f"🔁 Recovered {len(entries)} unflushed attendance marks from journal")
+
+    def _replace_journal(self, entries: List[dict]) -> None:
+        """Atomically swap this worker's journal for one holding just these entries"""
+        tmp_path = self.journal_path + ".tmp"
+        journal = open(tmp_path, "a+", encoding="utf-8")
+        if FCNTL_AVAILABLE:
+            # Lock before the rename so no other worker can take it for an orphan
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        journal.truncate(0)
+        for entry in entries:
+            journal.write(json.dumps(entry) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+
+        if not FCNTL_AVAILABLE:
+            self._journal.close()  # An open file cannot be replaced on Windows
+        os.replace(tmp_path, self.journal_path)
+        self._fsync_dir()
+
+        if FCNTL_AVAILABLE:
+            self._journal.close()
+        self._journal = journal
+
+    def _fsync_dir(self) -> None:
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.journal_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Queue
+
+    def _enqueue_row(self, row: dict) -> None:
+        with self._condition:
+            self._seq += 1
+            seq = self._seq
+            self._append({"op": "mark", "seq": seq, "row": row})
+            self._pending.append({"seq": seq, "row": row})
+            self.stats["enqueued"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+
+    def enqueue(self, row: dict) -> None:
+        """Durably queue an attendance row for the next batched insert"""
+        self._enqueue_row(row)
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def _take_batch(self) -> List[dict]:
+        batch = self._pending[:self.batch_size]
+        del self._pending[:len(batch)]
+        self._in_flight = len(batch)
+        return batch
+
+    def _acknowledge(self, items: List[dict]) -> None:
+        self._append({"op": "flushed", "seqs": [item["seq"] for item in items]})
+
+    def _write_batch(self, batch: List[dict]) -> bool:
+        try:
+            self.flush_batch([item["row"] for item in batch])
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            print(f"⚠️ Attendance batch of {len(batch)} failed, retrying row by row: {e}")
+            return False
+
+        self._acknowledge(batch)
+        self.stats["flushed_rows"] += len(batch)
+        self.stats["flushed_batches"] += 1
+        return True
+
+    def _write_rows(self, batch: List[dict]) -> List[dict]:
+        """Write a failed batch one row at a time; returns the rows to retry later"""
+        failed = []
+        for item in batch:
+            try:
+                self.flush_batch([item["row"]])
+            except Exception as e:
+                item["attempts"] = item.get("attempts", 0) + 1
+                item["error"] = str(e)
+                failed.append(item)
+                continue
+            self._acknowledge([item])
+            self.stats["flushed_rows"] += 1
+
+        if len(failed) == len(batch):
+            # Nothing got through: treat it as an outage, not as bad rows
+            dead = [item for item in failed if item["attempts"] >= self.max_row_attempts]
+        else:
+            dead = failed
+        if dead:
+            self._dead_letter(dead)
+
+        dead_seqs = {item["seq"] for item in dead}
+        return [item for item in failed if item["seq"] not in dead_seqs]
+
+    def _dead_letter(self, items: List[dict]) -> None:
+        """Park rows the database keeps rejecting so they stop blocking the queue"""
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letter:
+            for item in items:
+                dead_letter.write(json.dumps({
+                    "row": item["row"],
+                    "attempts": item.get("attempts", 0),
+                    "error": item.get("error"),
+                    "dead_lettered_at": time.time()
+                }) + "\n")
+            dead_letter.flush()
+            os.fsync(dead_letter.fileno())
+        self._acknowledge(items)
+        self.stats["dead_lettered"] += len(items)
+        print(f"☠️ Moved {len(items)} attendance rows the database keeps rejecting to {self.dead_letter_path}")
+
+    def _flush_loop(self) -> None:
+        retry_delay = self.flush_interval
+        while True:
+            with self._condition:
+                # Flush every interval, or early when a batch fills or a drain is requested
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._drain_requested or self._stop,
+                    self.flush_interval
+                )
+                if not self._pending:
+                    self._drain_requested = False
+                    if self._stop:
+                        return
+                    continue
+                batch = self._take_batch()
+
+            retry = [] if self._write_batch(batch) else self._write_rows(batch)
+            # Back off only when nothing in the batch could be written
+            failed = len(retry) == len(batch)
+            if not failed:
+                retry_delay = self.flush_interval
+
+            with self._condition:
+                if retry:
+                    # Put the rows back at the head so ordering is preserved
+                    self._pending[:0] = retry
+                self._in_flight = 0
+                if not self._pending:
+                    self._compact()
+                self._condition.notify_all()
+
+            if failed:
+                if self._stop:
+                    return
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+
+    def _compact(self) -> None:
+        """Truncate the journal once everything in it has been flushed"""
+        with self._journal_lock:
+            self._journal.seek(0)
+            self._journal.truncate()
+
+    def flush(self, timeout_seconds: float = 10.0) -> bool:
+        """Wake the writer and wait until the queue drains; returns False on timeout"""
+        deadline = time.time() + timeout_seconds
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._drain_requested = True
+                self._condition.notify_all()
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout_seconds: float = 10.0) -> None:
+        """Flush what is queued, then stop; anything left stays in the journal"""
+        drained = self.flush(timeout_seconds)
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        self._thread.join(timeout_seconds)
+        if not drained:
+            print(f"⚠️ {self.pending_count()} attendance marks left in {self.journal_path} for replay")
+        self._journal.close()
@@ -0,0 +1,193 @@
+import bisect
+import json
+import os
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+# The nine periods (9:00 AM to 4:50 PM, with two recesses and lunch) used
+# when no schedule file is configured
+DEFAULT_PERIODS = [
+    (1, "09:00", "09:50"),
+    (2, "09:50", "10:40"),
+    (3, "10:50", "11:40"),  # after first recess
+    (4, "11:40", "12:30"),
+    (5, "12:30", "13:20"),
+    (6, "13:20", "14:10"),  # after lunch break
+    (7, "14:10", "15:00"),
+    (8, "15:10", "16:00"),  # after second recess
+    (9, "16:00", "16:50"),
+]
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_minutes(value: str) -> int:
+    """Minute of the day for an "HH:MM" time"""
+    hours, minutes = value.split(":")[:2]
+    total = int(hours) * 60 + int(minutes)
+    if not 0 <= total <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time of day: {value!r}")
+    return total
+
+
+def format_24hr(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_12hr(minutes: int) -> str:
+    hours, mins = divmod(minutes % MINUTES_PER_DAY, 60)
+    return f"{hours % 12 or 12}:{mins:02d} {'AM' if hours < 12 else 'PM'}"
+
+
+class BellSchedule:
+    """One day's periods, precomputed as sorted minute offsets.
+
+    A period covers [start, end); lookups bisect the start offsets, so they
+    never parse times or scan the list.
+    """
+
+    def __init__(self, name: str, periods: List[Tuple[int, str, str]]):
+        self.name = name
+        parsed = sorted(
+            ((int(slot), parse_minutes(start), parse_minutes(end)) for slot, start, end in periods),
+            key=lambda period: period[1]
+        )
+
+        for (slot, start, end), following in zip(parsed, parsed[1:] + [None]):
+            if end <= start:
+                raise ValueError(f"Schedule {name!r}: slot {slot} ends before it starts")
+            if following and following[1] < end:
+                raise ValueError(f"Schedule {name!r}: slot {slot} overlaps slot {following[0]}")
+        if len({slot for slot, _, _ in parsed}) != len(parsed):
+            raise ValueError(f"Schedule {name!r}: duplicate slot numbers")
+
+        self.periods = parsed
+        self._starts = [start for _, start, _ in parsed]
+        self._boundaries = sorted({minute for _, start, end in parsed for minute in (start, end)})
+        self._by_slot = {slot: (start, end) for slot, start, end in parsed}
+
+    def slot_at(self, minute: int) -> Optional[int]:
+        """Slot number running at a minute of the day, or None between periods"""
+        index = bisect.bisect_right(self._starts, minute) - 1
+        if index >= 0:
+            slot, _, end = self.periods[index]
+            if minute < end:
+                return slot
+        return None
+
+    def next_boundary(self, minute: int) -> Optional[int]:
+        """First period start or end after minute, or None if the day's periods are over"""
+        index = bisect.bisect_right(self._boundaries, minute)
+        return self._boundaries[index] if index < len(self._boundaries) else None
+
+    def period(self, slot_number: int) -> Optional[Tuple[str, str]]:
+        """("HH:MM", "HH:MM") start and end of a slot, or None if the schedule has no such slot"""
+        bounds = self._by_slot.get(slot_number)
+        return (format_24hr(bounds[0]), format_24hr(bounds[1])) if bounds else None
+
+    def slot_numbers(self) -> List[int]:
+        return sorted(self._by_slot)
+
+    def slot_times(self) -> List[dict]:
+        """Periods in the shape /api/current-slot reports them"""
+        return [
+            {
+                "slot": slot,
+                "start_24hr": format_24hr(start),
+                "end_24hr": format_24hr(end),
+                "start_12hr": format_12hr(start),
+                "end_12hr": format_12hr(end)
+            }
+            for slot, start, end in self.periods
+        ]
+
+
+class InstitutionSchedules:
+    """An institution's named bell schedules and when each one runs.
+
+    ``days`` maps day_of_week (1 = Monday ... 7 = Sunday) to a schedule name
+    (None for no classes); ``dates`` overrides specific dates, e.g. exam days
+    or half-days. Days not listed use ``default``.
+    """
+
+    def __init__(self, schedules: Dict[str, BellSchedule], days: Dict[int, Optional[str]] = None,
+                 dates: Dict[str, Optional[str]] = None, default: str = "regular"):
+        self.schedules = schedules
+        self.days = days or {}
+        self.dates = dates or {}
+        self.default = default
+
+        for name in list(self.days.values()) + list(self.dates.values()) + [default]:
+            if name is not None and name not in schedules:
+                raise ValueError(f"Unknown bell schedule: {name!r}")
+
+    def _named(self, name: Optional[str]) -> Optional[BellSchedule]:
+        return self.schedules[name] if name is not None else None
+
+    def for_day(self, day_of_week: int) -> Optional[BellSchedule]:
+        """The weekly schedule for a day_of_week, which timetable slots are laid out on"""
+        return self._named(self.days.get(day_of_week, self.default))
+
+    def for_date(self, day: date) -> Optional[BellSchedule]:
+        """The schedule actually running on a date, after dated overrides"""
+        key = day.isoformat()
+        if key in self.dates:
+            return self._named(self.dates[key])
+        return self.for_day(day.isoweekday())
+
+    def current(self, now: datetime) -> Tuple[Optional[BellSchedule], Optional[int], int]:
+        """(schedule, current slot, seconds until the slot can next change) at now"""
+        schedule = self.for_date(now.date())
+        minute = now.hour * 60 + now.minute
+        second_of_day = minute * 60 + now.second
+
+        if schedule is None:
+            slot, boundary = None, None
+        else:
+            slot, boundary = schedule.slot_at(minute), schedule.next_boundary(minute)
+
+        # After the last period the next change is at midnight, when the next
+        # date's schedule takes over
+        change_at = (boundary if boundary is not None else MINUTES_PER_DAY) * 60
+        return schedule, slot, max(1, change_at - second_of_day)
+
+
+def build_institution(config: dict) -> InstitutionSchedules:
+    schedules = {
+        name: BellSchedule(name, [tuple(period) for period in periods])
+        for name, periods in config["schedules"].items()
+    }
+    return InstitutionSchedules(
+        schedules,
+        days={int(day): name for day, name in config.get("days", {}).items()},
+        dates=config.get("dates", {}),
+        default=config.get("default", "regular")
+    )
+
+
+def load_bell_schedules(path: Optional[str] = None) -> Dict[str, InstitutionSchedules]:
+    """Load per-institution bell schedules from BELL_SCHEDULE_PATH.
+
+    The file is JSON of the form::
+
+        {"institutions": {"default": {
+            "schedules": {"regular": [[1, "09:00", "09:50"], ...],
+                          "half_day": [[1, "09:00", "09:40"], ...],
+                          "exam": [[1, "10:00", "13:00"]]},
+            "days": {"6": "half_day", "7": null},
+            "dates": {"2026-12-01": "exam"}
+        }}}
+
+    Without a file, a "default" institution runs DEFAULT_PERIODS every day.
+    """
+    path = path or os.getenv("BELL_SCHEDULE_PATH")
+    if not path:
+        return {"default": InstitutionSchedules({"regular": BellSchedule("regular", DEFAULT_PERIODS)})}
+
+    with open(path, "r", encoding="utf-8") as schedule_file:
+        config = json.load(schedule_file)
+
+    institutions = {name: build_institution(institution) for name, institution in config["institutions"].items()}
+    if not institutions:
+        raise ValueError(f"No institutions defined in {path}")
+    return institutions
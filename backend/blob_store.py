@@ -0,0 +1,159 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+BLOB_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Magic-number prefixes for the image types the app accepts
+CONTENT_TYPE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def is_blob_key(value: Optional[str]) -> bool:
+    """True if value is a blob key rather than a legacy data:/http URL"""
+    return bool(value) and bool(BLOB_KEY_PATTERN.match(value))
+
+
+def blob_key(data: bytes) -> str:
+    """Content address of a blob: hex SHA-256 of its bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def sniff_content_type(data: bytes) -> str:
+    """Detect an image content type from its leading bytes"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in CONTENT_TYPE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """Content-addressed, write-once storage for image bytes.
+
+    Keys are SHA-256 digests, so identical uploads are stored once and a key
+    always refers to the same bytes.
+    """
+
+    backend_name = "base"
+
+    def put(self, data: bytes) -> str:
+        """Store data (if not already present) and return its key"""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the bytes stored under key, or None"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        """Remove a blob; callers must know it is no longer referenced"""
+        raise NotImplementedError
+
+    def set_variant(self, source_key: str, variant: str, key: str) -> None:
+        """Record that key holds a derived form (e.g. a thumbnail) of source_key"""
+        raise NotImplementedError
+
+    def get_variant(self, source_key: str, variant: str) -> Optional[str]:
+        """Return the key of a derived form of source_key, if one was recorded"""
+        raise NotImplementedError
+
+    def get_with_type(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Return (bytes, content type) for key, or None"""
+        data = self.get(key)
+        return (data, sniff_content_type(data)) if data is not None else None
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under root, fanned out as root/ab/cd/<key>.
+
+    Variant links live in root/variants/<variant>/<source_key> and hold the
+    derived blob's key.
+    """
+
+    backend_name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if not is_blob_key(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _variant_path(self, source_key: str, variant: str) -> str:
+        if not is_blob_key(source_key) or not variant.isalnum():
+            raise ValueError(f"Invalid variant link: {variant!r} of {source_key!r}")
+        return os.path.join(self.root, "variants", variant, source_key)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put(self, data: bytes) -> str:
+        key = blob_key(data)
+        path = self._path(key)
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as blob_file:
+                return blob_file.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def exists(self, key: str) -> bool:
+        return is_blob_key(key) and os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def set_variant(self, source_key: str, variant: str, key: str) -> None:
+        if not is_blob_key(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        self._write_atomic(self._variant_path(source_key, variant), key.encode("ascii"))
+
+    def get_variant(self, source_key: str, variant: str) -> Optional[str]:
+        try:
+            with open(self._variant_path(source_key, variant), "r", encoding="ascii") as link_file:
+                key = link_file.read().strip()
+        except (FileNotFoundError, ValueError):
+            return None
+        return key if is_blob_key(key) else None
+
+
+def create_blob_store(backend: Optional[str] = None) -> BlobStore:
+    """Build the store selected by BLOB_STORE_BACKEND (currently: local)"""
+    backend = (backend or os.getenv("BLOB_STORE_BACKEND", "local")).lower()
+
+    if backend != "local":
+        raise ValueError(f"Unknown blob store backend: {backend}")
+
+    return LocalBlobStore(os.getenv("BLOB_STORE_PATH", "blobs"))
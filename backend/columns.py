@@ -0,0 +1,73 @@
+from typing import Dict, FrozenSet, Tuple
+
+# Every column the backend reads, per table (see database/schema.sql)
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "users": (
+        "id", "firebase_id", "email", "name", "role", "student_id", "subject",
+        "profile_photo_url", "has_profile_photo", "profile_photo_key", "created_at", "updated_at"
+    ),
+    "face_encodings": (
+        "id", "user_id", "encoding", "enrolled_image_url", "thumbnail_key", "created_at", "updated_at"
+    ),
+    "classes": (
+        "id", "name", "subject", "class_code", "description", "teacher_id", "student_count",
+        "created_at", "updated_at"
+    ),
+    "class_enrollments": (
+        "id", "class_id", "student_id", "status", "enrolled_at", "approved_at", "approved_by"
+    ),
+    "timetable_slots": (
+        "id", "class_id", "day_of_week", "start_time", "end_time", "slot_number", "created_at"
+    ),
+    "attendance": (
+        "id", "student_id", "class_id", "slot_number", "day_of_week", "status", "marked_by",
+        "attendance_date", "created_at", "updated_at"
+    ),
+}
+
+# Columns that can hold images or large vectors. They are only selected when
+# a query asks for them by name with include_heavy=True.
+HEAVY_COLUMNS: Dict[str, FrozenSet[str]] = {
+    "users": frozenset({"profile_photo_url"}),
+    "face_encodings": frozenset({"encoding", "enrolled_image_url"}),
+}
+
+
+class HeavyColumnError(ValueError):
+    """A query selected a heavy column without opting in"""
+
+
+def columns(table: str, *names: str, include_heavy: bool = False) -> str:
+    """Build a select list for table.
+
+    With no names, every light column of the table is selected (the safe
+    replacement for "*"). Unknown columns raise ValueError; heavy columns
+    raise HeavyColumnError unless include_heavy is set.
+    """
+    known = TABLE_COLUMNS[table]
+    heavy = HEAVY_COLUMNS.get(table, frozenset())
+    selected = names or tuple(column for column in known if column not in heavy)
+
+    unknown = [column for column in selected if column not in known]
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+
+    requested_heavy = [column for column in selected if column in heavy]
+    if requested_heavy and not include_heavy:
+        raise HeavyColumnError(f"Heavy {table} columns must be requested explicitly: {', '.join(requested_heavy)}")
+
+    return ", ".join(selected)
+
+
+# Column sets per endpoint. Built at import, so a heavy column slipping into
+# any of them stops the app from starting instead of slowing every response.
+USER_PROFILE_COLUMNS = columns("users")
+STUDENT_ROSTER_COLUMNS = columns("users", "id", "firebase_id", "email", "name", "role", "student_id", "created_at", "updated_at")
+CLASS_COLUMNS = columns("classes")
+ENROLLMENT_COLUMNS = columns("class_enrollments")
+TIMETABLE_SLOT_COLUMNS = columns("timetable_slots")
+ATTENDANCE_COLUMNS = columns("attendance")
+
+PROFILE_PHOTO_COLUMNS = columns("users", "profile_photo_url", include_heavy=True)
+ENROLLED_IMAGE_COLUMNS = columns("face_encodings", "enrolled_image_url", "created_at", include_heavy=True)
+FACE_ENCODING_COLUMNS = columns("face_encodings", "encoding", include_heavy=True)
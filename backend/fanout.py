@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+
+class FanOutTimeout(Exception):
+    """Raised when a fan-out's lookups do not all finish before its deadline"""
+
+
+class FanOut:
+    """Runs a handler's independent lookups concurrently.
+
+    Each ``run`` gets its own semaphore, so one request never has more than
+    ``max_concurrency`` lookups in flight, and the whole fan-out must finish
+    within ``timeout_seconds``. Handler latency becomes the slowest lookup
+    rather than the sum of all of them.
+    """
+
+    def __init__(self, max_concurrency: int = 4, timeout_seconds: Optional[float] = 10.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout_seconds = timeout_seconds
+
+        self.runs = 0
+        self.lookups = 0
+        self.timed_out = 0
+        self.failed = 0
+        self._elapsed = None  # EWMA of seconds per fan-out
+
+    async def run(self, *calls: Callable, timeout_seconds: Optional[float] = None) -> list:
+        """Call every function concurrently and return their results in order.
+
+        Plain functions are blocking (Supabase queries) and run on the
+        threadpool; coroutine functions are awaited on the loop. The first
+        failure cancels the remaining lookups and is re-raised. On timeout the
+        remaining lookups are cancelled and FanOutTimeout is raised; a blocking
+        call that already started runs to completion and its result is dropped.
+        """
+        timeout_seconds = self.timeout_seconds if timeout_seconds is None else timeout_seconds
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(call: Callable):
+            async with semaphore:
+                if asyncio.iscoroutinefunction(call):
+                    return await call()
+                return await run_in_threadpool(call)
+
+        started_at = time.monotonic()
+        self.runs += 1
+        self.lookups += len(calls)
+        tasks = [asyncio.ensure_future(run_one(call)) for call in calls]
+        try:
+            return await asyncio.wait_for(asyncio.gather(*tasks), timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise FanOutTimeout(f"{len(calls)} lookups did not finish within {timeout_seconds}s")
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            elapsed = time.monotonic() - started_at
+            self._elapsed = elapsed if self._elapsed is None else 0.8 * self._elapsed + 0.2 * elapsed
+
+    def metrics(self) -> dict:
+        """Fan-out counters and average wall time"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_ms": int(self.timeout_seconds * 1000) if self.timeout_seconds is not None else None,
+            "runs": self.runs,
+            "lookups": self.lookups,
+            "avg_elapsed_ms": round(self._elapsed * 1000, 1) if self._elapsed is not None else None,
+            "timed_out": self.timed_out,
+            "failed": self.failed
+        }
@@ -0,0 +1,141 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+
+class MicroBatcher:
+    """Groups concurrent calls into batches for one batched function.
+
+    ``submit`` queues an item and waits for its result. A batch opens with
+    the first queued item and closes after ``max_wait_ms`` or ``max_batch``
+    items, whichever comes first. ``process_batch`` runs on the threadpool
+    with the batch's items and returns one result per item; a result that is
+    an exception is raised to that caller only. At most
+    ``max_concurrent_batches`` batches run at once; items arriving meanwhile
+    queue up and form the next (larger) batch.
+    """
+
+    def __init__(self, name: str, process_batch: Callable[[list], list], max_batch: int = 8,
+                 max_wait_ms: float = 5.0, max_concurrent_batches: int = 1):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait_seconds = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Deque[Tuple[float, object, asyncio.Future]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.max_batch_seen = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self._wait = None  # EWMA of seconds an item waits for its batch to start
+        self._run = None   # EWMA of seconds per batch
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher is None or self._dispatcher.done():
+            self._loop = loop
+            self._pending = deque()
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._dispatcher = loop.create_task(self._dispatch())
+        return loop
+
+    async def submit(self, item):
+        """Queue one item and return its result once its batch has run"""
+        loop = self._ensure_started()
+        future = loop.create_future()
+        self._pending.append((loop.time(), item, future))
+        self._wakeup.set()
+        return await future
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # Wait for the batch to fill, but never past the first item's deadline
+            deadline = self._pending[0][0] + self.max_wait_seconds
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[float, object, asyncio.Future]]) -> None:
+        try:
+            # Callers that gave up (cancelled) are dropped before the work starts
+            batch = [entry for entry in batch if not entry[2].done()]
+            if not batch:
+                return
+
+            loop = asyncio.get_running_loop()
+            started_at = loop.time()
+            try:
+                results = await run_in_threadpool(self.process_batch, [item for _, item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(batch)} items")
+            except Exception as batch_error:
+                self.failed_batches += 1
+                results = [batch_error] * len(batch)
+
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            self._record(batch, started_at, loop.time())
+        finally:
+            self._slots.release()
+
+    def _record(self, batch: list, started_at: float, finished_at: float) -> None:
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+        wait = sum(started_at - enqueued_at for enqueued_at, _, _ in batch) / size
+        run = finished_at - started_at
+        self._wait = wait if self._wait is None else 0.8 * self._wait + 0.2 * wait
+        self._run = run if self._run is None else 0.8 * self._run + 0.2 * run
+
+    def metrics(self) -> dict:
+        """Batch counts, achieved batch sizes and wait/run times"""
+        return {
+            "name": self.name,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 1),
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "queued": len(self._pending),
+            "batches": self.batches,
+            "items": self.items,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+            "max_batch_size": self.max_batch_seen,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "avg_wait_ms": round(self._wait * 1000, 1) if self._wait is not None else None,
+            "avg_batch_ms": round(self._run * 1000, 1) if self._run is not None else None
+        }
@@ -0,0 +1,149 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class InstantSessionContext:
+    """Class data preloaded for one instant-attendance session.
+
+    Lets validation and duplicate checks during the session window run as
+    in-memory lookups. The attendance unique key stays the source of truth;
+    ``marked`` is only a fast path in front of it.
+    """
+
+    def __init__(self, class_id: int, class_name: str, slot_number: int, attendance_date: str, teacher_id: Optional[int] = None):
+        self.class_id = class_id
+        self.class_name = class_name
+        self.teacher_id = teacher_id
+        self.slot_number = slot_number
+        self.attendance_date = attendance_date
+        self.roster: Dict[str, dict] = {}    # firebase_id -> {id, name, role, enrollment_id, enrollment_status}
+        self.marked: Dict[int, str] = {}     # student_id -> created_at of the existing mark
+        self.encodings: Dict[int, list] = {}  # student_id -> stored face encoding (optional)
+        self._lock = threading.Lock()
+
+    def get_student(self, firebase_id: str) -> Optional[dict]:
+        """Return the roster entry for a student, if preloaded"""
+        with self._lock:
+            return self.roster.get(firebase_id)
+
+    def put_student(self, firebase_id: str, student: dict) -> None:
+        """Add or refresh a roster entry (after auto-enroll or approval)"""
+        with self._lock:
+            self.roster[firebase_id] = student
+
+    def marked_at(self, student_id: int) -> Optional[str]:
+        """Return when the student was marked for this slot, if known"""
+        with self._lock:
+            return self.marked.get(student_id)
+
+    def record_mark(self, student_id: int, marked_at: str) -> None:
+        """Remember a mark so repeat attempts are rejected without a query"""
+        with self._lock:
+            self.marked.setdefault(student_id, marked_at)
+
+    def get_encoding(self, student_id: int) -> Optional[list]:
+        """Return the student's stored face encoding, if loaded"""
+        with self._lock:
+            return self.encodings.get(student_id)
+
+    def put_encoding(self, student_id: int, encoding: list) -> None:
+        """Keep a stored face encoding fetched during the session"""
+        with self._lock:
+            self.encodings[student_id] = encoding
+
+    def attendance_counts(self) -> dict:
+        """Students marked so far over the approved roster (plus anyone marked outside it)"""
+        with self._lock:
+            return self._counts()
+
+    def _counts(self) -> dict:
+        enrolled = {
+            student["id"] for student in self.roster.values()
+            if student.get("role") == "student" and student.get("enrollment_status") == "approved"
+        }
+        return {"present": len(self.marked), "total": len(enrolled | set(self.marked))}
+
+    def attendance_snapshot(self) -> dict:
+        """Counts plus every mark so far, oldest first"""
+        with self._lock:
+            names = {student["id"]: student["name"] for student in self.roster.values()}
+            marks = sorted(self.marked.items(), key=lambda item: str(item[1]))
+            return {
+                **self._counts(),
+                "marks": [
+                    {"student_id": student_id, "student_name": names.get(student_id, "Unknown Student"), "marked_at": marked_at}
+                    for student_id, marked_at in marks
+                ]
+            }
+
+    def claim_mark(self, student_id: int, marked_at: str) -> Optional[str]:
+        """Record a mark unless one exists; returns the existing mark time if so"""
+        with self._lock:
+            existing = self.marked.get(student_id)
+            if existing is None:
+                self.marked[student_id] = marked_at
+            return existing
+
+    def release_mark(self, student_id: int) -> None:
+        """Undo a claim whose write could not be queued"""
+        with self._lock:
+            self.marked.pop(student_id, None)
+
+
+class SessionContextCache:
+    """Per-process cache of InstantSessionContext objects keyed by session key.
+
+    Contexts are loaded on first use in each worker, so sessions created on
+    another worker are still served from memory after one load.
+    """
+
+    def __init__(self):
+        self._contexts: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, (expires_at, _) in self._contexts.items() if expires_at <= now]
+        for key in expired:
+            del self._contexts[key]
+
+    def get(self, key: str) -> Optional[InstantSessionContext]:
+        """Return a live cached context without loading"""
+        now = time.time()
+        with self._lock:
+            entry = self._contexts.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        return None
+
+    def put(self, key: str, context: InstantSessionContext, ttl_seconds: float) -> None:
+        """Cache a context until its session expires"""
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            self._contexts[key] = (now + ttl_seconds, context)
+
+    def get_or_load(self, key: str, ttl_seconds: float, loader: Callable[[], InstantSessionContext]) -> InstantSessionContext:
+        """Return the cached context, loading it once even under concurrent requests"""
+        context = self.get(key)
+        if context is not None:
+            return context
+
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            context = self.get(key)
+            if context is None:
+                context = loader()
+                self.put(key, context, ttl_seconds)
+
+        with self._lock:
+            self._loading.pop(key, None)
+        return context
+
+    def discard(self, key: str) -> None:
+        """Forget a context (session invalidated)"""
+        with self._lock:
+            self._contexts.pop(key, None)
@@ -1,5 +1,7 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import numpy as np
 from PIL import Image
 import io
@@ -12,6 +14,11 @@ from supabase import create_client
 from dotenv import load_dotenv
 import uuid
 import base64
+import hashlib
+import hmac
+import secrets
+import asyncio
+from contextlib import nullcontext
 
 # IST timezone
 IST = pytz.timezone('Asia/Kolkata')
@@ -65,6 +72,52 @@ except ImportError as e:
     liveness_detector = None
     print(f"Enhanced liveness detection not available: {e}. Using basic checks.")
 
+# Server-side analytics (numpy group-bys over compact attendance rows)
+from analytics import AnalyticsCache, compute_teacher_analytics
+
+# TTL session store for instant-attendance passwords
+from session_store import create_session_store
+from instant_session import InstantSessionContext, SessionContextCache
+from attendance_writer import AttendanceWriteBehind
+
+# Content-addressed storage for enrolled images and profile photos
+from blob_store import create_blob_store, is_blob_key, sniff_content_type
+from thumbnails import THUMBNAIL_VARIANT, ThumbnailWorker
+
+# Explicit column sets; heavy image/vector columns are never selected by accident
+from columns import (
+    ATTENDANCE_COLUMNS, CLASS_COLUMNS, ENROLLED_IMAGE_COLUMNS, ENROLLMENT_COLUMNS,
+    FACE_ENCODING_COLUMNS, PROFILE_PHOTO_COLUMNS, STUDENT_ROSTER_COLUMNS,
+    TIMETABLE_SLOT_COLUMNS, USER_PROFILE_COLUMNS, columns
+)
+
+# ETag/304 caching for read-mostly endpoints
+from response_cache import ResponseCache, etag_matches
+
+# Admission control for the CPU-bound face endpoints
+from admission import AdmissionController, AdmissionRejected
+
+# In-process timetable index for timetable and current-class lookups
+from timetable_index import TimetableIndex
+
+# Concurrent fan-out of a handler's independent lookups
+from fanout import FanOut
+
+# Signed tokens carrying what instant-attendance validation already verified
+from attendance_token import AttendanceTokenSigner, InvalidAttendanceToken
+
+# Live feed of instant-attendance marks (Server-Sent Events)
+from mark_feed import MarkFeed, format_sse
+
+# Stateless rotating instant-attendance codes (HMAC of class, slot and time-step)
+from rotating_code import RotatingCodeSigner
+
+# Micro-batching of concurrent face recognition requests
+from inference_batcher import MicroBatcher
+
+# Per-institution bell schedules (period boundaries, half-days, exam days)
+from bell_schedule import load_bell_schedules
+
 # Load environment variables
 load_dotenv()
 
@@ -145,91 +198,238 @@ except Exception as e:
 os.makedirs("temp", exist_ok=True)
 os.makedirs("encodings", exist_ok=True)
 
-def detect_faces_mediapipe(image: np.ndarray):
-    """Detect faces using MediaPipe"""
+# Image bytes live in the blob store; rows keep only the SHA-256 key
+blob_store = create_blob_store()
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "").rstrip("/")
+
+# Query helpers
+
+def fetch_all_rows(build_query, page_size: int = 1000, order_by: str = "id") -> list:
+    """Fetch every row of a query page by page (PostgREST caps rows per response).
+
+    Offset paging needs a stable order, so the query is always ordered by
+    order_by (a unique column) last, after any order it already has.
+    """
+    rows = []
+    offset = 0
+    while True:
+        page = build_query().order(order_by).range(offset, offset + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+def fetch_rows_by_ids(table: str, columns: str, id_column: str, ids, chunk_size: int = 200, apply_filters=None) -> list:
+    """Fetch rows whose id_column is in ids, chunking the in_ filter to keep URLs short"""
+    unique_ids = list(dict.fromkeys(ids))
+    rows = []
+    for start in range(0, len(unique_ids), chunk_size):
+        chunk = unique_ids[start:start + chunk_size]
+
+        def build_query():
+            query = supabase.table(table).select(columns).in_(id_column, chunk)
+            return apply_filters(query) if apply_filters else query
+
+        rows.extend(fetch_all_rows(build_query))
+    return rows
+
+# class_enrollments references users twice (student_id and approved_by), so
+# embedding the enrolled student must name the foreign key column
+ENROLLED_STUDENT = "users!student_id"
+
+def teacher_names_by_id(teacher_ids) -> dict:
+    """Map teacher user ids to names with one batched lookup"""
+    teacher_ids = [teacher_id for teacher_id in teacher_ids if teacher_id]
+    if not teacher_ids:
+        return {}
+    return {teacher["id"]: teacher["name"] for teacher in fetch_rows_by_ids("users", "id, name", "id", teacher_ids)}
+
+def image_url(value: Optional[str], request: Request = None) -> Optional[str]:
+    """Turn a stored image reference into a URL the browser can load.
+
+    Blob keys become /api/blobs/{key} URLs; legacy data: and http URLs pass through.
+    """
+    if not is_blob_key(value):
+        return value
+    base_url = PUBLIC_API_URL or (str(request.base_url).rstrip("/") if request else "")
+    return f"{base_url}/api/blobs/{value}"
+
+def store_enrolled_thumbnail(source_key: str, thumbnail_key: str):
+    """Record a finished thumbnail on every enrollment still using that image"""
+    supabase.table("face_encodings").update({
+        "thumbnail_key": thumbnail_key
+    }).eq("enrolled_image_url", source_key).execute()
+
+# Thumbnails for the enrolled-images listing are built off the request path
+thumbnail_worker = ThumbnailWorker(blob_store, store_enrolled_thumbnail)
+
+# Response cache for read-mostly endpoints; table version counters live in the
+# same kind of shared store as instant sessions so every worker sees bumps
+response_cache = ResponseCache(
+    create_session_store(),
+    max_stale_seconds=int(os.getenv("RESPONSE_CACHE_MAX_STALE_SECONDS", "300"))
+)
+
+def load_timetable_index_data() -> dict:
+    """Read the slots, classes and teacher names the timetable index holds, one paged query per table"""
+    return {
+        "slots": fetch_all_rows(lambda: supabase.table("timetable_slots").select(TIMETABLE_SLOT_COLUMNS)),
+        "classes": fetch_all_rows(lambda: supabase.table("classes").select("id, name, subject, teacher_id")),
+        "teachers": fetch_all_rows(lambda: supabase.table("users").select("id, name").eq("role", "teacher")),
+    }
+
+def load_index_user_id(firebase_id: str) -> Optional[int]:
+    result = supabase.table("users").select("id").eq("firebase_id", firebase_id).execute()
+    return result.data[0]["id"] if result.data else None
+
+def load_index_enrollments(student_id: int) -> list:
+    return supabase.table("class_enrollments").select("class_id, status").eq("student_id", student_id).execute().data or []
+
+# Loaded on first use and reloaded whenever a write bumps one of its tables;
+# user ids and enrollments are fetched per user as they are looked up
+timetable_index = TimetableIndex(
+    load_timetable_index_data,
+    response_cache.versions,
+    load_index_user_id,
+    load_index_enrollments,
+    max_age_seconds=response_cache.max_stale_seconds
+)
+
+# Bell schedules are loaded once; BELL_SCHEDULE_INSTITUTION picks the one used
+# when a request does not name an institution
+bell_schedules = load_bell_schedules()
+DEFAULT_INSTITUTION = os.getenv("BELL_SCHEDULE_INSTITUTION", "default")
+if DEFAULT_INSTITUTION not in bell_schedules:
+    print(f"⚠️ Bell schedule institution '{DEFAULT_INSTITUTION}' not configured, using '{next(iter(bell_schedules))}'")
+    DEFAULT_INSTITUTION = next(iter(bell_schedules))
+print(f"✅ Bell schedules loaded for: {', '.join(bell_schedules)}")
+
+async def cached_response(request: Request, response: Response, name: str, key: str, tables: tuple, build,
+                          cache_control: str = "private, no-cache"):
+    """Serve an endpoint through the response cache.
+
+    The ETag comes from the version counters of the tables the response reads,
+    so a matching If-None-Match is answered with 304 before any database work.
+    """
+    etag = response_cache.etag(name, key, tables)
+    cache_headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=cache_headers)
+
+    body = response_cache.get(etag)
+    if body is None:
+        body = await build()
+        if not isinstance(body, dict) or not body.get("success"):
+            return body
+        response_cache.put(etag, body)
+
+    response.headers.update(cache_headers)
+    return body
+
+def format_marked_time(timestamp: str) -> str:
+    """Format a stored attendance timestamp as a 12-hour IST clock time"""
+    marked_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if marked_time.tzinfo is not None:
+        marked_time = marked_time.astimezone(IST)
+    return marked_time.strftime('%I:%M %p')
+
+def open_face_detector():
+    """A MediaPipe face detector to reuse across several images (closes on exit)"""
+    if not MEDIAPIPE_AVAILABLE:
+        return nullcontext()
+    return mp_face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
+
+def detect_faces_mediapipe(image: np.ndarray, face_detection=None):
+    """Detect faces using MediaPipe (pass an open detector to skip setting one up per image)"""
     if not MEDIAPIPE_AVAILABLE:
         return []
 
+    if face_detection is None:
+        with open_face_detector() as face_detection:
+            return detect_faces_mediapipe(image, face_detection)
+
     try:
         # Convert RGB to BGR for MediaPipe
         image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        results = face_detection.process(image_bgr)
 
-        with mp_face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5) as face_detection:
-            results = face_detection.process(image_bgr)
+        faces = []
+        if results.detections:
+            for detection in results.detections:
+                # Get bounding box
+                bbox = detection.location_data.relative_bounding_box
+                h, w, _ = image.shape
 
-            faces = []
-            if results.detections:
-                for detection in results.detections:
-                    # Get bounding box
-                    bbox = detection.location_data.relative_bounding_box
-                    h, w, _ = image.shape
+                # Convert to absolute coordinates (top, right, bottom, left format like face_recognition)
+                left = int(bbox.xmin * w)
+                top = int(bbox.ymin * h)
+                right = int((bbox.xmin + bbox.width) * w)
+                bottom = int((bbox.ymin + bbox.height) * h)
 
-                    # Convert to absolute coordinates (top, right, bottom, left format like face_recognition)
-                    left = int(bbox.xmin * w)
-                    top = int(bbox.ymin * h)
-                    right = int((bbox.xmin + bbox.width) * w)
-                    bottom = int((bbox.ymin + bbox.height) * h)
+                faces.append((top, right, bottom, left))
 
-                    faces.append((top, right, bottom, left))
-
-            return faces
+        return faces
     except Exception as e:
         print(f"MediaPipe face detection error: {e}")
         return []
 
 def generate_face_encoding(image: np.ndarray, face_location=None):
     """Generate a simple face encoding using image features"""
-    try:
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return generate_face_encodings([image], [face_location])[0]
 
-        if face_location:
-            top, right, bottom, left = face_location
-            face_region = gray[top:bottom, left:right]
-        else:
-            face_region = gray
-
-        # Resize to standard size
-        face_resized = cv2.resize(face_region, (128, 128))
-
-        # Generate simple features (this is a basic approach)
-        # In production, you might want to use a proper face embedding model
-        features = []
-
-        # Histogram features
-        hist = cv2.calcHist([face_resized], [0], None, [32], [0, 256])
-        features.extend(hist.flatten())
-
-        # LBP features (simplified)
-        lbp_features = []
-        for i in range(1, face_resized.shape[0]-1):
-            for j in range(1, face_resized.shape[1]-1):
-                center = face_resized[i, j]
-                code = 0
-                code |= (face_resized[i-1, j-1] >= center) << 7
-                code |= (face_resized[i-1, j] >= center) << 6
-                code |= (face_resized[i-1, j+1] >= center) << 5
-                code |= (face_resized[i, j+1] >= center) << 4
-                code |= (face_resized[i+1, j+1] >= center) << 3
-                code |= (face_resized[i+1, j] >= center) << 2
-                code |= (face_resized[i+1, j-1] >= center) << 1
-                code |= (face_resized[i, j-1] >= center) << 0
-                lbp_features.append(code)
-
-        # Take first 96 LBP features to make total 128
-        features.extend(lbp_features[:96])
-
-        # Ensure exactly 128 features
-        if len(features) > 128:
-            features = features[:128]
-        elif len(features) < 128:
-            features.extend([0] * (128 - len(features)))
-
-        return np.array(features, dtype=np.float64)
+# LBP neighbours in bit order (bit 7 first) as (row, column) offsets from the centre pixel
+LBP_NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+LBP_FEATURE_COUNT = 96
 
-    except Exception as e:
-        print(f"Face encoding generation error: {e}")
-        return np.zeros(128, dtype=np.float64)
+def generate_face_encodings(images: list, face_locations: list) -> np.ndarray:
+    """Face encodings for several images at once, one 128-value row per image.
+
+    Each row is a 32-bin histogram of the 128x128 grayscale face followed by
+    its first 96 LBP codes. Those codes all come from the second pixel row,
+    so only that row is computed, for the whole batch in one set of array
+    comparisons. A face that cannot be encoded gets a row of zeros.
+    """
+    encodings = np.zeros((len(images), 128), dtype=np.float64)
+    faces, rows = [], []
+
+    for row, (image, face_location) in enumerate(zip(images, face_locations)):
+        try:
+            # Convert to grayscale
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+            if face_location:
+                top, right, bottom, left = face_location
+                face_region = gray[top:bottom, left:right]
+            else:
+                face_region = gray
+
+            # Resize to standard size
+            faces.append(cv2.resize(face_region, (128, 128)))
+            rows.append(row)
+        except Exception as e:
+            print(f"Face encoding generation error: {e}")
+
+    if not faces:
+        return encodings
+
+    faces = np.stack(faces)
+
+    # Histogram features
+    for row, face in zip(rows, faces):
+        encodings[row, :32] = cv2.calcHist([face], [0], None, [32], [0, 256]).flatten()
+
+    # LBP features (simplified): codes for centre pixels (1, 1)..(1, 96)
+    width = LBP_FEATURE_COUNT
+    centre = faces[:, 1, 1:1 + width]
+    lbp = np.zeros(centre.shape, dtype=np.int64)
+    for bit, (dy, dx) in zip(range(7, -1, -1), LBP_NEIGHBOURS):
+        neighbour = faces[:, 1 + dy, 1 + dx:1 + dx + width]
+        lbp |= (neighbour >= centre).astype(np.int64) << bit
+    encodings[rows, 32:] = lbp
+
+    return encodings
 
 def compare_face_encodings(encoding1, encoding2, tolerance=0.6):
     """Compare two face encodings"""
@@ -268,7 +468,7 @@ def load_image_from_upload(file: UploadFile) -> np.ndarray:
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error loading image: {str(e)}")
 
-def enhanced_liveness_check(image: np.ndarray) -> dict:
+def enhanced_liveness_check(image: np.ndarray, face_detection=None) -> dict:
     """Enhanced liveness detection using MediaPipe"""
     # Use enhanced liveness detection if available
     if LIVENESS_DETECTION_AVAILABLE and liveness_detector:
@@ -290,7 +490,7 @@ def enhanced_liveness_check(image: np.ndarray) -> dict:
         gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
 
         # Check if face is detected using MediaPipe
-        face_locations = detect_faces_mediapipe(image)
+        face_locations = detect_faces_mediapipe(image, face_detection)
         if len(face_locations) != 1:
             return {
                 "passed": False,
@@ -355,14 +555,83 @@ async def health_check():
         "mediapipe_available": MEDIAPIPE_AVAILABLE,
         "face_recognition_mode": "MediaPipe-only",
         "supabase_available": SUPABASE_AVAILABLE,
-        "liveness_detection_available": LIVENESS_DETECTION_AVAILABLE
+        "liveness_detection_available": LIVENESS_DETECTION_AVAILABLE,
+        "session_store_backend": instant_sessions.backend_name,
+        "attendance_write_behind": attendance_writer.stats if attendance_writer else None,
+        "mark_feed": mark_feed.stats(),
+        "rotating_codes": rotating_codes.stats(),
+        "response_cache": response_cache.stats()
     }
 
+# Face endpoints run in the threadpool behind one admission controller so a
+# burst queues briefly or gets a fast 503 instead of slowing every request
+face_admission = AdmissionController(
+    "face",
+    max_in_flight=int(os.getenv("FACE_MAX_IN_FLIGHT") or os.cpu_count() or 2),
+    max_queue=int(os.getenv("FACE_MAX_QUEUE", "32")),
+    deadline_seconds=int(os.getenv("FACE_REQUEST_DEADLINE_MS", "10000")) / 1000.0
+)
+
+async def run_face_request(handler, *args):
+    """Run a face handler once admitted; reject with 503 + Retry-After when overloaded"""
+    try:
+        async with face_admission.admit():
+            if asyncio.iscoroutinefunction(handler):
+                return await handler(*args)
+            return await run_in_threadpool(handler, *args)
+    except AdmissionRejected as rejection:
+        print(f"⏳ Face request rejected ({rejection.reason}), retry after {rejection.retry_after_seconds}s")
+        raise HTTPException(
+            status_code=503,
+            detail="Face recognition is busy. Please try again shortly.",
+            headers={"Retry-After": str(rejection.retry_after_seconds)}
+        )
+
+@app.get("/metrics/admission")
+async def get_admission_metrics():
+    """Queue depth, wait times and rejections for the face endpoints"""
+    return face_admission.metrics()
+
+# Handlers run their independent Supabase lookups through this: at most
+# FANOUT_MAX_CONCURRENCY at once per request, all done within the deadline
+lookup_fanout = FanOut(
+    max_concurrency=int(os.getenv("FANOUT_MAX_CONCURRENCY", "4")),
+    timeout_seconds=int(os.getenv("FANOUT_DEADLINE_MS", "10000")) / 1000.0
+)
+
+@app.get("/metrics/fanout")
+async def get_fanout_metrics():
+    """Concurrency, timing and timeouts of handler lookup fan-outs"""
+    return lookup_fanout.metrics()
+
 @app.post("/enroll")
 async def enroll_face(
     image: UploadFile = File(...),
     user_id: str = Form(...)
 ):
+    """Enroll a user's face"""
+    return await run_face_request(process_face_enrollment, image, user_id)
+
+@app.post("/recognize")
+async def recognize_face(
+    image: UploadFile = File(...),
+    user_id: str = Form(...),
+    attendance_token: Optional[str] = Form(None)
+):
+    """Recognize a user's face for attendance"""
+    result = await run_face_request(process_face_recognition, image, user_id)
+
+    # Add the face match to an instant-attendance token so /mark can trust it
+    if attendance_token and result.get("recognized"):
+        try:
+            if attendance_tokens.verify(attendance_token).get("fid") != user_id:
+                raise InvalidAttendanceToken("token issued for another student")
+            result["attendance_token"] = attendance_tokens.extend(attendance_token, face=True)
+        except InvalidAttendanceToken as token_error:
+            print(f"⚠️ Attendance token not extended: {token_error}")
+    return result
+
+def process_face_enrollment(image: UploadFile, user_id: str):
     """Enroll a user's face"""
     try:
         # Load image
@@ -432,22 +701,22 @@ async def enroll_face(
                 # Reset file pointer to beginning
                 image.file.seek(0)
                 contents = image.file.read()
-                image_base64 = base64.b64encode(contents).decode('utf-8')
 
-                # Create data URL - this will be used for both profile photo and enrolled image
-                content_type = image.content_type or 'image/jpeg'
-                enrolled_image_url = f"data:{content_type};base64,{image_base64}"
+                # Store the bytes once; both rows reference the same blob key
+                image_key = blob_store.put(contents)
 
                 # Save face encoding with database user ID and enrolled image
                 supabase.table("face_encodings").upsert({
                     "user_id": db_user_id,
                     "encoding": encoding_list,
-                    "enrolled_image_url": enrolled_image_url
+                    "enrolled_image_url": image_key,
+                    "thumbnail_key": None
                 }).execute()
+                thumbnail_worker.submit(image_key)
 
                 # Use the same enrolled image as profile photo
                 supabase.table("users").update({
-                    "profile_photo_url": enrolled_image_url
+                    "profile_photo_url": image_key
                 }).eq("firebase_id", user_id).execute()
 
             except Exception as photo_error:
@@ -472,62 +741,224 @@ async def enroll_face(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Enrollment failed: {str(e)}")
 
-@app.post("/recognize")
-async def recognize_face(
-    image: UploadFile = File(...),
-    user_id: str = Form(...)
-):
-    """Recognize a user's face for attendance"""
+def check_recognition_image(image_array: np.ndarray, face_detection=None):
+    """Check liveness and find the single face to encode.
+
+    Returns (face_location, None), or (None, verdict) with the recognition
+    response to send when the image cannot be matched.
+    """
+    # Enhanced liveness check
+    print("🔍 Starting liveness check...")
+    liveness_result = enhanced_liveness_check(image_array, face_detection)
+    print(f"✅ Liveness check completed: {liveness_result}")
+
+    if not liveness_result["passed"]:
+        print(f"❌ Liveness check failed: {liveness_result['message']}")
+        return None, {
+            "success": True,
+            "recognized": False,
+            "liveness_check": False,
+            "confidence": liveness_result["confidence"],
+            "message": liveness_result["message"],
+            "liveness_details": liveness_result.get("details", {})
+        }
+
+    # Use MediaPipe for face detection and encoding
+    print("🔍 Extracting face encodings with MediaPipe...")
+    face_locations = detect_faces_mediapipe(image_array, face_detection)
+    print(f"✅ Found {len(face_locations)} face(s)")
+
+    if len(face_locations) == 0:
+        print("❌ No face detected in image")
+        return None, {
+            "success": True,
+            "recognized": False,
+            "liveness_check": True,
+            "message": "No face detected in the image."
+        }
+
+    if len(face_locations) > 1:
+        print(f"❌ Multiple faces detected: {len(face_locations)}")
+        return None, {
+            "success": True,
+            "recognized": False,
+            "liveness_check": True,
+            "message": "Multiple faces detected. Please ensure only one face is visible."
+        }
+
+    return face_locations[0], None
+
+def face_match_verdict(matches: bool, distance: float) -> dict:
+    """Recognition response for a compared face"""
+    print(f"✅ Face comparison completed - Match: {matches}, Distance: {distance}")
+
+    if matches:
+        confidence = 1 - distance
+        print(f"🎉 Face recognized successfully! Confidence: {confidence}")
+        return {
+            "success": True,
+            "recognized": True,
+            "liveness_check": True,
+            "confidence": float(confidence),
+            "message": "Face recognized successfully"
+        }
+
+    print(f"❌ Face not recognized. Distance: {distance}")
+    return {
+        "success": True,
+        "recognized": False,
+        "liveness_check": True,
+        "confidence": float(1 - distance),
+        "message": "Face not recognized"
+    }
+
+def match_face_verdict(stored_encoding, unknown_encoding) -> dict:
+    """Compare an upload's encoding with a stored one and build the recognition response"""
+    print("🔍 Comparing faces...")
+    matches, distance = compare_face_encodings(np.array(stored_encoding), unknown_encoding, tolerance=0.6)
+    return face_match_verdict(matches, distance)
+
+def match_face_batch(pairs: list) -> list:
+    """match_face_verdict for many (stored, unknown) encoding pairs with one vectorized distance computation"""
+    print(f"🔍 Comparing {len(pairs)} face(s)...")
     try:
-        print(f"🔍 Face recognition request received for user: {user_id}")
+        stored = np.array([stored_encoding for stored_encoding, _ in pairs], dtype=np.float64)
+        unknown = np.array([unknown_encoding for _, unknown_encoding in pairs], dtype=np.float64)
+        # Same normalized Euclidean distance as compare_face_encodings
+        distances = np.linalg.norm(stored - unknown, axis=1) / 1000.0
+    except (ValueError, TypeError):
+        # Stored encodings of mismatched shape: compare one by one
+        return [match_face_verdict(stored_encoding, unknown_encoding) for stored_encoding, unknown_encoding in pairs]
+    return [face_match_verdict(bool(distance <= 0.6), float(distance)) for distance in distances]
+
+def prepare_recognition_image(image: UploadFile):
+    """Decode an upload, check liveness and find its face (blocking, one image).
+
+    Returns (image_array, face_location, None), or (None, None, verdict) with
+    the response to send when the image cannot be matched.
+    """
+    image_array = load_image_from_upload(image)
+    print(f"✅ Image loaded successfully, shape: {image_array.shape}")
+    with open_face_detector() as face_detection:
+        face_location, verdict = check_recognition_image(image_array, face_detection)
+    return image_array, face_location, verdict
+
+def run_face_batch(items: list) -> list:
+    """Encode and match a batch of (image_array, face_location, stored encoding or None) items.
+
+    Encodes all faces in one pass and matches every item that carries a
+    stored encoding in one vectorized comparison. Each item gets
+    (encoding, verdict): the match response, or None when there was no
+    stored encoding to match against.
+    """
+    encodings = generate_face_encodings(
+        [image_array for image_array, _, _ in items],
+        [face_location for _, face_location, _ in items]
+    )
+    results = [(encoding, None) for encoding in encodings]
+
+    to_match = [index for index, (_, _, stored_encoding) in enumerate(items) if stored_encoding is not None]
+    if to_match:
+        verdicts = match_face_batch([(items[index][2], encodings[index]) for index in to_match])
+        for index, verdict in zip(to_match, verdicts):
+            results[index] = (encodings[index], verdict)
+
+    return results
+
+async def recognize_upload(image: UploadFile, stored_encoding=None):
+    """Run an upload through the face pipeline and return (encoding, verdict).
+
+    Decoding, liveness and detection are per image and run on the threadpool
+    as soon as the request is admitted, so a burst keeps every admitted
+    request busy in parallel; only the encoding and matching of images that
+    pass go through the batcher.
+    """
+    image_array, face_location, verdict = await run_in_threadpool(prepare_recognition_image, image)
+    if verdict:
+        return None, verdict
+    return await face_batcher.submit((image_array, face_location, stored_encoding))
+
+# Faces that pass liveness and detection at about the same time are encoded
+# and matched together: up to FACE_BATCH_MAX_SIZE faces, waiting at most
+# FACE_BATCH_MAX_WAIT_MS for a batch to fill. Requests are admitted first, so
+# batches never exceed FACE_MAX_IN_FLIGHT.
+face_batcher = MicroBatcher(
+    "face",
+    run_face_batch,
+    max_batch=int(os.getenv("FACE_BATCH_MAX_SIZE", "8")),
+    max_wait_ms=float(os.getenv("FACE_BATCH_MAX_WAIT_MS", "5")),
+    max_concurrent_batches=int(os.getenv("FACE_BATCH_CONCURRENCY", "2"))
+)
 
-        # Load image
-        image_array = load_image_from_upload(image)
-        print(f"✅ Image loaded successfully, shape: {image_array.shape}")
-        
-        # Enhanced liveness check
-        print("🔍 Starting liveness check...")
-        liveness_result = enhanced_liveness_check(image_array)
-        print(f"✅ Liveness check completed: {liveness_result}")
+@app.get("/metrics/face-batching")
+async def get_face_batching_metrics():
+    """Achieved batch sizes and wait/run times of the face recognition batcher"""
+    return face_batcher.metrics()
 
-        if not liveness_result["passed"]:
-            print(f"❌ Liveness check failed: {liveness_result['message']}")
-            return {
-                "success": True,
-                "recognized": False,
-                "liveness_check": False,
-                "confidence": liveness_result["confidence"],
-                "message": liveness_result["message"],
-                "liveness_details": liveness_result.get("details", {})
-            }
-        
-        # Use MediaPipe for face detection and encoding
-        print("🔍 Extracting face encodings with MediaPipe...")
-        face_locations = detect_faces_mediapipe(image_array)
-        print(f"✅ Found {len(face_locations)} face(s)")
+def lookup_recognition_encoding(user_id: str):
+    """Return (stored encoding, None) for a user, or (None, verdict) when there is nothing to match against"""
+    if not SUPABASE_AVAILABLE:
+        return None, None
 
-        if len(face_locations) == 0:
-            print("❌ No face detected in image")
-            return {
+    try:
+        # First, get the user's database ID from Firebase ID
+        print(f"🔍 Looking up user in database: {user_id}")
+        user_result = supabase.table("users").select("id").eq("firebase_id", user_id).execute()
+
+        if not user_result.data:
+            print("❌ User not found in database")
+            return None, {
                 "success": True,
                 "recognized": False,
                 "liveness_check": True,
-                "message": "No face detected in the image."
+                "message": "User not found. Please ensure you are registered."
             }
 
-        if len(face_locations) > 1:
-            print(f"❌ Multiple faces detected: {len(face_locations)}")
-            return {
+        db_user_id = user_result.data[0]["id"]
+        print(f"✅ Found user with database ID: {db_user_id}")
+
+        # Get face encoding using database user ID
+        print("🔍 Looking up enrolled face encoding...")
+        result = supabase.table("face_encodings").select(FACE_ENCODING_COLUMNS).eq("user_id", db_user_id).execute()
+
+        if not result.data:
+            print("❌ No enrolled face found")
+            return None, {
                 "success": True,
                 "recognized": False,
                 "liveness_check": True,
-                "message": "Multiple faces detected. Please ensure only one face is visible."
+                "message": "No enrolled face found. Please enroll your face first."
             }
 
-        # Generate face encoding using MediaPipe detection
-        unknown_encoding = generate_face_encoding(image_array, face_locations[0])
-        
-        # Get stored encoding from database
+        print("✅ Found enrolled face encoding")
+        return result.data[0]["encoding"], None
+
+    except Exception as e:
+        return None, {
+            "success": False,
+            "message": f"Database error: {str(e)}"
+        }
+
+async def process_face_recognition(image: UploadFile, user_id: str):
+    """Recognize a user's face for attendance.
+
+    The stored encoding is looked up while the upload goes through the
+    face pipeline; a rejected image is reported before any lookup
+    problem, as before.
+    """
+    try:
+        print(f"🔍 Face recognition request received for user: {user_id}")
+
+        async def encode_upload():
+            return await recognize_upload(image)
+
+        (stored_encoding, lookup_verdict), (unknown_encoding, verdict) = await lookup_fanout.run(
+            lambda: lookup_recognition_encoding(user_id),
+            encode_upload
+        )
+        if verdict:
+            return verdict
+
         if not SUPABASE_AVAILABLE:
             return {
                 "success": True,
@@ -537,73 +968,12 @@ async def recognize_face(
                 "message": "Face recognized successfully (demo mode)"
             }
 
-        try:
-            # First, get the user's database ID from Firebase ID
-            print(f"🔍 Looking up user in database: {user_id}")
-            user_result = supabase.table("users").select("id").eq("firebase_id", user_id).execute()
-
-            if not user_result.data:
-                print("❌ User not found in database")
-                return {
-                    "success": True,
-                    "recognized": False,
-                    "liveness_check": True,
-                    "message": "User not found. Please ensure you are registered."
-                }
-
-            db_user_id = user_result.data[0]["id"]
-            print(f"✅ Found user with database ID: {db_user_id}")
-
-            # Get face encoding using database user ID
-            print("🔍 Looking up enrolled face encoding...")
-            result = supabase.table("face_encodings").select("encoding").eq("user_id", db_user_id).execute()
+        if lookup_verdict:
+            return lookup_verdict
 
-            if not result.data:
-                print("❌ No enrolled face found")
-                return {
-                    "success": True,
-                    "recognized": False,
-                    "liveness_check": True,
-                    "message": "No enrolled face found. Please enroll your face first."
-                }
-
-            # Convert stored encoding back to numpy array
-            print("✅ Found enrolled face encoding, converting to numpy array...")
-            stored_encoding = np.array(result.data[0]["encoding"])
-            print(f"✅ Stored encoding shape: {stored_encoding.shape}")
-
-            # Compare faces using our custom MediaPipe-based comparison
-            print("🔍 Comparing faces...")
-            matches, distance = compare_face_encodings(stored_encoding, unknown_encoding, tolerance=0.6)
-
-            print(f"✅ Face comparison completed - Match: {matches}, Distance: {distance}")
-
-            if matches:
-                confidence = 1 - distance
-                print(f"🎉 Face recognized successfully! Confidence: {confidence}")
-                return {
-                    "success": True,
-                    "recognized": True,
-                    "liveness_check": True,
-                    "confidence": float(confidence),
-                    "message": "Face recognized successfully"
-                }
-            else:
-                print(f"❌ Face not recognized. Distance: {distance}")
-                return {
-                    "success": True,
-                    "recognized": False,
-                    "liveness_check": True,
-                    "confidence": float(1 - distance),
-                    "message": "Face not recognized"
-                }
+        # Compare faces using our custom MediaPipe-based comparison
+        return match_face_verdict(stored_encoding, unknown_encoding)
 
-        except Exception as e:
-            return {
-                "success": False,
-                "message": f"Database error: {str(e)}"
-            }
-            
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recognition failed: {str(e)}")
 
@@ -618,6 +988,7 @@ async def create_user(user_data: dict):
 
     try:
         result = supabase.table("users").insert(user_data).execute()
+        response_cache.bump("users")
         return {
             "success": True,
             "message": "User created successfully",
@@ -639,7 +1010,7 @@ async def get_user_by_firebase_id(firebase_id: str):
         }
 
     try:
-        result = supabase.table("users").select("*").eq("firebase_id", firebase_id).execute()
+        result = supabase.table("users").select(USER_PROFILE_COLUMNS).eq("firebase_id", firebase_id).execute()
         if result.data:
             return {
                 "success": True,
@@ -727,7 +1098,7 @@ async def mark_attendance(attendance_data: dict):
         today = ist_now.date().isoformat()
 
         # Check if attendance already marked today
-        existing_result = supabase.table("attendance").select("*").eq("user_id", db_user_id).eq("date", today).execute()
+        existing_result = supabase.table("attendance").select("id").eq("user_id", db_user_id).eq("date", today).execute()
 
         if existing_result.data:
             return {
@@ -764,8 +1135,27 @@ async def get_user_attendance(firebase_id: str, start_date: str = None, end_date
         }
 
     try:
-        # Get user's database ID
-        user_result = supabase.table("users").select("id").eq("firebase_id", firebase_id).execute()
+        def load_records():
+            # Filtered on the embedded student's firebase_id, so this does not
+            # wait for the user lookup; each record's class comes embedded
+            query = supabase.table("attendance").select(
+                f"{ATTENDANCE_COLUMNS}, classes (id, name, subject, teacher_id), users!inner (firebase_id)"
+            ).eq("users.firebase_id", firebase_id).order("attendance_date", desc=True)
+
+            if start_date:
+                query = query.gte("attendance_date", start_date)
+            if end_date:
+                query = query.lte("attendance_date", end_date)
+
+            return query.execute().data or []
+
+        # User lookup, class-wise attendance and the timetable index (for
+        # teacher names) are independent
+        user_result, records, _ = await lookup_fanout.run(
+            lambda: supabase.table("users").select("id").eq("firebase_id", firebase_id).execute(),
+            load_records,
+            timetable_index.ensure_fresh
+        )
 
         if not user_result.data:
             return {
@@ -773,33 +1163,11 @@ async def get_user_attendance(firebase_id: str, start_date: str = None, end_date
                 "message": "User not found"
             }
 
-        db_user_id = user_result.data[0]["id"]
-
-        # Build query for class-wise attendance
-        query = supabase.table("attendance").select("*").eq("student_id", db_user_id).order("attendance_date", desc=True)
-
-        if start_date:
-            query = query.gte("attendance_date", start_date)
-        if end_date:
-            query = query.lte("attendance_date", end_date)
-
-        result = query.execute()
-
         # Format the response to include class and teacher information
         formatted_data = []
-        for record in result.data or []:
-            # Get class info separately
-            class_info = {}
-            teacher_name = "Unknown Teacher"
-            if record.get("class_id"):
-                class_result = supabase.table("classes").select("id, name, subject, teacher_id").eq("id", record["class_id"]).execute()
-                if class_result.data:
-                    class_info = class_result.data[0]
-                    # Get teacher name
-                    if class_info.get("teacher_id"):
-                        teacher_result = supabase.table("users").select("name").eq("id", class_info["teacher_id"]).execute()
-                        if teacher_result.data:
-                            teacher_name = teacher_result.data[0]["name"]
+        for record in records:
+            class_info = record.get("classes") or {}
+            teacher_name = timetable_index.teacher_name(class_info.get("teacher_id"), default="Unknown Teacher")
 
             formatted_data.append({
                 "id": record["id"],
@@ -837,7 +1205,7 @@ async def get_all_attendance(start_date: str = None, end_date: str = None, teach
 
     try:
         # Build query for class-wise attendance
-        query = supabase.table("attendance").select("*").order("attendance_date", desc=True)
+        query = supabase.table("attendance").select(ATTENDANCE_COLUMNS).order("attendance_date", desc=True)
 
         if start_date:
             query = query.gte("attendance_date", start_date)
@@ -941,7 +1309,7 @@ async def get_all_students():
                 ]
             }
 
-        result = supabase.table("users").select("*").eq("role", "student").execute()
+        result = supabase.table("users").select(STUDENT_ROSTER_COLUMNS).eq("role", "student").execute()
 
         return {
             "success": True,
@@ -1004,7 +1372,7 @@ async def delete_face_encoding(firebase_id: str):
         }
 
 @app.post("/api/profile-photo/{firebase_id}")
-async def save_profile_photo(firebase_id: str, image: UploadFile = File(...)):
+async def save_profile_photo(firebase_id: str, request: Request, image: UploadFile = File(...)):
     """Save profile photo for a user"""
     if not SUPABASE_AVAILABLE:
         return {
@@ -1022,23 +1390,19 @@ async def save_profile_photo(firebase_id: str, image: UploadFile = File(...)):
                 "message": "User not found"
             }
 
-        # Read and encode image as base64
+        # Store the image in the blob store and keep only its key on the row
         contents = await image.read()
-        image_base64 = base64.b64encode(contents).decode('utf-8')
+        photo_key = blob_store.put(contents)
+        thumbnail_worker.submit(photo_key)
 
-        # Create data URL
-        content_type = image.content_type or 'image/jpeg'
-        profile_photo_url = f"data:{content_type};base64,{image_base64}"
-
-        # Update user's profile photo URL
         supabase.table("users").update({
-            "profile_photo_url": profile_photo_url
+            "profile_photo_url": photo_key
         }).eq("firebase_id", firebase_id).execute()
 
         return {
             "success": True,
             "message": "Profile photo saved successfully",
-            "profile_photo_url": profile_photo_url
+            "profile_photo_url": image_url(photo_key, request)
         }
 
     except Exception as e:
@@ -1125,6 +1489,7 @@ async def update_user_profile(firebase_id: str, profile_data: dict):
         # Update user profile
         try:
             result = supabase.table("users").update(update_data).eq("firebase_id", firebase_id).execute()
+            response_cache.bump("users")
         except Exception as db_error:
             return {"success": False, "message": "Failed to update profile. Please try again."}
 
@@ -1144,8 +1509,88 @@ async def update_user_profile(firebase_id: str, profile_data: dict):
             "message": "An unexpected error occurred. Please try again or contact support."
         }
 
+# Total size of thumbnails embedded as data URLs in one batch response
+PROFILE_PHOTO_INLINE_BUDGET_BYTES = int(os.getenv("PROFILE_PHOTO_INLINE_BUDGET_BYTES", "65536"))
+
+def profile_thumbnail_key(photo: Optional[str]) -> Optional[str]:
+    """Thumbnail blob key of a stored profile photo, queueing one if it is not built yet"""
+    if not is_blob_key(photo):
+        return None
+    thumbnail_key = blob_store.get_variant(photo, THUMBNAIL_VARIANT)
+    if thumbnail_key is None:
+        thumbnail_worker.submit(photo)
+    return thumbnail_key
+
+@app.get("/api/profile-photos")
+async def get_profile_photos(
+    request: Request,
+    response: Response,
+    firebase_ids: Optional[str] = None,
+    class_id: Optional[int] = None,
+    inline: bool = False
+):
+    """Get profile photos for many users in one call.
+
+    Pass comma-separated firebase_ids, or a class_id for its approved students.
+    Each entry has a thumbnail_url (once built) and the full photo_url; with
+    inline=true small thumbnails are also embedded until the inline budget is
+    spent. The ETag covers the photo keys, so an unchanged roster revalidates
+    with an empty 304.
+    """
+    if not SUPABASE_AVAILABLE:
+        return {"success": True, "photos": {}}
+
+    if not firebase_ids and class_id is None:
+        return {"success": False, "message": "firebase_ids or class_id is required"}
+
+    try:
+        photo_columns = columns("users", "firebase_id", "profile_photo_url", include_heavy=True)
+
+        if class_id is not None:
+            enrollments = fetch_all_rows(
+                lambda: supabase.table("class_enrollments").select(f"{ENROLLED_STUDENT}!inner ({photo_columns})").eq("class_id", class_id).eq("status", "approved")
+            )
+            users = [enrollment["users"] for enrollment in enrollments if enrollment.get("users")]
+        else:
+            requested_ids = list(dict.fromkeys(fid.strip() for fid in firebase_ids.split(",") if fid.strip()))
+            users = fetch_rows_by_ids("users", photo_columns, "firebase_id", requested_ids)
+
+        photo_keys = {}
+        for user in sorted(users, key=lambda user: user["firebase_id"]):
+            photo = user.get("profile_photo_url")
+            photo_keys[user["firebase_id"]] = (photo, profile_thumbnail_key(photo))
+
+        fingerprint = json.dumps([inline, PROFILE_PHOTO_INLINE_BUDGET_BYTES, list(photo_keys.items())])
+        etag = f'"{hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
+
+        photos = {}
+        inline_budget = PROFILE_PHOTO_INLINE_BUDGET_BYTES
+        for firebase_id, (photo, thumbnail_key) in photo_keys.items():
+            entry = {
+                "photo_url": image_url(photo, request),
+                "thumbnail_url": image_url(thumbnail_key, request)
+            }
+            if inline and thumbnail_key:
+                thumbnail = blob_store.get(thumbnail_key)
+                if thumbnail is not None and len(thumbnail) <= inline_budget:
+                    inline_budget -= len(thumbnail)
+                    encoded = base64.b64encode(thumbnail).decode("utf-8")
+                    entry["thumbnail_data_url"] = f"data:{sniff_content_type(thumbnail)};base64,{encoded}"
+            photos[firebase_id] = entry
+
+        response.headers.update(cache_headers)
+        return {"success": True, "photos": photos}
+
+    except Exception as e:
+        print(f"Error fetching profile photos: {str(e)}")
+        return {"success": False, "message": f"Database error: {str(e)}"}
+
 @app.get("/api/profile-photo/{firebase_id}")
-async def get_profile_photo(firebase_id: str):
+async def get_profile_photo(firebase_id: str, request: Request):
     """Get profile photo for a user"""
     if not SUPABASE_AVAILABLE:
         return {
@@ -1155,7 +1600,7 @@ async def get_profile_photo(firebase_id: str):
 
     try:
         # Get user's profile photo URL
-        user_result = supabase.table("users").select("profile_photo_url").eq("firebase_id", firebase_id).execute()
+        user_result = supabase.table("users").select(PROFILE_PHOTO_COLUMNS).eq("firebase_id", firebase_id).execute()
 
         if not user_result.data:
             return {
@@ -1163,7 +1608,7 @@ async def get_profile_photo(firebase_id: str):
                 "message": "User not found"
             }
 
-        profile_photo_url = user_result.data[0].get("profile_photo_url")
+        profile_photo_url = image_url(user_result.data[0].get("profile_photo_url"), request)
 
         if profile_photo_url:
             return {
@@ -1184,7 +1629,7 @@ async def get_profile_photo(firebase_id: str):
         }
 
 @app.get("/api/enrolled-image/{firebase_id}")
-async def get_enrolled_image(firebase_id: str):
+async def get_enrolled_image(firebase_id: str, request: Request):
     """Get enrolled face image for a user"""
     if not SUPABASE_AVAILABLE:
         return {
@@ -1205,12 +1650,12 @@ async def get_enrolled_image(firebase_id: str):
         db_user_id = user_result.data[0]["id"]
 
         # Get enrolled image from face_encodings table
-        encoding_result = supabase.table("face_encodings").select("enrolled_image_url, created_at").eq("user_id", db_user_id).execute()
+        encoding_result = supabase.table("face_encodings").select(ENROLLED_IMAGE_COLUMNS).eq("user_id", db_user_id).execute()
 
         if encoding_result.data and encoding_result.data[0].get("enrolled_image_url"):
             return {
                 "success": True,
-                "enrolled_image_url": encoding_result.data[0]["enrolled_image_url"],
+                "enrolled_image_url": image_url(encoding_result.data[0]["enrolled_image_url"], request),
                 "enrolled_at": encoding_result.data[0]["created_at"]
             }
         else:
@@ -1227,8 +1672,18 @@ async def get_enrolled_image(firebase_id: str):
         }
 
 @app.get("/api/all-enrolled-images")
-async def get_all_enrolled_images():
-    """Get all enrolled face images for teachers"""
+async def get_all_enrolled_images(
+    request: Request,
+    class_id: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = 48
+):
+    """Get enrolled face images for teachers, one page at a time.
+
+    Pages are keyed on face_encodings.id: pass the previous response's
+    next_cursor as ``after``. ``class_id`` limits the list to approved students
+    of that class.
+    """
     if not SUPABASE_AVAILABLE:
         return {
             "success": True,
@@ -1238,43 +1693,65 @@ async def get_all_enrolled_images():
                     "name": "John Doe",
                     "email": "john@example.com",
                     "student_id": "STU001",
+                    "thumbnail_url": "https://via.placeholder.com/96",
                     "enrolled_image_url": "https://via.placeholder.com/150",
                     "enrolled_at": "2024-01-01T00:00:00Z"
                 }
-            ]
+            ],
+            "next_cursor": None
         }
 
     try:
-        # Get all enrolled images with user information
-        result = supabase.table("face_encodings").select("""
-            enrolled_image_url,
-            created_at,
-            users!inner (
-                firebase_id,
-                name,
-                email,
-                student_id,
-                role
+        limit = max(1, min(limit, 200))
+
+        image_columns = columns("face_encodings", "id", "enrolled_image_url", "thumbnail_key", "created_at", include_heavy=True)
+        user_columns = columns("users", "firebase_id", "name", "email", "student_id", "role")
+        query = supabase.table("face_encodings").select(
+            f"{image_columns}, users!inner ({user_columns})"
+        ).eq("users.role", "student")  # Only include students
+
+        if class_id is not None:
+            enrollments = fetch_all_rows(
+                lambda: supabase.table("class_enrollments").select("student_id").eq("class_id", class_id).eq("status", "approved")
             )
-        """).execute()
+            student_ids = [enrollment["student_id"] for enrollment in enrollments]
+            if not student_ids:
+                return {"success": True, "enrolled_images": [], "next_cursor": None}
+            query = query.in_("user_id", student_ids)
+
+        if after is not None:
+            query = query.gt("id", after)
+
+        # Fetch one extra row to learn whether another page exists
+        result = query.order("id").limit(limit + 1).execute()
+        records = result.data or []
+        has_more = len(records) > limit
+        records = records[:limit]
 
         enrolled_images = []
-        for record in result.data or []:
-            if record.get("enrolled_image_url") and record.get("users"):
-                user_data = record["users"]
-                if user_data.get("role") == "student":  # Only include students
-                    enrolled_images.append({
-                        "firebase_id": user_data["firebase_id"],
-                        "name": user_data["name"],
-                        "email": user_data["email"],
-                        "student_id": user_data["student_id"],
-                        "enrolled_image_url": record["enrolled_image_url"],
-                        "enrolled_at": record["created_at"]
-                    })
+        for record in records:
+            if not record.get("enrolled_image_url") or not record.get("users"):
+                continue
+
+            # Enrollments from before thumbnails existed get one built on first view
+            if not record.get("thumbnail_key") and is_blob_key(record["enrolled_image_url"]):
+                thumbnail_worker.submit(record["enrolled_image_url"])
+
+            user_data = record["users"]
+            enrolled_images.append({
+                "firebase_id": user_data["firebase_id"],
+                "name": user_data["name"],
+                "email": user_data["email"],
+                "student_id": user_data["student_id"],
+                "thumbnail_url": image_url(record.get("thumbnail_key"), request),
+                "enrolled_image_url": image_url(record["enrolled_image_url"], request),
+                "enrolled_at": record["created_at"]
+            })
 
         return {
             "success": True,
-            "enrolled_images": enrolled_images
+            "enrolled_images": enrolled_images,
+            "next_cursor": records[-1]["id"] if has_more else None
         }
 
     except Exception as e:
@@ -1284,6 +1761,92 @@ async def get_all_enrolled_images():
             "message": f"Database error: {str(e)}"
         }
 
+# Image Blob Endpoints
+
+@app.get("/api/blobs/{key}")
+async def get_blob(key: str, request: Request):
+    """Serve an image by content key; keys never change meaning, so responses are immutable"""
+    if not is_blob_key(key):
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        if blob_store.exists(key):
+            return Response(status_code=304, headers=headers)
+
+    blob = blob_store.get_with_type(key)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    data, content_type = blob
+    return Response(content=data, media_type=content_type, headers=headers)
+
+def migrate_image_column(table: str, column: str, batch_size: int = 50) -> dict:
+    """Move legacy data: URLs in table.column into the blob store; returns rows migrated and skipped"""
+    migrated = skipped = 0
+    last_id = 0
+    while True:
+        # Page by id so rows that cannot be migrated are passed over, not re-selected.
+        # Select ids only so the scan itself does not pull the image payloads.
+        id_result = supabase.table(table).select("id").like(column, "data:%").gt("id", last_id).order("id").limit(batch_size).execute()
+        if not id_result.data:
+            return {"migrated": migrated, "skipped": skipped}
+
+        ids = [row["id"] for row in id_result.data]
+        last_id = ids[-1]
+
+        rows = supabase.table(table).select(columns(table, "id", column, include_heavy=True)).in_("id", ids).execute()
+        for row in rows.data or []:
+            data_url = row.get(column) or ""
+            try:
+                if not data_url.startswith("data:") or "," not in data_url:
+                    raise ValueError("not a base64 data URL")
+                key = blob_store.put(base64.b64decode(data_url.split(",", 1)[1], validate=True))
+            except ValueError as decode_error:
+                print(f"⚠️ Skipping {table}.{column} for id {row['id']}: {decode_error}")
+                skipped += 1
+                continue
+            supabase.table(table).update({column: key}).eq("id", row["id"]).execute()
+            migrated += 1
+
+# Maintenance endpoints require this token in the X-Admin-Token header; they
+# are disabled while ADMIN_API_TOKEN is unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+def is_admin_request(request: Request) -> bool:
+    """True when the request carries the configured admin token"""
+    supplied = request.headers.get("x-admin-token") or ""
+    return bool(ADMIN_API_TOKEN) and hmac.compare_digest(supplied.encode("utf-8"), ADMIN_API_TOKEN.encode("utf-8"))
+
+@app.post("/api/blobs/migrate")
+async def migrate_images_to_blob_store(request: Request):
+    """Move base64 images still stored in rows into the blob store (admin only, safe to re-run)"""
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+    if not SUPABASE_AVAILABLE:
+        return {"success": False, "message": "Database not available"}
+
+    try:
+        results = {
+            "face_encodings": await run_in_threadpool(migrate_image_column, "face_encodings", "enrolled_image_url"),
+            "users": await run_in_threadpool(migrate_image_column, "users", "profile_photo_url")
+        }
+        migrated = sum(result["migrated"] for result in results.values())
+        skipped = sum(result["skipped"] for result in results.values())
+        print(f"✅ Migrated images to blob store: {results}")
+        return {
+            "success": True,
+            "data": results,
+            "message": f"Moved {migrated} images into the blob store ({skipped} unreadable rows left in place)"
+        }
+
+    except Exception as e:
+        print(f"Error migrating images: {str(e)}")
+        return {"success": False, "message": f"Failed to migrate images: {str(e)}"}
+
 # Class Management Endpoints
 
 @app.post("/api/classes")
@@ -1328,6 +1891,7 @@ async def create_class(class_data: dict):
         }
 
         result = supabase.table("classes").insert(class_data_insert).execute()
+        response_cache.bump("classes")
 
         if result.data:
             class_id = result.data[0]["id"]
@@ -1399,6 +1963,7 @@ async def update_class(class_id: int, class_data: dict):
         }
 
         result = supabase.table("classes").update(update_data).eq("id", class_id).execute()
+        response_cache.bump("classes")
 
         if result.data:
             return {
@@ -1439,19 +2004,12 @@ async def get_classes_by_teacher(teacher_firebase_id: str):
 
         teacher_id = teacher_result.data[0]["id"]
 
-        # Get classes
-        result = supabase.table("classes").select("*").eq("teacher_id", teacher_id).execute()
-
-        # Get student count for each class
-        classes_with_count = []
-        for class_data in result.data or []:
-            enrollment_result = supabase.table("class_enrollments").select("id").eq("class_id", class_data["id"]).eq("status", "approved").execute()
-            class_data["student_count"] = len(enrollment_result.data or [])
-            classes_with_count.append(class_data)
+        # Get classes; student_count is kept up to date by a trigger on class_enrollments
+        result = supabase.table("classes").select(CLASS_COLUMNS).eq("teacher_id", teacher_id).execute()
 
         return {
             "success": True,
-            "data": classes_with_count
+            "data": result.data or []
         }
 
     except Exception as e:
@@ -1483,27 +2041,28 @@ async def get_classes_by_student(student_firebase_id: str):
 
         student_id = student_result.data[0]["id"]
 
-        # Get enrolled classes with teacher info
-        enrollments = supabase.table("class_enrollments").select("*").eq("student_id", student_id).execute()
+        # Get enrolled classes in one query, then their teachers in one batch
+        enrollments = supabase.table("class_enrollments").select(
+            f"{ENROLLMENT_COLUMNS}, classes!inner ({CLASS_COLUMNS})"
+        ).eq("student_id", student_id).execute()
+        enrollments = [enrollment for enrollment in enrollments.data or [] if enrollment.get("classes")]
+        teacher_names = teacher_names_by_id({enrollment["classes"]["teacher_id"] for enrollment in enrollments})
 
         classes_data = []
-        for enrollment in enrollments.data or []:
-            class_result = supabase.table("classes").select("*").eq("id", enrollment["class_id"]).execute()
-            if class_result.data:
-                class_info = class_result.data[0]
-                teacher_result = supabase.table("users").select("name").eq("id", class_info["teacher_id"]).execute()
-                teacher_name = teacher_result.data[0]["name"] if teacher_result.data else "Unknown"
-
-                classes_data.append({
-                    "id": class_info["id"],
-                    "name": class_info["name"],
-                    "subject": class_info["subject"],
-                    "class_code": class_info["class_code"],
-                    "description": class_info["description"],
-                    "teacher_name": teacher_name,
-                    "status": enrollment["status"],
-                    "enrolled_at": enrollment["enrolled_at"]
-                })
+        for enrollment in enrollments:
+            class_info = enrollment["classes"]
+            teacher_name = teacher_names.get(class_info["teacher_id"], "Unknown")
+
+            classes_data.append({
+                "id": class_info["id"],
+                "name": class_info["name"],
+                "subject": class_info["subject"],
+                "class_code": class_info["class_code"],
+                "description": class_info["description"],
+                "teacher_name": teacher_name,
+                "status": enrollment["status"],
+                "enrolled_at": enrollment["enrolled_at"]
+            })
 
         return {
             "success": True,
@@ -1513,6 +2072,14 @@ async def get_classes_by_student(student_firebase_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get student classes: {str(e)}")
 
+# join_class outcomes that are reported back as errors
+JOIN_CLASS_ERRORS = {
+    "student_not_found": "Student not found",
+    "not_student": "Only students can join classes",
+    "class_not_found": "Class not found",
+    "already_enrolled": "You are already enrolled in this class"
+}
+
 @app.post("/api/classes/join")
 async def join_class(join_data: dict):
     """Student joins a class directly (no approval needed)"""
@@ -1530,66 +2097,51 @@ async def join_class(join_data: dict):
                 "message": "Joined class successfully"
             }
 
-        # Get student's database ID
-        student_result = supabase.table("users").select("id, role").eq("firebase_id", firebase_id).execute()
-        if not student_result.data:
-            return {"success": False, "message": "Student not found"}
-
-        student_data = student_result.data[0]
-        if student_data["role"] != "student":
-            return {"success": False, "message": "Only students can join classes"}
+        # Student and class checks plus the enrollment (or approval of a
+        # pending one) happen in one database function call
+        result = supabase.rpc("join_class", {
+            "p_student_firebase_id": firebase_id,
+            "p_class_id": class_id
+        }).execute()
+        if not result.data:
+            return {"success": False, "message": "Failed to join class"}
 
-        student_id = student_data["id"]
+        enrollment = result.data[0]
+        outcome = enrollment["outcome"]
+        if outcome in JOIN_CLASS_ERRORS:
+            return {"success": False, "message": JOIN_CLASS_ERRORS[outcome]}
 
-        # Verify class exists
-        class_result = supabase.table("classes").select("id, name").eq("id", class_id).execute()
-        if not class_result.data:
-            return {"success": False, "message": "Class not found"}
+        response_cache.bump("class_enrollments")
+        class_name = enrollment["class_name"]
 
-        class_name = class_result.data[0]["name"]
+        if outcome == "approved":
+            return {"success": True, "message": f"Successfully joined {class_name}"}
 
-        # Check if already enrolled
-        existing_enrollment = supabase.table("class_enrollments").select("id, status").eq("class_id", class_id).eq("student_id", student_id).execute()
-        if existing_enrollment.data:
-            status = existing_enrollment.data[0]["status"]
-            if status == "approved":
-                return {"success": False, "message": "You are already enrolled in this class"}
-            else:
-                # Update existing enrollment to approved
-                ist_now = get_ist_now()
-                supabase.table("class_enrollments").update({
-                    "status": "approved",
-                    "approved_at": ist_now.isoformat()
-                }).eq("id", existing_enrollment.data[0]["id"]).execute()
-                return {"success": True, "message": f"Successfully joined {class_name}"}
-
-        # Create new enrollment with approved status (no approval needed)
-        ist_now = get_ist_now()
-        enrollment_data = {
-            "class_id": class_id,
-            "student_id": student_id,
-            "status": "approved",
-            "enrolled_at": ist_now.isoformat(),
-            "approved_at": ist_now.isoformat()
+        return {
+            "success": True,
+            "data": {
+                "id": enrollment["enrollment_id"],
+                "class_id": class_id,
+                "student_id": enrollment["student_id"],
+                "status": enrollment["status"],
+                "enrolled_at": enrollment["enrolled_at"],
+                "approved_at": enrollment["approved_at"]
+            },
+            "message": f"Successfully joined {class_name}"
         }
 
-        result = supabase.table("class_enrollments").insert(enrollment_data).execute()
-
-        if result.data:
-            return {
-                "success": True,
-                "data": result.data[0],
-                "message": f"Successfully joined {class_name}"
-            }
-        else:
-            return {"success": False, "message": "Failed to join class"}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to join class: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to join class: {str(e)}")
 
 @app.get("/api/classes/available")
-async def get_available_classes():
+async def get_available_classes(request: Request, response: Response):
     """Get all available classes for students to browse and join"""
+    return await cached_response(
+        request, response, "classes-available", "", ("classes", "users", "class_enrollments"), load_available_classes
+    )
+
+async def load_available_classes():
+    """Build the available-classes response"""
     try:
         if not SUPABASE_AVAILABLE:
             return {
@@ -1614,29 +2166,19 @@ async def get_available_classes():
                 ]
             }
 
-        # Get all classes with teacher info and enrollment count
-        result = supabase.table("classes").select("*").execute()
+        # Get all classes (with their maintained student_count), then teacher names in one batch
+        classes = fetch_all_rows(lambda: supabase.table("classes").select(CLASS_COLUMNS))
+        teacher_names = teacher_names_by_id({class_info.get("teacher_id") for class_info in classes})
 
         classes_data = []
-        for class_info in result.data or []:
-            # Get enrollment count
-            enrollment_result = supabase.table("class_enrollments").select("id").eq("class_id", class_info["id"]).eq("status", "approved").execute()
-            enrollment_count = len(enrollment_result.data or [])
-
-            # Get teacher name separately
-            teacher_name = "Unknown"
-            if class_info.get("teacher_id"):
-                teacher_result = supabase.table("users").select("name").eq("id", class_info["teacher_id"]).execute()
-                if teacher_result.data:
-                    teacher_name = teacher_result.data[0]["name"]
-
+        for class_info in classes:
             classes_data.append({
                 "id": class_info["id"],
                 "name": class_info["name"],
                 "subject": class_info["subject"],
                 "description": class_info["description"],
-                "teacher_name": teacher_name,
-                "enrolled_students": enrollment_count,
+                "teacher_name": teacher_names.get(class_info.get("teacher_id"), "Unknown"),
+                "enrolled_students": class_info.get("student_count") or 0,
                 "created_at": class_info["created_at"]
             })
 
@@ -1666,15 +2208,18 @@ async def get_class_students(class_id: int):
                 ]
             }
 
-        # Get enrollments first, then get student info separately
-        enrollments_result = supabase.table("class_enrollments").select("*").eq("class_id", class_id).eq("status", "approved").execute()
+        # Get enrollments with the enrolled student embedded in one query
+        student_columns = columns("users", "id", "name", "email", "student_id", "firebase_id", "created_at")
+        enrollments = fetch_all_rows(
+            lambda: supabase.table("class_enrollments").select(
+                f"{ENROLLMENT_COLUMNS}, {ENROLLED_STUDENT} ({student_columns})"
+            ).eq("class_id", class_id).eq("status", "approved")
+        )
 
         students = []
-        for enrollment in enrollments_result.data or []:
-            # Get student info separately
-            student_result = supabase.table("users").select("id, name, email, student_id, firebase_id").eq("id", enrollment["student_id"]).execute()
-            if student_result.data:
-                user_data = student_result.data[0]
+        for enrollment in enrollments:
+            user_data = enrollment.get("users")
+            if user_data:
                 students.append({
                     "id": user_data["id"],
                     "name": user_data["name"],
@@ -1725,6 +2270,7 @@ async def approve_student_join_request(class_id: int, approval_data: dict):
             "approved_at": get_ist_now().isoformat(),
             "approved_by": teacher_id
         }).eq("class_id", class_id).eq("student_id", student_id).execute()
+        response_cache.bump("class_enrollments")
 
         if result.data:
             return {
@@ -1773,8 +2319,20 @@ async def create_timetable(timetable_data: dict):
         if not isinstance(day_of_week, int) or day_of_week < 1 or day_of_week > 7:
             return {"success": False, "message": "Day of week must be between 1 and 7"}
 
-        if not isinstance(slot_number, int) or slot_number < 1 or slot_number > 9:
-            return {"success": False, "message": "Slot number must be between 1 and 9"}
+        institution = bell_schedules.get(timetable_data.get("institution") or DEFAULT_INSTITUTION)
+        if institution is None:
+            return {"success": False, "message": "Unknown institution"}
+
+        schedule = institution.for_day(day_of_week)
+        if schedule is None:
+            return {"success": False, "message": "No classes are scheduled on that day"}
+
+        period = schedule.period(slot_number) if isinstance(slot_number, int) else None
+        if period is None:
+            slot_numbers = schedule.slot_numbers()
+            return {"success": False, "message": f"Slot number must be between {slot_numbers[0]} and {slot_numbers[-1]}"}
+
+        start_time, end_time = period
 
         if not SUPABASE_AVAILABLE:
             return {
@@ -1815,19 +2373,6 @@ async def create_timetable(timetable_data: dict):
         except Exception as db_error:
             return {"success": False, "message": "Error checking existing timetable slots. Please try again."}
 
-        # Define time slots with 12-hour format
-        time_slots = [
-            ("09:00", "09:50"), ("09:50", "10:40"), ("10:50", "11:40"),
-            ("11:40", "12:30"), ("12:30", "13:20"), ("13:20", "14:10"),
-            ("14:10", "15:00"), ("15:10", "16:00"), ("16:00", "16:50")
-        ]
-
-        # Get the appropriate time slot
-        if slot_number <= len(time_slots):
-            start_time, end_time = time_slots[slot_number - 1]
-        else:
-            start_time, end_time = "09:00", "09:50"  # Default fallback
-
         if existing_slot.data:
             # Update existing slot with class information
             try:
@@ -1854,7 +2399,10 @@ async def create_timetable(timetable_data: dict):
                 print(f"Database error creating slot: {db_error}")
                 return {"success": False, "message": f"Failed to create timetable slot: {str(db_error)}"}
 
+        new_versions = response_cache.bump("timetable_slots")
+
         if result.data:
+            timetable_index.upsert_slot(result.data[0], new_versions)
             return {
                 "success": True,
                 "data": result.data[0],
@@ -1871,8 +2419,15 @@ async def create_timetable(timetable_data: dict):
         }
 
 @app.get("/api/timetables/teacher/{teacher_firebase_id}")
-async def get_timetable_by_teacher(teacher_firebase_id: str):
+async def get_timetable_by_teacher(teacher_firebase_id: str, request: Request, response: Response):
     """Get timetable for a teacher"""
+    return await cached_response(
+        request, response, "timetable-teacher", teacher_firebase_id, ("users", "classes", "timetable_slots"),
+        lambda: load_timetable_by_teacher(teacher_firebase_id)
+    )
+
+async def load_timetable_by_teacher(teacher_firebase_id: str):
+    """Build a teacher's timetable response"""
     try:
         if not SUPABASE_AVAILABLE:
             return {
@@ -1880,53 +2435,26 @@ async def get_timetable_by_teacher(teacher_firebase_id: str):
                 "data": []
             }
 
-        # Get teacher's database ID
-        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
-        if not teacher_result.data:
-            return {"success": False, "message": "Teacher not found"}
-
-        teacher_id = teacher_result.data[0]["id"]
-
-        # Get teacher's classes first
-        teacher_classes = supabase.table("classes").select("id").eq("teacher_id", teacher_id).execute()
-        teacher_class_ids = [cls["id"] for cls in teacher_classes.data or []]
+        await run_in_threadpool(timetable_index.ensure_fresh)
 
-        if not teacher_class_ids:
-            return {
-                "success": True,
-                "data": []
-            }
+        teacher_id = await run_in_threadpool(timetable_index.user_id, teacher_firebase_id)
+        if teacher_id is None:
+            return {"success": False, "message": "Teacher not found"}
 
-        # Get all timetable slots for teacher's classes with class details
         teacher_slots = []
-        for class_id in teacher_class_ids:
-            # Get class details
-            class_result = supabase.table("classes").select("id, name, subject").eq("id", class_id).execute()
-            if not class_result.data:
-                continue
-
-            class_info = class_result.data[0]
-
-            # Get timetable slots for this class
-            slots_result = supabase.table("timetable_slots").select("*").eq("class_id", class_id).execute()
-
-            for slot in slots_result.data or []:
-                # Convert times to 12-hour format
-                start_time_12hr = convert_to_12hr_format(slot["start_time"])
-                end_time_12hr = convert_to_12hr_format(slot["end_time"])
-
-                teacher_slots.append({
-                    "id": slot["id"],
-                    "day_of_week": slot["day_of_week"],
-                    "slot_number": slot["slot_number"],
-                    "start_time": start_time_12hr,
-                    "end_time": end_time_12hr,
-                    "class": {
-                        "id": class_info["id"],
-                        "name": class_info["name"],
-                        "subject": class_info["subject"]
-                    }
-                })
+        for class_info, slot in timetable_index.slots_for_classes(timetable_index.teacher_class_ids(teacher_id)):
+            teacher_slots.append({
+                "id": slot["id"],
+                "day_of_week": slot["day_of_week"],
+                "slot_number": slot["slot_number"],
+                "start_time": convert_to_12hr_format(slot["start_time"]),
+                "end_time": convert_to_12hr_format(slot["end_time"]),
+                "class": {
+                    "id": class_info["id"],
+                    "name": class_info["name"],
+                    "subject": class_info["subject"]
+                }
+            })
 
         return {
             "success": True,
@@ -1937,8 +2465,12 @@ async def get_timetable_by_teacher(teacher_firebase_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get timetable: {str(e)}")
 
 @app.get("/api/subjects")
-async def get_all_subjects():
+async def get_all_subjects(request: Request, response: Response):
     """Get all unique subjects from users and classes tables"""
+    return await cached_response(request, response, "subjects", "", ("users", "classes"), load_all_subjects)
+
+async def load_all_subjects():
+    """Build the subjects response"""
     try:
         if not SUPABASE_AVAILABLE:
             return {
@@ -1988,56 +2520,43 @@ async def add_students_to_class(request_data: dict):
                 "message": "Students added successfully"
             }
 
-        # Verify teacher owns the class
-        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
-        if not teacher_result.data:
-            return {"success": False, "message": "Teacher not found"}
-
-        teacher_id = teacher_result.data[0]["id"]
+        if not start_id or not end_id:
+            return {"success": False, "message": "Start and end student IDs are required"}
+
+        # Ownership check and the INSERT ... SELECT over the (indexed) roll
+        # number range run in one database function call; students that
+        # already have an enrollment row are skipped by ON CONFLICT
+        result = supabase.rpc("add_students_to_class", {
+            "p_teacher_firebase_id": teacher_firebase_id,
+            "p_class_id": class_id,
+            "p_start_student_id": start_id,
+            "p_end_student_id": end_id
+        }).execute()
+        outcome = result.data[0]
 
-        class_result = supabase.table("classes").select("id").eq("id", class_id).eq("teacher_id", teacher_id).execute()
-        if not class_result.data:
+        if outcome["outcome"] == "teacher_not_found":
+            return {"success": False, "message": "Teacher not found"}
+        if outcome["outcome"] == "unauthorized":
             return {"success": False, "message": "Unauthorized or class not found"}
-
-        # Find students in the ID range
-        students_result = supabase.table("users").select("id, student_id, name").eq("role", "student").execute()
-
-        eligible_students = []
-        for student in students_result.data or []:
-            student_id = student.get("student_id", "")
-            if student_id and start_id <= student_id <= end_id:
-                eligible_students.append(student)
-
-        if not eligible_students:
+        if outcome["outcome"] == "no_students":
             return {"success": False, "message": f"No students found with IDs between {start_id} and {end_id}"}
 
-        # Add students to class with approved status
-        added_count = 0
-        for student in eligible_students:
-            # Check if already enrolled
-            existing = supabase.table("class_enrollments").select("id").eq("class_id", class_id).eq("student_id", student["id"]).execute()
-
-            if not existing.data:
-                enrollment_data = {
-                    "class_id": class_id,
-                    "student_id": student["id"],
-                    "status": "approved",
-                    "approved_at": datetime.now().isoformat(),
-                    "approved_by": teacher_id
-                }
+        added_count = outcome["added_count"]
+        total_eligible = outcome["total_eligible"]
+        if added_count:
+            response_cache.bump("class_enrollments")
 
-                result = supabase.table("class_enrollments").insert(enrollment_data).execute()
-                if result.data:
-                    added_count += 1
+        skipped_count = total_eligible - added_count
 
         return {
             "success": True,
             "data": {
                 "added_count": added_count,
-                "total_eligible": len(eligible_students),
+                "skipped_count": skipped_count,
+                "total_eligible": total_eligible,
                 "message": f"Added {added_count} students to the class"
             },
-            "message": f"Successfully added {added_count} students to the class"
+            "message": f"Successfully added {added_count} students to the class ({skipped_count} already enrolled)"
         }
 
     except Exception as e:
@@ -2045,8 +2564,298 @@ async def add_students_to_class(request_data: dict):
 
 # Instant Attendance System
 
-# Store active instant passwords in memory (in production, use Redis)
-instant_passwords = {}
+INSTANT_PASSWORD_TTL_SECONDS = int(os.getenv("INSTANT_PASSWORD_TTL_SECONDS", "180"))
+
+# Active instant passwords live in a TTL session store: per-process memory by
+# default, sqlite or redis (SESSION_STORE_BACKEND) when running several workers
+instant_sessions = create_session_store()
+print(f"✅ Instant attendance sessions stored in '{instant_sessions.backend_name}' backend")
+
+# Validation hands the student a signed token of what it verified; /recognize
+# adds the face match and /mark then goes straight to the write. Set
+# ATTENDANCE_TOKEN_SECRET when running several workers.
+ATTENDANCE_TOKEN_SECRET = os.getenv("ATTENDANCE_TOKEN_SECRET")
+if not ATTENDANCE_TOKEN_SECRET:
+    print("⚠️ ATTENDANCE_TOKEN_SECRET not set, attendance tokens only verify on the worker that issued them")
+attendance_tokens = AttendanceTokenSigner(
+    (ATTENDANCE_TOKEN_SECRET or secrets.token_hex(32)).encode("utf-8"),
+    ttl_seconds=int(os.getenv("ATTENDANCE_TOKEN_TTL_SECONDS", "120"))
+)
+
+# Rotating codes are the stateless alternative to stored passwords: the code
+# is "<class_id>-<slot>-<digits>" with digits derived from
+# ROTATING_CODE_SECRET and the current time-step, so any worker verifies it
+# without the session store
+ROTATING_CODE_SECRET = os.getenv("ROTATING_CODE_SECRET")
+if not ROTATING_CODE_SECRET:
+    print("⚠️ ROTATING_CODE_SECRET not set, rotating attendance codes only verify on the worker that issued them")
+rotating_codes = RotatingCodeSigner(
+    (ROTATING_CODE_SECRET or secrets.token_hex(32)).encode("utf-8"),
+    step_seconds=int(os.getenv("ROTATING_CODE_STEP_SECONDS", "30")),
+    grace_steps=int(os.getenv("ROTATING_CODE_GRACE_STEPS", "1"))
+)
+
+def rotating_session_key(class_id: int, slot_number: int, attendance_date: str) -> str:
+    """Session key shared by every code of a class, slot and day"""
+    return f"rotating:{class_id}:{slot_number}:{attendance_date}"
+
+def rotating_session_ttl() -> float:
+    """Seconds left in the attendance day a rotating session belongs to"""
+    ist_now = get_ist_now()
+    midnight = (ist_now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1.0, (midnight - ist_now).total_seconds())
+
+def rotating_class_info(class_id: int) -> Optional[dict]:
+    """Name and owner of a class from the timetable index, reloading it only for a class it does not know (blocking)"""
+    class_info = timetable_index.classes.get(class_id)
+    if class_info is None:
+        timetable_index.ensure_fresh()
+        class_info = timetable_index.classes.get(class_id)
+    return class_info
+
+def build_rotating_session_data(class_id: int, class_name: str, slot_number: int, teacher_id: int, accepted_until: float) -> dict:
+    return {
+        "mode": "rotating",
+        "class_id": class_id,
+        "class_name": class_name,
+        "slot_number": slot_number,
+        "teacher_id": teacher_id,
+        "expires_at": datetime.fromtimestamp(accepted_until, IST).isoformat(),
+        "created_at": get_ist_now().isoformat()
+    }
+
+async def rotating_session_data(class_id: int, slot_number: int, session_key: str, accepted_until: float) -> Optional[dict]:
+    """Session data for a rotating code without the session store.
+
+    Class name and owner come from the session's context, resolved when the
+    session was generated (or first loaded in this worker); only a worker
+    that has neither the context nor the class in its timetable index reloads
+    the index, off the event loop.
+    """
+    context = instant_contexts.get(session_key)
+    if context is not None:
+        return build_rotating_session_data(class_id, context.class_name, slot_number, context.teacher_id, accepted_until)
+
+    class_info = await run_in_threadpool(rotating_class_info, class_id)
+    if not class_info:
+        return None
+    return build_rotating_session_data(class_id, class_info["name"], slot_number, class_info["teacher_id"], accepted_until)
+
+async def lookup_instant_session(password: str, attendance_token: Optional[str] = None, student_firebase_id: Optional[str] = None):
+    """Return (session key, session data) for a live instant password or rotating code, else (None, None).
+
+    A rotating code that has rotated out is still accepted with the student's
+    valid attendance token for the same session, so a student who validated
+    in time is not cut off by the rotation mid face-scan.
+    """
+    parsed = rotating_codes.parse(password)
+    if parsed is None:
+        session_data = instant_sessions.get(password)
+        return (password, session_data) if session_data else (None, None)
+
+    class_id, slot_number, _ = parsed
+    session_key = rotating_session_key(class_id, slot_number, get_ist_now().date().isoformat())
+
+    verified = rotating_codes.verify(password)
+    if verified:
+        accepted_until = verified[2]
+    else:
+        try:
+            claims = attendance_tokens.verify(attendance_token) if attendance_token else None
+        except InvalidAttendanceToken:
+            claims = None
+        if not claims or claims.get("fid") != student_firebase_id or claims.get("sess") != attendance_tokens.fingerprint(session_key):
+            return None, None
+        accepted_until = claims["exp"]
+
+    session_data = await rotating_session_data(class_id, slot_number, session_key, accepted_until)
+    return (session_key, session_data) if session_data else (None, None)
+
+# Marks written by this process are pushed to the teacher's live feed; each
+# subscriber buffers at most MARK_FEED_BUFFER_SIZE events before the oldest
+# are dropped (and the subscriber is resynced with a snapshot)
+mark_feed = MarkFeed(max_buffer=int(os.getenv("MARK_FEED_BUFFER_SIZE", "100")))
+MARK_FEED_KEEPALIVE_SECONDS = 15
+
+def instant_feed_key(context: InstantSessionContext) -> str:
+    """Feed key for a session's class, slot and date"""
+    return f"{context.class_id}:{context.slot_number}:{context.attendance_date}"
+
+def publish_instant_mark(context: InstantSessionContext, student_id: int, student_name: str, marked_at: str) -> None:
+    """Push a new mark with the running present/total counts to the live feed"""
+    mark_feed.publish(instant_feed_key(context), "mark", {
+        "student_id": student_id,
+        "student_name": student_name,
+        "marked_at": marked_at,
+        **context.attendance_counts()
+    })
+
+@app.on_event("shutdown")
+def close_instant_sessions():
+    """Stop the session store's background work on shutdown"""
+    instant_sessions.close()
+
+# Roster, class metadata and existing marks preloaded per session (per worker)
+INSTANT_PRELOAD_ENCODINGS = os.getenv("INSTANT_PRELOAD_ENCODINGS", "false").lower() == "true"
+instant_contexts = SessionContextCache()
+
+def load_instant_session_context(session_data: dict) -> InstantSessionContext:
+    """Preload everything validate/mark need for the session's class and slot"""
+    class_id = session_data["class_id"]
+    slot_number = session_data["slot_number"]
+    attendance_date = datetime.fromisoformat(session_data["created_at"]).date().isoformat()
+
+    class_name = session_data.get("class_name")
+    if not class_name:
+        class_result = supabase.table("classes").select("name").eq("id", class_id).execute()
+        class_name = class_result.data[0]["name"] if class_result.data else "Unknown Class"
+
+    context = InstantSessionContext(class_id, class_name, slot_number, attendance_date, teacher_id=session_data.get("teacher_id"))
+
+    enrollments = fetch_all_rows(
+        lambda: supabase.table("class_enrollments").select("id, student_id, status").eq("class_id", class_id)
+    )
+    enrollments_by_student = {enrollment["student_id"]: enrollment for enrollment in enrollments}
+    students = fetch_rows_by_ids("users", "id, firebase_id, name, role", "id", enrollments_by_student.keys())
+    for student in students:
+        enrollment = enrollments_by_student[student["id"]]
+        context.roster[student["firebase_id"]] = {
+            "id": student["id"],
+            "name": student["name"],
+            "role": student["role"],
+            "enrollment_id": enrollment["id"],
+            "enrollment_status": enrollment["status"]
+        }
+
+    marks = fetch_all_rows(
+        lambda: supabase.table("attendance").select("student_id, created_at").eq("class_id", class_id).eq("slot_number", slot_number).eq("attendance_date", attendance_date)
+    )
+    for mark in marks:
+        context.marked[mark["student_id"]] = mark["created_at"]
+
+    if INSTANT_PRELOAD_ENCODINGS:
+        encodings = fetch_rows_by_ids("face_encodings", columns("face_encodings", "user_id", "encoding", include_heavy=True), "user_id", enrollments_by_student.keys())
+        context.encodings = {row["user_id"]: row["encoding"] for row in encodings}
+
+    print(f"✅ Preloaded instant session for class {class_id}: {len(context.roster)} students, {len(context.marked)} already marked")
+    return context
+
+# Optional write-behind queue: instant marks are acknowledged once journaled
+# locally and inserted into Supabase in batches
+ATTENDANCE_WRITE_BEHIND = os.getenv("ATTENDANCE_WRITE_BEHIND", "false").lower() == "true"
+
+def insert_attendance_batch(rows: list):
+    """Insert queued attendance rows in one statement, skipping slots already marked"""
+    supabase.table("attendance").upsert(
+        rows,
+        on_conflict="student_id,class_id,slot_number,attendance_date",
+        ignore_duplicates=True
+    ).execute()
+
+attendance_writer = None
+if ATTENDANCE_WRITE_BEHIND and SUPABASE_AVAILABLE:
+    attendance_writer = AttendanceWriteBehind(
+        insert_attendance_batch,
+        os.getenv("ATTENDANCE_JOURNAL_DIR", "temp/attendance_journal"),
+        flush_interval_ms=int(os.getenv("ATTENDANCE_FLUSH_INTERVAL_MS", "200")),
+        batch_size=int(os.getenv("ATTENDANCE_FLUSH_BATCH_SIZE", "100")),
+        max_row_attempts=int(os.getenv("ATTENDANCE_MAX_ROW_ATTEMPTS", "20"))
+    )
+    print(f"✅ Attendance write-behind enabled (journal: {attendance_writer.journal_path})")
+
+@app.on_event("shutdown")
+def close_attendance_writer():
+    """Flush queued attendance marks before the worker exits"""
+    if attendance_writer:
+        attendance_writer.close()
+
+def get_instant_session_context(session_key: str, session_data: dict) -> InstantSessionContext:
+    """Return the preloaded context for a session, loading it on first use in this worker"""
+    if session_data.get("mode") == "rotating":
+        # Each code lives for a few steps; the context is kept for the whole
+        # session (its class, slot and day) unless the teacher stops it
+        ttl_seconds = rotating_session_ttl()
+    else:
+        expires_at = datetime.fromisoformat(session_data["expires_at"])
+        ttl_seconds = max(1.0, (expires_at - get_ist_now()).total_seconds())
+    return instant_contexts.get_or_load(session_key, ttl_seconds, lambda: load_instant_session_context(session_data))
+
+def end_instant_session(session_key: str) -> None:
+    """Close the session's live feeds, drop its context and flush queued marks (blocking; run off the event loop)"""
+    context = instant_contexts.get(session_key)
+    if context:
+        mark_feed.close(instant_feed_key(context))
+    instant_contexts.discard(session_key)
+    # Session over: make sure every queued mark reaches the database
+    if attendance_writer and not attendance_writer.flush():
+        print(f"⚠️ Attendance flush timed out; {attendance_writer.pending_count()} marks remain queued")
+
+async def resolve_instant_student(context: InstantSessionContext, student_firebase_id: str):
+    """Return (student, error_message) for an instant session, auto-enrolling or approving as needed"""
+    student = context.get_student(student_firebase_id)
+
+    if student is None:
+        # Not in the preloaded roster: the student may have joined after
+        # preload. The enrollment check filters on the embedded student's
+        # firebase_id, so both lookups run at once.
+        try:
+            student_result, enrollment_result = await lookup_fanout.run(
+                lambda: supabase.table("users").select("id, name, role").eq("firebase_id", student_firebase_id).execute(),
+                lambda: supabase.table("class_enrollments").select(
+                    f"id, status, {ENROLLED_STUDENT}!inner (firebase_id)"
+                ).eq("class_id", context.class_id).eq("users.firebase_id", student_firebase_id).execute()
+            )
+        except Exception as db_error:
+            return None, "Database connection error. Please try again."
+
+        if not student_result.data:
+            return None, "Student account not found. Please contact your teacher."
+
+        student = {**student_result.data[0], "enrollment_id": None, "enrollment_status": None}
+
+        if student["role"] == "student" and enrollment_result.data:
+            student["enrollment_id"] = enrollment_result.data[0]["id"]
+            student["enrollment_status"] = enrollment_result.data[0]["status"]
+    else:
+        student = dict(student)
+
+    if student["role"] != "student":
+        return None, "Only students can mark attendance using instant passwords"
+
+    if student["enrollment_id"] is None:
+        # Auto-enroll student in the class if they have a valid password
+        try:
+            ist_now = get_ist_now()
+            result = await run_in_threadpool(lambda: supabase.table("class_enrollments").insert({
+                "class_id": context.class_id,
+                "student_id": student["id"],
+                "status": "approved",
+                "enrolled_at": ist_now.isoformat(),
+                "approved_at": ist_now.isoformat()
+            }).execute())
+            student["enrollment_id"] = result.data[0]["id"] if result.data else None
+            student["enrollment_status"] = "approved"
+            response_cache.bump("class_enrollments")
+            print(f"Auto-enrolled student {student['id']} in class {context.class_id}")
+        except Exception as enroll_error:
+            print(f"Failed to auto-enroll student: {enroll_error}")
+            return None, "You are not enrolled in this class. Please join the class first from the 'Browse Classes' page."
+    elif student["enrollment_status"] != "approved":
+        # Auto-approve if they have a valid password
+        try:
+            await run_in_threadpool(lambda: supabase.table("class_enrollments").update({
+                "status": "approved",
+                "approved_at": get_ist_now().isoformat()
+            }).eq("id", student["enrollment_id"]).execute())
+            student["enrollment_status"] = "approved"
+            response_cache.bump("class_enrollments")
+            print(f"Auto-approved student {student['id']} for class {context.class_id}")
+        except Exception as approve_error:
+            print(f"Failed to auto-approve student: {approve_error}")
+            return None, "Your enrollment in this class is pending teacher approval."
+
+    context.put_student(student_firebase_id, student)
+    return student, None
 
 @app.post("/api/instant-password/generate")
 async def generate_instant_password(request_data: dict):
@@ -2055,6 +2864,10 @@ async def generate_instant_password(request_data: dict):
         class_id = request_data.get("class_id")
         slot_number = request_data.get("slot_number", 1)  # Default to slot 1
         teacher_firebase_id = request_data.get("teacher_firebase_id")
+        mode = request_data.get("mode", "password")  # "password" (stored) or "rotating" (stateless)
+
+        if mode not in ("password", "rotating"):
+            return {"success": False, "message": "Mode must be 'password' or 'rotating'"}
 
         if not SUPABASE_AVAILABLE:
             password = "123456"
@@ -2062,7 +2875,7 @@ async def generate_instant_password(request_data: dict):
                 "success": True,
                 "data": {
                     "password": password,
-                    "expires_at": (datetime.now() + timedelta(minutes=3)).isoformat(),
+                    "expires_at": (datetime.now() + timedelta(seconds=INSTANT_PASSWORD_TTL_SECONDS)).isoformat(),
                     "class_id": class_id
                 },
                 "message": "Instant password generated (demo mode)"
@@ -2079,25 +2892,56 @@ async def generate_instant_password(request_data: dict):
         if not class_result.data:
             return {"success": False, "message": "Unauthorized or class not found"}
 
-        # Generate 6-digit password
+        if mode == "rotating":
+            # Class name and owner are resolved here, once, and kept on the context
+            code, accepted_until = rotating_codes.current(class_id, slot_number)
+            session_data = build_rotating_session_data(class_id, class_result.data[0]["name"], slot_number, teacher_id, accepted_until)
+
+            session_key = rotating_session_key(class_id, slot_number, get_ist_now().date().isoformat())
+            if instant_contexts.get(session_key) is None:
+                instant_contexts.put(session_key, load_instant_session_context(session_data), rotating_session_ttl())
+
+            return {
+                "success": True,
+                "data": {
+                    "password": code,
+                    "mode": "rotating",
+                    "rotates_every": rotating_codes.step_seconds,
+                    "expires_at": session_data["expires_at"],
+                    "class_id": class_id,
+                    "class_name": class_result.data[0]["name"]
+                },
+                "message": "Rotating attendance code generated successfully"
+            }
+
+        # Generate a 6-digit password that no other live session is using
         import random
-        password = str(random.randint(100000, 999999))
         ist_now = get_ist_now()
-        expires_at = ist_now + timedelta(minutes=3)
-
-        # Store in memory (in production, use Redis with TTL)
-        instant_passwords[password] = {
+        expires_at = ist_now + timedelta(seconds=INSTANT_PASSWORD_TTL_SECONDS)
+        session_data = {
             "class_id": class_id,
+            "class_name": class_result.data[0]["name"],
             "slot_number": slot_number,
             "teacher_id": teacher_id,
-            "expires_at": expires_at,
-            "created_at": ist_now
+            "expires_at": expires_at.isoformat(),
+            "created_at": ist_now.isoformat()
         }
 
+        for _ in range(10):
+            password = str(random.randint(100000, 999999))
+            if instant_sessions.set(password, session_data, INSTANT_PASSWORD_TTL_SECONDS, only_if_absent=True):
+                break
+        else:
+            return {"success": False, "message": "Could not allocate a unique password. Please try again."}
+
+        # Preload roster and existing marks so the student burst is served from memory
+        instant_contexts.put(password, load_instant_session_context(session_data), INSTANT_PASSWORD_TTL_SECONDS)
+
         return {
             "success": True,
             "data": {
                 "password": password,
+                "mode": "password",
                 "expires_at": expires_at.isoformat(),
                 "class_id": class_id,
                 "class_name": class_result.data[0]["name"]
@@ -2108,6 +2952,33 @@ async def generate_instant_password(request_data: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate password: {str(e)}")
 
+@app.get("/api/instant-password/rotating/{class_id}/current")
+async def get_rotating_code(class_id: int, teacher_firebase_id: str, slot_number: int = 1):
+    """Current rotating code for the teacher's screen; served from memory, no database round trip"""
+    if not SUPABASE_AVAILABLE:
+        return {
+            "success": True,
+            "data": {"password": f"{class_id}-{slot_number}-123456", "mode": "rotating", "rotates_every": rotating_codes.step_seconds},
+            "message": "Rotating code (demo mode)"
+        }
+
+    class_info = await run_in_threadpool(rotating_class_info, class_id)
+    if not class_info or class_info["teacher_id"] != await run_in_threadpool(timetable_index.user_id, teacher_firebase_id):
+        return {"success": False, "message": "Unauthorized or class not found"}
+
+    code, accepted_until = rotating_codes.current(class_id, slot_number)
+    return {
+        "success": True,
+        "data": {
+            "password": code,
+            "mode": "rotating",
+            "rotates_every": rotating_codes.step_seconds,
+            "expires_at": datetime.fromtimestamp(accepted_until, IST).isoformat(),
+            "class_id": class_id
+        },
+        "message": "Rotating code retrieved successfully"
+    }
+
 @app.post("/api/instant-password/invalidate")
 async def invalidate_instant_password(request_data: dict):
     """Invalidate an instant password (for timer expiry or stop session)"""
@@ -2127,9 +2998,25 @@ async def invalidate_instant_password(request_data: dict):
                 "message": "Password invalidated (demo mode)"
             }
 
+        rotating = rotating_codes.parse(password)
+        if rotating:
+            # Nothing is stored for rotating codes: stopping ends the live feed
+            # and the teacher's screen stops fetching new codes
+            class_id, slot_number, _ = rotating
+            class_info = await run_in_threadpool(rotating_class_info, class_id)
+            if not class_info or class_info["teacher_id"] != await run_in_threadpool(timetable_index.user_id, teacher_firebase_id):
+                return {"success": False, "message": "Unauthorized to invalidate this password"}
+
+            await run_in_threadpool(end_instant_session, rotating_session_key(class_id, slot_number, get_ist_now().date().isoformat()))
+            accepted_for = rotating_codes.step_seconds * (rotating_codes.grace_steps + 1)
+            return {
+                "success": True,
+                "message": f"Session stopped. The last code stops working within {accepted_for} seconds"
+            }
+
         # Check if password exists and belongs to the teacher
-        if password in instant_passwords:
-            password_data = instant_passwords[password]
+        password_data = instant_sessions.get(password)
+        if password_data:
 
             # Get teacher's database ID
             teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
@@ -2138,7 +3025,8 @@ async def invalidate_instant_password(request_data: dict):
 
                 # Verify the password belongs to this teacher
                 if password_data["teacher_id"] == teacher_id:
-                    del instant_passwords[password]
+                    instant_sessions.delete(password)
+                    await run_in_threadpool(end_instant_session, password)
                     return {
                         "success": True,
                         "message": "Password invalidated successfully"
@@ -2159,6 +3047,94 @@ async def invalidate_instant_password(request_data: dict):
             "message": f"Failed to invalidate password: {str(e)}"
         }
 
+def instant_feed_response(session_key: str, session_data: dict, stored_password: Optional[str] = None) -> StreamingResponse:
+    """Server-Sent Events stream of a session's marks (stored_password: the stored session to watch for expiry)"""
+    context = get_instant_session_context(session_key, session_data)
+    feed_key = instant_feed_key(context)
+
+    def snapshot() -> str:
+        return format_sse("snapshot", {
+            "class_id": context.class_id,
+            "class_name": context.class_name,
+            "slot_number": context.slot_number,
+            "expires_at": session_data["expires_at"],
+            **context.attendance_snapshot()
+        })
+
+    async def events():
+        subscription = mark_feed.subscribe(feed_key)
+        try:
+            yield snapshot()
+            while True:
+                new_events, dropped = await subscription.next_events(MARK_FEED_KEEPALIVE_SECONDS)
+                if dropped:
+                    # Fell behind: resync from the session instead of replaying
+                    yield snapshot()
+                else:
+                    for event, data in new_events:
+                        yield format_sse(event, data)
+
+                if subscription.closed or (not new_events and stored_password and not instant_sessions.get(stored_password)):
+                    yield format_sse("expired", {"message": "Instant attendance session ended"})
+                    return
+                if not new_events:
+                    yield ": keepalive\n\n"
+        finally:
+            mark_feed.unsubscribe(feed_key, subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/instant-password/rotating/{class_id}/events")
+async def stream_rotating_attendance(class_id: int, teacher_firebase_id: str, slot_number: int = 1):
+    """Live feed of a rotating session's marks as Server-Sent Events.
+
+    Keyed on the class, slot and day rather than on a code, so an EventSource
+    reconnect keeps working after the code it was opened with has rotated
+    out. The session ends when the teacher stops it.
+    """
+    if not SUPABASE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Live attendance feed is not available in demo mode")
+
+    class_info = await run_in_threadpool(rotating_class_info, class_id)
+    if not class_info:
+        raise HTTPException(status_code=404, detail="Class not found")
+    if class_info["teacher_id"] != await run_in_threadpool(timetable_index.user_id, teacher_firebase_id):
+        raise HTTPException(status_code=403, detail="Unauthorized to view this session")
+
+    session_key = rotating_session_key(class_id, slot_number, get_ist_now().date().isoformat())
+    _, accepted_until = rotating_codes.current(class_id, slot_number)
+    session_data = await rotating_session_data(class_id, slot_number, session_key, accepted_until)
+    return await run_in_threadpool(instant_feed_response, session_key, session_data)
+
+@app.get("/api/instant-password/{password}/events")
+async def stream_instant_attendance(password: str, teacher_firebase_id: str):
+    """Live feed of an instant session's marks as Server-Sent Events.
+
+    Sends a "snapshot" (counts and marks so far), then a "mark" event with
+    the running present/total counts for each new mark, and "expired" when
+    the session ends. Only marks written by this worker are pushed. An
+    unknown password or another teacher gets a 404/403, which EventSource
+    treats as final. Rotating sessions have their own feed keyed on the
+    class (stream_rotating_attendance).
+    """
+    if not SUPABASE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Live attendance feed is not available in demo mode")
+
+    session_key, password_data = await lookup_instant_session(password)
+    if not password_data:
+        raise HTTPException(status_code=404, detail="Invalid or expired password")
+
+    if password_data["teacher_id"] != await run_in_threadpool(timetable_index.user_id, teacher_firebase_id):
+        raise HTTPException(status_code=403, detail="Unauthorized to view this session")
+
+    # A rotating session has nothing stored to expire; it ends when the teacher stops it
+    stored_password = None if password_data.get("mode") == "rotating" else password
+    return await run_in_threadpool(instant_feed_response, session_key, password_data, stored_password)
+
 @app.post("/api/instant-attendance/validate")
 async def validate_instant_password(request_data: dict):
     """Validate instant password without marking attendance"""
@@ -2194,94 +3170,44 @@ async def validate_instant_password(request_data: dict):
                 "message": "Password validated (demo mode)"
             }
 
-        # Check if password exists and is valid
-        if password not in instant_passwords:
+        # Check if password exists and is valid (expired sessions are dropped by the store)
+        session_key, password_data = await lookup_instant_session(password)
+        if not password_data:
             return {"success": False, "message": "Invalid or expired password. Please check with your teacher."}
 
-        password_data = instant_passwords[password]
-
-        # Check if password has expired (using IST)
-        ist_now = get_ist_now()
-        if ist_now > password_data["expires_at"]:
-            # Clean up expired password
-            try:
-                del instant_passwords[password]
-            except KeyError:
-                pass  # Password already cleaned up
-            return {"success": False, "message": "Password has expired during face recognition. Please ask your teacher for a new one."}
-
-        # Get student info
-        try:
-            student_result = supabase.table("users").select("id, name").eq("firebase_id", student_firebase_id).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Error verifying student. Please try again."}
-
-        if not student_result.data:
-            return {"success": False, "message": "Student not found. Please contact support."}
-
-        student_id = student_result.data[0]["id"]
-        student_name = student_result.data[0]["name"]
-
-        # Check if student is enrolled in the class
-        try:
-            enrollment_result = supabase.table("class_enrollments").select("status").eq("student_id", student_id).eq("class_id", password_data["class_id"]).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Error checking class enrollment. Please try again."}
-
-        if not enrollment_result.data:
-            # Auto-enroll student in the class if they have a valid password
-            try:
-                enrollment_data = {
-                    "class_id": password_data["class_id"],
-                    "student_id": student_id,
-                    "status": "approved",
-                    "enrolled_at": datetime.now().isoformat(),
-                    "approved_at": datetime.now().isoformat()
-                }
-                supabase.table("class_enrollments").insert(enrollment_data).execute()
-                print(f"Auto-enrolled student {student_id} in class {password_data['class_id']}")
-            except Exception as enroll_error:
-                print(f"Failed to auto-enroll student: {enroll_error}")
-                return {"success": False, "message": "You are not enrolled in this class. Please join the class first from the 'Browse Classes' page."}
-        elif enrollment_result.data[0]["status"] != "approved":
-            # Auto-approve if they have a valid password
-            try:
-                supabase.table("class_enrollments").update({
-                    "status": "approved",
-                    "approved_at": datetime.now().isoformat()
-                }).eq("id", enrollment_result.data[0]["id"]).execute()
-                print(f"Auto-approved student {student_id} for class {password_data['class_id']}")
-            except Exception as approve_error:
-                print(f"Failed to auto-approve student: {approve_error}")
-                return {"success": False, "message": "Your enrollment is pending teacher approval."}
-
-        # Get class info
-        try:
-            class_result = supabase.table("classes").select("name").eq("id", password_data["class_id"]).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Error retrieving class information. Please try again."}
+        context = get_instant_session_context(session_key, password_data)
 
-        class_name = class_result.data[0]["name"] if class_result.data else "Unknown Class"
+        student, error_message = await resolve_instant_student(context, student_firebase_id)
+        if error_message:
+            return {"success": False, "message": error_message}
 
         # Check if attendance already marked for this slot today
-        today = datetime.now().date()
-        slot_number = password_data["slot_number"]
-        try:
-            existing_attendance = supabase.table("attendance").select("id, created_at").eq("student_id", student_id).eq("class_id", password_data["class_id"]).eq("slot_number", slot_number).eq("attendance_date", today.isoformat()).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Error checking existing attendance. Please try again."}
-
-        if existing_attendance.data:
-            existing_time = datetime.fromisoformat(existing_attendance.data[0]["created_at"].replace('Z', '+00:00'))
-            return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {existing_time.strftime('%I:%M %p')}"}
+        slot_number = context.slot_number
+        marked_at = context.marked_at(student["id"])
+        if marked_at:
+            return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {format_marked_time(marked_at)}"}
+
+        attendance_token = attendance_tokens.issue(
+            {
+                "sid": student["id"],
+                "fid": student_firebase_id,
+                "name": student["name"],
+                "cid": context.class_id,
+                "slot": slot_number,
+                "sess": attendance_tokens.fingerprint(session_key)
+            },
+            # A stored password's token dies with it; a rotating code's outlives the code
+            expires_at=None if password_data.get("mode") == "rotating" else datetime.fromisoformat(password_data["expires_at"]).timestamp()
+        )
 
         return {
             "success": True,
             "data": {
-                "class_id": password_data["class_id"],
-                "class_name": class_name,
-                "student_name": student_name,
-                "valid": True
+                "class_id": context.class_id,
+                "class_name": context.class_name,
+                "student_name": student["name"],
+                "valid": True,
+                "attendance_token": attendance_token
             },
             "message": "Password validated successfully. Please proceed with face recognition."
         }
@@ -2293,6 +3219,149 @@ async def validate_instant_password(request_data: dict):
             "message": "An unexpected error occurred. Please try again or contact support."
         }
 
+def verified_mark_claims(token: Optional[str], session_key: str, student_firebase_id: str, context: InstantSessionContext,
+                         require_face: bool = True) -> Optional[dict]:
+    """Claims of a (face-verified, unless require_face is False) token issued for this student and session, else None"""
+    if not token:
+        return None
+
+    try:
+        claims = attendance_tokens.verify(token)
+    except InvalidAttendanceToken as token_error:
+        print(f"⚠️ Ignoring attendance token: {token_error}")
+        return None
+
+    if not (
+        (claims.get("face") is True or not require_face)
+        and claims.get("fid") == student_firebase_id
+        and claims.get("cid") == context.class_id
+        and claims.get("slot") == context.slot_number
+        and claims.get("sess") == attendance_tokens.fingerprint(session_key)
+    ):
+        print("⚠️ Ignoring attendance token that does not match this mark request")
+        return None
+    return claims
+
+def record_instant_mark(context: InstantSessionContext, student_id: int, student_name: str) -> dict:
+    """Write the mark for a student already verified for this session"""
+    slot_number = context.slot_number
+    ist_now = get_ist_now()
+
+    if attendance_writer:
+        # Write-behind: claim the slot in memory, then acknowledge once the row is journaled
+        marked_at = context.claim_mark(student_id, ist_now.isoformat())
+        if marked_at:
+            return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {format_marked_time(marked_at)}"}
+
+        try:
+            attendance_writer.enqueue({
+                "student_id": student_id,
+                "class_id": context.class_id,
+                "slot_number": slot_number,
+                "day_of_week": ist_now.weekday() + 1,  # Convert to 1-7 format
+                "attendance_date": ist_now.date().isoformat(),
+                "status": "present",
+                "marked_by": "instant_password",
+                "created_at": ist_now.isoformat()
+            })
+        except Exception as journal_error:
+            context.release_mark(student_id)
+            print(f"Failed to journal attendance: {journal_error}")
+            return {"success": False, "message": "Failed to save attendance. Please try again."}
+    else:
+        # A single INSERT ... ON CONFLICT; a second mark for the slot is a no-op
+        try:
+            result = supabase.rpc("upsert_attendance", {
+                "p_student_id": student_id,
+                "p_class_id": context.class_id,
+                "p_slot_number": slot_number,
+                "p_day_of_week": ist_now.weekday() + 1,  # Convert to 1-7 format
+                "p_attendance_date": ist_now.date().isoformat(),
+                "p_status": "present",
+                "p_marked_by": "instant_password",
+                "p_overwrite": False
+            }).execute()
+            mark = result.data[0]
+        except Exception as db_error:
+            print(f"Failed to mark instant attendance: {db_error}")
+            return {"success": False, "message": "Failed to save attendance. Please try again."}
+
+        context.record_mark(student_id, mark["marked_at"])
+        if not mark["created"]:
+            return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {format_marked_time(mark['marked_at'])}"}
+
+    publish_instant_mark(context, student_id, student_name, ist_now.isoformat())
+
+    return {
+        "success": True,
+        "data": {
+            "student_name": student_name,
+            "status": "present",
+            "slot_number": slot_number,
+            "marked_at": ist_now.isoformat()
+        },
+        "message": f"Attendance marked successfully for {student_name} (Slot {slot_number})"
+    }
+
+def mark_instant_attendance_direct(context: InstantSessionContext, student_firebase_id: str) -> dict:
+    """Resolve, enroll or approve and mark a student in one database function call.
+
+    The unique key makes a second mark for the slot a no-op, reported as
+    already_marked with the existing mark's time.
+    """
+    slot_number = context.slot_number
+    ist_now = get_ist_now()
+
+    try:
+        result = supabase.rpc("instant_mark_attendance", {
+            "p_student_firebase_id": student_firebase_id,
+            "p_class_id": context.class_id,
+            "p_slot_number": slot_number,
+            "p_day_of_week": ist_now.weekday() + 1,  # Convert to 1-7 format
+            "p_attendance_date": ist_now.date().isoformat()
+        }).execute()
+        mark = result.data[0]
+    except Exception as db_error:
+        print(f"Failed to mark instant attendance: {db_error}")
+        return {"success": False, "message": "Failed to save attendance. Please try again."}
+
+    if mark["outcome"] == "student_not_found":
+        return {"success": False, "message": "Student account not found. Please contact your teacher."}
+    if mark["outcome"] == "not_student":
+        return {"success": False, "message": "Only students can mark attendance using instant passwords"}
+
+    student_id = mark["student_id"]
+    student_name = mark["student_name"]
+
+    if mark["enrollment_change"]:
+        response_cache.bump("class_enrollments")
+        print(f"Auto-{mark['enrollment_change']} student {student_id} for class {context.class_id}")
+
+    context.put_student(student_firebase_id, {
+        "id": student_id,
+        "name": student_name,
+        "role": "student",
+        "enrollment_id": mark["enrollment_id"],
+        "enrollment_status": "approved"
+    })
+    context.record_mark(student_id, mark["marked_at"])
+
+    if mark["outcome"] == "already_marked":
+        return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {format_marked_time(mark['marked_at'])}"}
+
+    publish_instant_mark(context, student_id, student_name, ist_now.isoformat())
+
+    return {
+        "success": True,
+        "data": {
+            "student_name": student_name,
+            "status": "present",
+            "slot_number": slot_number,
+            "marked_at": ist_now.isoformat()
+        },
+        "message": f"Attendance marked successfully for {student_name} (Slot {slot_number})"
+    }
+
 @app.post("/api/instant-attendance/mark")
 async def mark_instant_attendance(request_data: dict):
     """Mark attendance using instant password after face recognition"""
@@ -2324,125 +3393,133 @@ async def mark_instant_attendance(request_data: dict):
                 "message": "Attendance marked successfully"
             }
 
-        # Check if password exists and is valid
-        if password not in instant_passwords:
-            return {"success": False, "message": "Invalid or expired password. Please check with your teacher."}
-
-        password_data = instant_passwords[password]
+        # Check if password exists and is valid (expired sessions are dropped by the store)
+        attendance_token = request_data.get("attendance_token")
+        session_key, password_data = await lookup_instant_session(password, attendance_token, student_firebase_id)
+        if not password_data:
+            return {"success": False, "message": "Invalid or expired password. Please ask your teacher for a new one."}
 
-        # Check if password has expired
-        if datetime.now() > password_data["expires_at"]:
-            # Clean up expired password
-            try:
-                del instant_passwords[password]
-            except KeyError:
-                pass  # Password already cleaned up
-            return {"success": False, "message": "Password has expired. Please ask your teacher for a new one."}
+        context = get_instant_session_context(session_key, password_data)
+        slot_number = context.slot_number
 
-        # Get student's database ID and validate user
-        try:
-            student_result = supabase.table("users").select("id, name, role").eq("firebase_id", student_firebase_id).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Database connection error. Please try again."}
+        # A token from validation and face recognition already identifies the
+        # student; without one, a known student is still found in memory
+        claims = verified_mark_claims(attendance_token, session_key, student_firebase_id, context)
+        if claims:
+            student_id = claims["sid"]
+        else:
+            known_student = context.get_student(student_firebase_id)
+            student_id = known_student["id"] if known_student else None
 
-        if not student_result.data:
-            return {"success": False, "message": "Student account not found. Please contact your teacher."}
+        # Repeat attempts are rejected without a query
+        marked_at = context.marked_at(student_id) if student_id else None
+        if marked_at:
+            return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {format_marked_time(marked_at)}"}
 
-        student_data = student_result.data[0]
-        if student_data["role"] != "student":
-            return {"success": False, "message": "Only students can mark attendance using instant passwords"}
+        if claims:
+            return record_instant_mark(context, student_id, claims["name"])
 
-        student_id = student_data["id"]
-        student_name = student_data["name"]
+        if not attendance_writer:
+            return mark_instant_attendance_direct(context, student_firebase_id)
 
-        # Check if student is enrolled in the class
-        try:
-            enrollment_result = supabase.table("class_enrollments").select("id, status").eq("class_id", password_data["class_id"]).eq("student_id", student_id).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Error checking class enrollment. Please try again."}
+        # Write-behind is not a single round trip: a student missing from the
+        # preloaded roster is still resolved (and enrolled or approved) here
+        # before the mark is journaled
+        student, error_message = await resolve_instant_student(context, student_firebase_id)
+        if error_message:
+            return {"success": False, "message": error_message}
 
-        if not enrollment_result.data:
-            # Auto-enroll student in the class if they have a valid password
-            try:
-                enrollment_data_insert = {
-                    "class_id": password_data["class_id"],
-                    "student_id": student_id,
-                    "status": "approved",
-                    "enrolled_at": datetime.now().isoformat(),
-                    "approved_at": datetime.now().isoformat()
-                }
-                supabase.table("class_enrollments").insert(enrollment_data_insert).execute()
-                print(f"Auto-enrolled student {student_id} in class {password_data['class_id']} during attendance marking")
-            except Exception as enroll_error:
-                print(f"Failed to auto-enroll student during attendance: {enroll_error}")
-                return {"success": False, "message": "You are not enrolled in this class. Please join the class first from the 'Browse Classes' page."}
-        else:
-            enrollment_data = enrollment_result.data[0]
-            if enrollment_data.get("status") != "approved":
-                # Auto-approve if they have a valid password
-                try:
-                    supabase.table("class_enrollments").update({
-                        "status": "approved",
-                        "approved_at": datetime.now().isoformat()
-                    }).eq("id", enrollment_data["id"]).execute()
-                    print(f"Auto-approved student {student_id} for class {password_data['class_id']} during attendance marking")
-                except Exception as approve_error:
-                    print(f"Failed to auto-approve student during attendance: {approve_error}")
-                    return {"success": False, "message": "Your enrollment in this class is pending approval."}
-
-        # Get current day of week and date in IST
-        ist_now = get_ist_now()
-        today = ist_now.date()
-        day_of_week = ist_now.weekday() + 1  # Convert to 1-7 format
-        slot_number = password_data["slot_number"]
+        return record_instant_mark(context, student["id"], student["name"])
 
-        # Check if attendance already marked for this slot today
-        try:
-            existing_attendance = supabase.table("attendance").select("id, created_at").eq("student_id", student_id).eq("class_id", password_data["class_id"]).eq("slot_number", slot_number).eq("attendance_date", today.isoformat()).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Error checking existing attendance. Please try again."}
+    except Exception as e:
+        print(f"Unexpected error in mark_instant_attendance: {str(e)}")
+        return {
+            "success": False,
+            "message": "An unexpected error occurred. Please try again or contact support."
+        }
 
-        if existing_attendance.data:
-            existing_time = datetime.fromisoformat(existing_attendance.data[0]["created_at"].replace('Z', '+00:00'))
-            return {"success": False, "message": f"Attendance already marked for slot {slot_number} today at {existing_time.strftime('%I:%M %p')}"}
+@app.post("/api/instant-attendance/recognize-and-mark")
+async def recognize_and_mark_instant_attendance(
+    image: UploadFile = File(...),
+    password: str = Form(...),
+    student_firebase_id: str = Form(...),
+    attendance_token: Optional[str] = Form(None)
+):
+    """Recognize the student's face and mark instant attendance in one request.
 
-        # Mark attendance
-        attendance_data = {
-            "student_id": student_id,
-            "class_id": password_data["class_id"],
-            "slot_number": slot_number,
-            "day_of_week": day_of_week,
-            "attendance_date": today.isoformat(),
-            "status": "present",
-            "marked_by": "instant_password",
-            "created_at": ist_now.isoformat()
-        }
+    The face is matched against the session's preloaded encoding (fetched
+    once and kept on the session when not preloaded), and the mark is written
+    with a single INSERT ... ON CONFLICT only if it matches.
+    """
+    def rejected(message: str, **verdict) -> dict:
+        return {"success": False, "recognized": False, "marked": False, **verdict, "message": message}
 
-        try:
-            result = supabase.table("attendance").insert(attendance_data).execute()
-        except Exception as db_error:
-            return {"success": False, "message": "Failed to save attendance. Please try again."}
+    try:
+        password = password.strip()
+        if not password:
+            return rejected("Password is required")
 
-        if result.data:
+        if not SUPABASE_AVAILABLE:
             return {
                 "success": True,
-                "data": {
-                    "student_name": student_name,
-                    "status": "present",
-                    "slot_number": slot_number,
-                    "marked_at": ist_now.isoformat()
-                },
-                "message": f"Attendance marked successfully for {student_name} (Slot {slot_number})"
+                "recognized": True,
+                "liveness_check": True,
+                "confidence": 0.95,
+                "marked": True,
+                "data": {"message": "Attendance marked (demo mode)"},
+                "message": "Attendance marked successfully"
             }
+
+        # Check if password exists and is valid (expired sessions are dropped by the store)
+        session_key, password_data = await lookup_instant_session(password, attendance_token, student_firebase_id)
+        if not password_data:
+            return rejected("Invalid or expired password. Please ask your teacher for a new one.")
+
+        context = get_instant_session_context(session_key, password_data)
+        slot_number = context.slot_number
+
+        # The token from validation (if sent) already identifies the student
+        claims = verified_mark_claims(attendance_token, session_key, student_firebase_id, context, require_face=False)
+        if claims:
+            student_id, student_name = claims["sid"], claims["name"]
         else:
-            return {"success": False, "message": "Failed to mark attendance"}
+            student, error_message = await resolve_instant_student(context, student_firebase_id)
+            if error_message:
+                return rejected(error_message)
+            student_id, student_name = student["id"], student["name"]
+
+        # Skip the face pipeline entirely for repeat attempts
+        marked_at = context.marked_at(student_id)
+        if marked_at:
+            return rejected(f"Attendance already marked for slot {slot_number} today at {format_marked_time(marked_at)}")
+
+        stored_encoding = context.get_encoding(student_id)
+        if stored_encoding is None:
+            try:
+                encoding_result = await run_in_threadpool(
+                    lambda: supabase.table("face_encodings").select(FACE_ENCODING_COLUMNS).eq("user_id", student_id).execute()
+                )
+            except Exception as db_error:
+                return rejected("Database connection error. Please try again.")
+
+            if not encoding_result.data:
+                return rejected("No enrolled face found. Please enroll your face first.")
+
+            stored_encoding = encoding_result.data[0]["encoding"]
+            context.put_encoding(student_id, stored_encoding)
+
+        _, verdict = await run_face_request(recognize_upload, image, stored_encoding)
+        if not verdict.get("recognized"):
+            return rejected(verdict["message"], **{key: value for key, value in verdict.items() if key not in ("success", "message")})
 
+        mark = record_instant_mark(context, student_id, student_name)
+        return {**verdict, **mark, "marked": mark["success"]}
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Unexpected error in mark_instant_attendance: {str(e)}")
-        return {
-            "success": False,
-            "message": "An unexpected error occurred. Please try again or contact support."
-        }
+        print(f"Unexpected error in recognize_and_mark_instant_attendance: {str(e)}")
+        return rejected("An unexpected error occurred. Please try again or contact support.")
 
 @app.post("/api/attendance/mark-manual")
 async def mark_manual_attendance(request_data: dict):
@@ -2464,10 +3541,78 @@ async def mark_manual_attendance(request_data: dict):
                 "message": "Attendance marked successfully"
             }
 
-        # Verify teacher owns the class
-        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
-        if not teacher_result.data:
-            return {"success": False, "message": "Teacher not found"}
+        # Ownership check, student lookup and the create-or-overwrite of the
+        # slot's mark run in one database function call
+        ist_now = get_ist_now()
+        result = supabase.rpc("manual_mark_attendance", {
+            "p_teacher_firebase_id": teacher_firebase_id,
+            "p_student_firebase_id": student_firebase_id,
+            "p_class_id": class_id,
+            "p_slot_number": slot_number,
+            "p_day_of_week": ist_now.weekday() + 1,  # Convert to 1-7 format
+            "p_attendance_date": ist_now.date().isoformat(),
+            "p_status": status
+        }).execute()
+        mark = result.data[0]
+
+        if mark["outcome"] == "teacher_not_found":
+            return {"success": False, "message": "Teacher not found"}
+        if mark["outcome"] == "unauthorized":
+            return {"success": False, "message": "Unauthorized or class not found"}
+        if mark["outcome"] == "student_not_found":
+            return {"success": False, "message": "Student not found"}
+
+        student_name = mark["student_name"]
+
+        return {
+            "success": True,
+            "data": {
+                "student_name": student_name,
+                "status": status,
+                "slot_number": slot_number,
+                "marked_at": ist_now.isoformat(),
+                "created": mark["created"]
+            },
+            "message": f"Attendance marked as {status} for {student_name} (Slot {slot_number})"
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to mark attendance: {str(e)}")
+
+VALID_ATTENDANCE_STATUSES = {"present", "absent", "late"}
+
+@app.post("/api/attendance/mark-manual/bulk")
+async def mark_manual_attendance_bulk(request_data: dict):
+    """Mark attendance for a whole roster in one request"""
+    try:
+        class_id = request_data.get("class_id")
+        slot_number = request_data.get("slot_number", 1)
+        teacher_firebase_id = request_data.get("teacher_firebase_id")
+        records = request_data.get("records") or []
+
+        if not class_id or not teacher_firebase_id:
+            return {"success": False, "message": "Missing required fields"}
+
+        if not isinstance(records, list) or not records:
+            return {"success": False, "message": "At least one attendance record is required"}
+
+        if not SUPABASE_AVAILABLE:
+            return {
+                "success": True,
+                "data": {
+                    "marked_count": len(records),
+                    "results": [
+                        {"student_firebase_id": record.get("student_firebase_id"), "status": record.get("status", "present"), "outcome": "marked"}
+                        for record in records
+                    ]
+                },
+                "message": "Attendance marked successfully (demo mode)"
+            }
+
+        # Verify teacher owns the class (once for the whole roster)
+        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
+        if not teacher_result.data:
+            return {"success": False, "message": "Teacher not found"}
 
         teacher_id = teacher_result.data[0]["id"]
 
@@ -2475,56 +3620,61 @@ async def mark_manual_attendance(request_data: dict):
         if not class_result.data:
             return {"success": False, "message": "Unauthorized or class not found"}
 
-        # Get student's database ID
-        student_result = supabase.table("users").select("id, name").eq("firebase_id", student_firebase_id).execute()
-        if not student_result.data:
-            return {"success": False, "message": "Student not found"}
-
-        student_id = student_result.data[0]["id"]
-        student_name = student_result.data[0]["name"]
+        # Resolve every student in one query
+        firebase_ids = [record.get("student_firebase_id") for record in records if record.get("student_firebase_id")]
+        students = fetch_rows_by_ids("users", "id, name, firebase_id", "firebase_id", firebase_ids)
+        students_by_firebase_id = {student["firebase_id"]: student for student in students}
 
-        # Get current day of week and date in IST
         ist_now = get_ist_now()
         today = ist_now.date()
         day_of_week = ist_now.weekday() + 1  # Convert to 1-7 format
 
-        # Check if attendance already marked for this slot today
-        existing_attendance = supabase.table("attendance").select("id").eq("student_id", student_id).eq("class_id", class_id).eq("slot_number", slot_number).eq("attendance_date", today.isoformat()).execute()
+        results = []
+        rows_by_student_id = {}
+        for record in records:
+            student_firebase_id = record.get("student_firebase_id")
+            status = record.get("status", "present")
+            student = students_by_firebase_id.get(student_firebase_id)
 
-        if existing_attendance.data:
-            # Update existing attendance
-            result = supabase.table("attendance").update({
-                "status": status,
-                "marked_by": "teacher",
-                "updated_at": ist_now.isoformat()
-            }).eq("id", existing_attendance.data[0]["id"]).execute()
-        else:
-            # Create new attendance record
-            attendance_data = {
-                "student_id": student_id,
+            if not student:
+                results.append({"student_firebase_id": student_firebase_id, "status": status, "outcome": "student_not_found"})
+                continue
+
+            if status not in VALID_ATTENDANCE_STATUSES:
+                results.append({"student_firebase_id": student_firebase_id, "student_name": student["name"], "status": status, "outcome": "invalid_status"})
+                continue
+
+            # A later entry for the same student wins, matching sequential single marks
+            rows_by_student_id[student["id"]] = {
+                "student_id": student["id"],
                 "class_id": class_id,
                 "slot_number": slot_number,
                 "day_of_week": day_of_week,
                 "attendance_date": today.isoformat(),
                 "status": status,
                 "marked_by": "teacher",
-                "created_at": ist_now.isoformat()
+                "updated_at": ist_now.isoformat()
             }
-            result = supabase.table("attendance").insert(attendance_data).execute()
+            results.append({"student_firebase_id": student_firebase_id, "student_name": student["name"], "status": status, "outcome": "marked"})
 
-        if result.data:
-            return {
-                "success": True,
-                "data": {
-                    "student_name": student_name,
-                    "status": status,
-                    "slot_number": slot_number,
-                    "marked_at": ist_now.isoformat()
-                },
-                "message": f"Attendance marked as {status} for {student_name} (Slot {slot_number})"
-            }
-        else:
-            return {"success": False, "message": "Failed to mark attendance"}
+        if rows_by_student_id:
+            supabase.table("attendance").upsert(
+                list(rows_by_student_id.values()),
+                on_conflict="student_id,class_id,slot_number,attendance_date"
+            ).execute()
+
+        marked_count = len(rows_by_student_id)
+        return {
+            "success": True,
+            "data": {
+                "class_id": class_id,
+                "slot_number": slot_number,
+                "attendance_date": today.isoformat(),
+                "marked_count": marked_count,
+                "results": results
+            },
+            "message": f"Attendance marked for {marked_count} student(s) (Slot {slot_number})"
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to mark attendance: {str(e)}")
@@ -2548,7 +3698,7 @@ async def check_attendance(student_firebase_id: str, class_id: int, date: str, s
         student_id = student_result.data[0]["id"]
 
         # Check attendance for the specific date and slot
-        query = supabase.table("attendance").select("*").eq("student_id", student_id).eq("class_id", class_id).eq("attendance_date", date)
+        query = supabase.table("attendance").select(ATTENDANCE_COLUMNS).eq("student_id", student_id).eq("class_id", class_id).eq("attendance_date", date)
 
         if slot_number is not None:
             query = query.eq("slot_number", slot_number)
@@ -2571,88 +3721,638 @@ async def check_attendance(student_firebase_id: str, class_id: int, date: str, s
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to check attendance: {str(e)}")
 
-@app.get("/api/timetables/student/{student_firebase_id}")
-async def get_timetable_by_student(student_firebase_id: str):
-    """Get timetable for a student's enrolled classes"""
+# Attendance Statistics Endpoints
+# Counters in attendance_student_stats / attendance_class_date_stats /
+# attendance_class_stats are kept current by a trigger on attendance (see database/performance_setup.sql), so
+# these endpoints never scan raw attendance rows.
+
+def format_attendance_stats(stats: dict) -> dict:
+    """Add a rounded attendance percentage to an aggregate counter row"""
+    total = stats.get("total_count") or 0
+    present = stats.get("present_count") or 0
+    return {
+        "present": present,
+        "absent": stats.get("absent_count") or 0,
+        "total": total,
+        "attendance_percentage": round(present * 100.0 / total, 2) if total > 0 else 0
+    }
+
+@app.get("/api/attendance/stats/student/{student_firebase_id}")
+async def get_student_attendance_stats(student_firebase_id: str):
+    """Get per-class attendance counters for a student"""
     try:
         if not SUPABASE_AVAILABLE:
             return {
                 "success": True,
                 "data": [
                     {
-                        "id": 1,
                         "class_id": 1,
                         "class_name": "Mathematics 101",
                         "subject": "Mathematics",
-                        "teacher_name": "John Doe",
-                        "day_of_week": 1,
-                        "slot_number": 1,
-                        "start_time": "09:00 AM",
-                        "end_time": "09:50 AM"
+                        "present": 18,
+                        "absent": 2,
+                        "total": 20,
+                        "attendance_percentage": 90.0
                     }
                 ]
             }
 
-        # Get student's database ID
         student_result = supabase.table("users").select("id").eq("firebase_id", student_firebase_id).execute()
         if not student_result.data:
             return {"success": False, "message": "Student not found"}
 
         student_id = student_result.data[0]["id"]
 
-        # Get student's enrolled classes
-        student_classes_result = supabase.table("class_enrollments").select("class_id").eq("student_id", student_id).execute()
-        student_class_ids = [item["class_id"] for item in student_classes_result.data] if student_classes_result.data else []
+        stats_rows = fetch_all_rows(
+            lambda: supabase.table("attendance_student_stats").select("class_id, present_count, absent_count, total_count").eq("student_id", student_id),
+            order_by="class_id"
+        )
+
+        class_ids = [row["class_id"] for row in stats_rows]
+        classes_by_id = {}
+        if class_ids:
+            classes_result = supabase.table("classes").select("id, name, subject").in_("id", class_ids).execute()
+            classes_by_id = {cls["id"]: cls for cls in classes_result.data or []}
+
+        data = []
+        for row in stats_rows:
+            class_info = classes_by_id.get(row["class_id"], {})
+            data.append({
+                "class_id": row["class_id"],
+                "class_name": class_info.get("name", "Unknown Class"),
+                "subject": class_info.get("subject", "Unknown Subject"),
+                **format_attendance_stats(row)
+            })
+
+        return {
+            "success": True,
+            "data": data
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get attendance stats: {str(e)}")
 
-        if not student_class_ids:
+@app.get("/api/attendance/stats/class/{class_id}")
+async def get_class_attendance_stats(class_id: int, start_date: str = None, end_date: str = None):
+    """Get per-student and per-date attendance counters for a class"""
+    try:
+        if not SUPABASE_AVAILABLE:
+            return {
+                "success": True,
+                "data": {
+                    "class_id": class_id,
+                    "students": [],
+                    "dates": [],
+                    "overall": format_attendance_stats({})
+                }
+            }
+
+        student_stats = fetch_all_rows(
+            lambda: supabase.table("attendance_student_stats").select("student_id, present_count, absent_count, total_count").eq("class_id", class_id),
+            order_by="student_id"
+        )
+
+        def build_dates_query():
+            dates_query = supabase.table("attendance_class_date_stats").select("attendance_date, present_count, absent_count, total_count").eq("class_id", class_id)
+            if start_date:
+                dates_query = dates_query.gte("attendance_date", start_date)
+            if end_date:
+                dates_query = dates_query.lte("attendance_date", end_date)
+            return dates_query
+
+        date_stats = fetch_all_rows(build_dates_query, order_by="attendance_date")
+        class_stats_result = supabase.table("attendance_class_stats").select("present_count, absent_count, total_count").eq("class_id", class_id).execute()
+
+        students = [
+            {"student_id": row["student_id"], **format_attendance_stats(row)}
+            for row in student_stats
+        ]
+        dates = [
+            {"date": row["attendance_date"], **format_attendance_stats(row)}
+            for row in date_stats
+        ]
+        overall = class_stats_result.data[0] if class_stats_result.data else {}
+
+        return {
+            "success": True,
+            "data": {
+                "class_id": class_id,
+                "students": students,
+                "dates": dates,
+                "overall": format_attendance_stats(overall)
+            }
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get class attendance stats: {str(e)}")
+
+@app.get("/api/attendance/stats/teacher/{teacher_firebase_id}")
+async def get_teacher_attendance_stats(teacher_firebase_id: str):
+    """Get attendance counters for every class taught by a teacher"""
+    try:
+        if not SUPABASE_AVAILABLE:
             return {
                 "success": True,
                 "data": []
             }
 
-        # Get timetable for student's enrolled classes with proper joins
-        formatted_data = []
+        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
+        if not teacher_result.data:
+            return {"success": False, "message": "Teacher not found"}
+
+        teacher_id = teacher_result.data[0]["id"]
+
+        classes_result = supabase.table("classes").select("id, name, subject").eq("teacher_id", teacher_id).execute()
+        teacher_classes = classes_result.data or []
+        if not teacher_classes:
+            return {"success": True, "data": []}
+
+        # One counter row per class
+        class_ids = [cls["id"] for cls in teacher_classes]
+        totals_by_class = {
+            row["class_id"]: row
+            for row in fetch_all_rows(
+                lambda: supabase.table("attendance_class_stats").select("class_id, present_count, absent_count, total_count").in_("class_id", class_ids),
+                order_by="class_id"
+            )
+        }
+
+        return {
+            "success": True,
+            "data": [
+                {
+                    "class_id": cls["id"],
+                    "class_name": cls["name"],
+                    "subject": cls["subject"],
+                    **format_attendance_stats(totals_by_class.get(cls["id"], {}))
+                }
+                for cls in teacher_classes
+            ]
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get teacher attendance stats: {str(e)}")
 
-        for class_id in student_class_ids:
-            # Get class information first
-            class_result = supabase.table("classes").select("id, name, subject, teacher_id").eq("id", class_id).execute()
+@app.post("/api/attendance/stats/rebuild")
+async def rebuild_attendance_stats(request_data: dict):
+    """Recompute attendance counters from raw rows for a teacher's classes"""
+    try:
+        teacher_firebase_id = request_data.get("teacher_firebase_id")
+        class_id = request_data.get("class_id")
 
-            if not class_result.data:
+        if not teacher_firebase_id:
+            return {"success": False, "message": "Teacher ID is required"}
+
+        if not SUPABASE_AVAILABLE:
+            return {
+                "success": True,
+                "data": {"rebuilt_count": 0},
+                "message": "Attendance stats rebuilt (demo mode)"
+            }
+
+        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
+        if not teacher_result.data:
+            return {"success": False, "message": "Teacher not found"}
+
+        teacher_id = teacher_result.data[0]["id"]
+
+        classes_query = supabase.table("classes").select("id").eq("teacher_id", teacher_id)
+        if class_id:
+            classes_query = classes_query.eq("id", class_id)
+        class_ids = [cls["id"] for cls in classes_query.execute().data or []]
+
+        if not class_ids:
+            return {"success": False, "message": "Unauthorized or class not found"}
+
+        result = supabase.rpc("rebuild_attendance_stats", {"p_class_ids": class_ids}).execute()
+
+        return {
+            "success": True,
+            "data": {
+                "class_ids": class_ids,
+                "rebuilt_count": result.data or 0
+            },
+            "message": f"Attendance stats rebuilt for {len(class_ids)} class(es)"
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild attendance stats: {str(e)}")
+
+# Dashboard Endpoints
+
+# Dashboards are rebuilt at most this often per user (sooner after roster or
+# class changes, which are part of the cache key)
+dashboard_cache = AnalyticsCache(ttl_seconds=float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "15")))
+
+def dashboard_cache_key(role: str, firebase_id: str, day: str) -> tuple:
+    versions = response_cache.versions(("users", "classes", "class_enrollments"))
+    return (role, firebase_id, day, tuple(sorted(versions.items())))
+
+def summarize_attendance(records) -> dict:
+    """Present/absent/total counters (with percentage) over attendance rows"""
+    present = sum(1 for record in records if record["status"] == "present")
+    absent = sum(1 for record in records if record["status"] == "absent")
+    return format_attendance_stats({"present_count": present, "absent_count": absent, "total_count": len(records)})
+
+@app.get("/api/dashboard/teacher/{teacher_firebase_id}")
+async def get_teacher_dashboard(teacher_firebase_id: str, request: Request):
+    """Get the teacher dashboard and students pages in one call.
+
+    Classes with attendance counters, the approved roster with photo URLs and
+    today's status, today's and this week's totals and the latest marks. The
+    queries after the teacher lookup run concurrently.
+    """
+    if not SUPABASE_AVAILABLE:
+        return {
+            "success": True,
+            "data": {
+                "classes": [],
+                "students": [],
+                "today": format_attendance_stats({}),
+                "week": format_attendance_stats({}),
+                "daily": [],
+                "recent_attendance": []
+            }
+        }
+
+    try:
+        ist_now = get_ist_now()
+        today = ist_now.strftime("%Y-%m-%d")
+        week_ago = (ist_now - timedelta(days=7)).strftime("%Y-%m-%d")
+
+        cache_key = dashboard_cache_key("teacher", teacher_firebase_id, today)
+        cached_dashboard = dashboard_cache.get(cache_key)
+        if cached_dashboard is not None:
+            return cached_dashboard
+
+        teacher_result = await run_in_threadpool(
+            lambda: supabase.table("users").select("id, firebase_id, name, role").eq("firebase_id", teacher_firebase_id).execute()
+        )
+        if not teacher_result.data or teacher_result.data[0]["role"] != "teacher":
+            return {"success": False, "message": "Teacher not found"}
+
+        teacher = teacher_result.data[0]
+        teacher_id = teacher["id"]
+
+        # Every query below is scoped to the teacher's classes through an
+        # embedded classes filter, so none has to wait for the class list
+        student_columns = columns("users", "id", "firebase_id", "name", "email", "student_id", "has_profile_photo", "profile_photo_key")
+        classes, roster, today_rows, class_stats, date_stats, recent_rows = await lookup_fanout.run(
+            lambda: fetch_all_rows(
+                lambda: supabase.table("classes").select(CLASS_COLUMNS).eq("teacher_id", teacher_id)
+            ),
+            lambda: fetch_all_rows(
+                lambda: supabase.table("class_enrollments").select(
+                    f"class_id, enrolled_at, {ENROLLED_STUDENT}!inner ({student_columns}), classes!inner (teacher_id)"
+                ).eq("classes.teacher_id", teacher_id).eq("status", "approved")
+            ),
+            lambda: fetch_all_rows(
+                lambda: supabase.table("attendance").select(
+                    "student_id, class_id, slot_number, status, created_at, classes!inner (teacher_id)"
+                ).eq("classes.teacher_id", teacher_id).eq("attendance_date", today).order("created_at")
+            ),
+            lambda: fetch_all_rows(
+                lambda: supabase.table("attendance_student_stats").select(
+                    "class_id, present_count, absent_count, total_count, classes!inner (teacher_id)"
+                ).eq("classes.teacher_id", teacher_id).order("class_id"),
+                order_by="student_id"
+            ),
+            lambda: fetch_all_rows(
+                lambda: supabase.table("attendance_class_date_stats").select(
+                    "attendance_date, present_count, absent_count, total_count, classes!inner (teacher_id)"
+                ).eq("classes.teacher_id", teacher_id).gte("attendance_date", week_ago).order("attendance_date"),
+                order_by="class_id"
+            ),
+            lambda: supabase.table("attendance").select(
+                "id, student_id, class_id, slot_number, attendance_date, status, created_at, classes!inner (teacher_id)"
+            ).eq("classes.teacher_id", teacher_id).gte("attendance_date", week_ago).order("created_at", desc=True).limit(10).execute().data or []
+        )
+
+        totals_by_class = {}
+        for row in class_stats:
+            totals = totals_by_class.setdefault(row["class_id"], {"present_count": 0, "absent_count": 0, "total_count": 0})
+            for key in totals:
+                totals[key] += row.get(key) or 0
+
+        class_names = {class_info["id"]: class_info["name"] for class_info in classes}
+        class_data = [
+            {**class_info, **format_attendance_stats(totals_by_class.get(class_info["id"], {}))}
+            for class_info in classes
+        ]
+
+        # Latest mark today per (student, class)
+        today_by_student_class = {(row["student_id"], row["class_id"]): row for row in today_rows}
+
+        students = []
+        students_by_id = {}
+        for enrollment in roster:
+            user = enrollment["users"]
+            students_by_id[user["id"]] = user
+            photo = user.get("profile_photo_key")
+            today_mark = today_by_student_class.get((user["id"], enrollment["class_id"]))
+            students.append({
+                "id": user["id"],
+                "firebase_id": user["firebase_id"],
+                "name": user["name"],
+                "email": user["email"],
+                "student_id": user["student_id"],
+                "class_id": enrollment["class_id"],
+                "class_name": class_names.get(enrollment["class_id"], "Unknown Class"),
+                "enrolled_at": enrollment["enrolled_at"],
+                # Legacy inline photos are left out to keep the payload small;
+                # has_photo without a photo_url means fetch it from /api/profile-photos
+                "photo_url": image_url(photo, request),
+                "thumbnail_url": image_url(profile_thumbnail_key(photo), request),
+                "has_photo": bool(user.get("has_profile_photo")),
+                "today": {
+                    "status": today_mark["status"],
+                    "slot_number": today_mark["slot_number"],
+                    "marked_at": today_mark["created_at"]
+                } if today_mark else None
+            })
+
+        daily_totals = {}
+        for row in date_stats:
+            totals = daily_totals.setdefault(row["attendance_date"], {"present_count": 0, "absent_count": 0, "total_count": 0})
+            for key in totals:
+                totals[key] += row.get(key) or 0
+        week_totals = {
+            key: sum(totals[key] for totals in daily_totals.values())
+            for key in ("present_count", "absent_count", "total_count")
+        }
+
+        recent_attendance = []
+        for row in recent_rows:
+            student = students_by_id.get(row["student_id"], {})
+            recent_attendance.append({
+                "id": row["id"],
+                "student_id": row["student_id"],
+                "class_id": row["class_id"],
+                "slot_number": row["slot_number"],
+                "attendance_date": row["attendance_date"],
+                "status": row["status"],
+                "created_at": row["created_at"],
+                "student_name": student.get("name", "Unknown Student"),
+                "student_roll_id": student.get("student_id", ""),
+                "class_name": class_names.get(row["class_id"], "Unknown Class")
+            })
+
+        dashboard = {
+            "success": True,
+            "data": {
+                "teacher": {"id": teacher_id, "firebase_id": teacher["firebase_id"], "name": teacher["name"]},
+                "date": today,
+                "classes": class_data,
+                "total_students": sum(class_info.get("student_count") or 0 for class_info in classes),
+                "students": students,
+                "today": summarize_attendance(today_rows),
+                "week": format_attendance_stats(week_totals),
+                "daily": [{"date": day, **format_attendance_stats(totals)} for day, totals in daily_totals.items()],
+                "recent_attendance": recent_attendance
+            }
+        }
+        dashboard_cache.set(cache_key, dashboard)
+        return dashboard
+
+    except Exception as e:
+        print(f"Error building teacher dashboard: {str(e)}")
+        return {"success": False, "message": f"Failed to load dashboard: {str(e)}"}
+
+@app.get("/api/dashboard/student/{student_firebase_id}")
+async def get_student_dashboard(student_firebase_id: str, request: Request):
+    """Get the student dashboard in one call.
+
+    Profile photo, enrolled classes with teacher names and attendance
+    counters, today/week/month totals and the last 30 days of marks. The
+    queries after the student lookup run concurrently.
+    """
+    if not SUPABASE_AVAILABLE:
+        return {
+            "success": True,
+            "data": {
+                "classes": [],
+                "summary": {period: format_attendance_stats({}) for period in ("today", "week", "month")},
+                "attendance": []
+            }
+        }
+
+    try:
+        ist_now = get_ist_now()
+        today = ist_now.strftime("%Y-%m-%d")
+        week_ago = (ist_now - timedelta(days=7)).strftime("%Y-%m-%d")
+        month_ago = (ist_now - timedelta(days=30)).strftime("%Y-%m-%d")
+
+        cache_key = dashboard_cache_key("student", student_firebase_id, today)
+        cached_dashboard = dashboard_cache.get(cache_key)
+        if cached_dashboard is not None:
+            return cached_dashboard
+
+        student_columns = columns("users", "id", "firebase_id", "name", "email", "student_id", "role", "has_profile_photo", "profile_photo_key")
+        student_result = await run_in_threadpool(
+            lambda: supabase.table("users").select(student_columns).eq("firebase_id", student_firebase_id).execute()
+        )
+        if not student_result.data:
+            return {"success": False, "message": "Student not found"}
+
+        student = student_result.data[0]
+        student_id = student["id"]
+
+        enrollments, class_stats, month_rows, _ = await lookup_fanout.run(
+            lambda: supabase.table("class_enrollments").select(
+                "status, enrolled_at, classes!inner (id, name, subject, teacher_id)"
+            ).eq("student_id", student_id).execute().data or [],
+            lambda: supabase.table("attendance_student_stats").select(
+                "class_id, present_count, absent_count, total_count"
+            ).eq("student_id", student_id).execute().data or [],
+            lambda: fetch_all_rows(
+                lambda: supabase.table("attendance").select(
+                    "id, class_id, slot_number, attendance_date, status, created_at"
+                ).eq("student_id", student_id).gte("attendance_date", month_ago).order("attendance_date", desc=True).order("created_at", desc=True)
+            ),
+            # Teacher names come from the in-process timetable index
+            timetable_index.ensure_fresh
+        )
+
+        stats_by_class = {row["class_id"]: row for row in class_stats}
+        classes_by_id = {}
+        class_data = []
+        for enrollment in enrollments:
+            class_info = enrollment.get("classes")
+            if not class_info:
                 continue
+            classes_by_id[class_info["id"]] = class_info
+            class_data.append({
+                "id": class_info["id"],
+                "name": class_info["name"],
+                "subject": class_info["subject"],
+                "teacher_name": timetable_index.teacher_name(class_info.get("teacher_id")),
+                "status": enrollment["status"],
+                "enrolled_at": enrollment["enrolled_at"],
+                **format_attendance_stats(stats_by_class.get(class_info["id"], {}))
+            })
 
-            class_info = class_result.data[0]
-            teacher_id = class_info.get("teacher_id")
-
-            # Get teacher information separately
-            teacher_name = "Unknown"
-            if teacher_id:
-                teacher_result = supabase.table("users").select("name").eq("id", teacher_id).execute()
-                if teacher_result.data:
-                    teacher_name = teacher_result.data[0].get("name", "Unknown")
-
-            # Get timetable slots for this class
-            slots_result = supabase.table("timetable_slots").select("""
-                id, day_of_week, slot_number, start_time, end_time
-            """).eq("class_id", class_id).execute()
-
-            if slots_result.data:
-                for slot in slots_result.data:
-                    # Convert times to 12-hour format
-                    start_time_12hr = convert_to_12hr_format(slot["start_time"])
-                    end_time_12hr = convert_to_12hr_format(slot["end_time"])
-
-                    formatted_slot = {
-                        "id": slot["id"],
-                        "class_id": class_id,
-                        "class_name": class_info.get("name", "Unknown"),
-                        "subject": class_info.get("subject", "Unknown"),
-                        "teacher_name": teacher_name,
-                        "day_of_week": slot["day_of_week"],
-                        "slot_number": slot["slot_number"],
-                        "start_time": start_time_12hr,
-                        "end_time": end_time_12hr
+        attendance = []
+        for row in month_rows:
+            class_info = classes_by_id.get(row["class_id"], {})
+            attendance.append({
+                **row,
+                "class_name": class_info.get("name", "Unknown Class"),
+                "subject": class_info.get("subject", "Unknown Subject")
+            })
+
+        photo = student.get("profile_photo_key")
+        if photo is None and student.get("has_profile_photo"):
+            # Legacy inline photo not yet moved to the blob store
+            photo_result = await run_in_threadpool(
+                lambda: supabase.table("users").select(PROFILE_PHOTO_COLUMNS).eq("id", student_id).execute()
+            )
+            photo = photo_result.data[0].get("profile_photo_url") if photo_result.data else None
+        dashboard = {
+            "success": True,
+            "data": {
+                "student": {
+                    "id": student_id,
+                    "firebase_id": student["firebase_id"],
+                    "name": student["name"],
+                    "email": student["email"],
+                    "student_id": student["student_id"],
+                    "photo_url": image_url(photo, request),
+                    "thumbnail_url": image_url(profile_thumbnail_key(photo), request)
+                },
+                "date": today,
+                "classes": class_data,
+                "summary": {
+                    "today": summarize_attendance([row for row in month_rows if row["attendance_date"] == today]),
+                    "week": summarize_attendance([row for row in month_rows if row["attendance_date"] >= week_ago]),
+                    "month": summarize_attendance(month_rows)
+                },
+                "attendance": attendance
+            }
+        }
+        dashboard_cache.set(cache_key, dashboard)
+        return dashboard
+
+    except Exception as e:
+        print(f"Error building student dashboard: {str(e)}")
+        return {"success": False, "message": f"Failed to load dashboard: {str(e)}"}
+
+# Analytics Endpoints
+
+analytics_cache = AnalyticsCache(ttl_seconds=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "60")))
+
+@app.get("/api/analytics")
+async def get_teacher_analytics(teacher_firebase_id: str, start_date: str = None, end_date: str = None):
+    """Get aggregated attendance analytics for a teacher's classes"""
+    try:
+        if not SUPABASE_AVAILABLE:
+            return {
+                "success": True,
+                "data": compute_teacher_analytics([], 0, {}, {})
+            }
+
+        cache_key = (teacher_firebase_id, start_date, end_date)
+        cached_analytics = analytics_cache.get(cache_key)
+        if cached_analytics is not None:
+            return {
+                "success": True,
+                "data": cached_analytics
+            }
+
+        teacher_result = supabase.table("users").select("id").eq("firebase_id", teacher_firebase_id).execute()
+        if not teacher_result.data:
+            return {"success": False, "message": "Teacher not found"}
+
+        teacher_id = teacher_result.data[0]["id"]
+
+        classes_result = supabase.table("classes").select("id, name").eq("teacher_id", teacher_id).execute()
+        class_names = {cls["id"]: cls["name"] for cls in classes_result.data or []}
+        class_ids = list(class_names.keys())
+
+        if not class_ids:
+            analytics = compute_teacher_analytics([], 0, {}, {})
+            analytics_cache.set(cache_key, analytics)
+            return {"success": True, "data": analytics}
+
+        enrollments = fetch_all_rows(
+            lambda: supabase.table("class_enrollments").select("student_id").in_("class_id", class_ids).eq("status", "approved")
+        )
+        enrolled_student_ids = {enrollment["student_id"] for enrollment in enrollments}
+
+        def build_attendance_query():
+            query = supabase.table("attendance").select("student_id, class_id, attendance_date, status").in_("class_id", class_ids)
+            if start_date:
+                query = query.gte("attendance_date", start_date)
+            if end_date:
+                query = query.lte("attendance_date", end_date)
+            return query
+
+        records = fetch_all_rows(build_attendance_query)
+
+        student_ids = enrolled_student_ids | {record["student_id"] for record in records}
+        students = fetch_rows_by_ids("users", "id, name", "id", student_ids)
+        student_names = {student["id"]: student["name"] for student in students}
+
+        analytics = compute_teacher_analytics(records, len(enrolled_student_ids), student_names, class_names)
+        analytics_cache.set(cache_key, analytics)
+
+        return {
+            "success": True,
+            "data": analytics
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
+
+@app.get("/api/timetables/student/{student_firebase_id}")
+async def get_timetable_by_student(student_firebase_id: str, request: Request, response: Response):
+    """Get timetable for a student's enrolled classes"""
+    return await cached_response(
+        request, response, "timetable-student", student_firebase_id,
+        ("users", "classes", "class_enrollments", "timetable_slots"),
+        lambda: load_timetable_by_student(student_firebase_id)
+    )
+
+async def load_timetable_by_student(student_firebase_id: str):
+    """Build a student's timetable response"""
+    try:
+        if not SUPABASE_AVAILABLE:
+            return {
+                "success": True,
+                "data": [
+                    {
+                        "id": 1,
+                        "class_id": 1,
+                        "class_name": "Mathematics 101",
+                        "subject": "Mathematics",
+                        "teacher_name": "John Doe",
+                        "day_of_week": 1,
+                        "slot_number": 1,
+                        "start_time": "09:00 AM",
+                        "end_time": "09:50 AM"
                     }
-                    formatted_data.append(formatted_slot)
+                ]
+            }
+
+        await run_in_threadpool(timetable_index.ensure_fresh)
+
+        student_id = await run_in_threadpool(timetable_index.user_id, student_firebase_id)
+        if student_id is None:
+            return {"success": False, "message": "Student not found"}
+
+        class_ids = await run_in_threadpool(timetable_index.student_class_ids, student_id)
+        formatted_data = []
+        for class_info, slot in timetable_index.slots_for_classes(class_ids):
+            formatted_data.append({
+                "id": slot["id"],
+                "class_id": class_info["id"],
+                "class_name": class_info.get("name") or "Unknown",
+                "subject": class_info.get("subject") or "Unknown",
+                "teacher_name": timetable_index.teacher_name(class_info.get("teacher_id")),
+                "day_of_week": slot["day_of_week"],
+                "slot_number": slot["slot_number"],
+                "start_time": convert_to_12hr_format(slot["start_time"]),
+                "end_time": convert_to_12hr_format(slot["end_time"])
+            })
 
         return {
             "success": True,
@@ -2664,38 +4364,35 @@ async def get_timetable_by_student(student_firebase_id: str):
         return {"success": False, "message": f"Failed to fetch timetable: {str(e)}"}
 
 @app.get("/api/current-slot")
-async def get_current_slot():
+async def get_current_slot(request: Request, response: Response, institution: Optional[str] = None):
     """Get the current time slot based on the current time in IST"""
+    institution = institution or DEFAULT_INSTITUTION
+    if institution not in bell_schedules:
+        return {"success": False, "message": "Unknown institution"}
+
+    # The slot can only change at the next bell, so clients may cache the
+    # response until then
+    ist_now = get_ist_now()
+    _, _, seconds_until_change = bell_schedules[institution].current(ist_now)
+    changes_at = (ist_now + timedelta(seconds=seconds_until_change)).strftime("%Y-%m-%d %H:%M")
+    return await cached_response(
+        request, response, "current-slot", f"{institution}|{changes_at}", (),
+        lambda: load_current_slot(institution),
+        cache_control=f"public, max-age={seconds_until_change}"
+    )
+
+async def load_current_slot(institution: str):
+    """Build the current-slot response.
+
+    It is cached until the next bell, so it holds nothing that changes sooner
+    (no current time of day; clients use their own clock).
+    """
     try:
         # Get current time in IST
         ist_now = get_ist_now()
-        current_time = ist_now.time()
         current_day = ist_now.weekday() + 1  # Convert to 1-7 format
 
-        # Define slot times (9 slots from 9:00 AM to 5:00 PM) in 12-hour format
-        slot_times = [
-            ("09:00", "09:50", 1, "9:00 AM", "9:50 AM"),  # Slot 1
-            ("09:50", "10:40", 2, "9:50 AM", "10:40 AM"),  # Slot 2
-            ("10:50", "11:40", 3, "10:50 AM", "11:40 AM"),  # Slot 3 (after first recess)
-            ("11:40", "12:30", 4, "11:40 AM", "12:30 PM"),  # Slot 4
-            ("12:30", "13:20", 5, "12:30 PM", "1:20 PM"),  # Slot 5
-            ("13:20", "14:10", 6, "1:20 PM", "2:10 PM"),  # Slot 6 (after lunch break)
-            ("14:10", "15:00", 7, "2:10 PM", "3:00 PM"),  # Slot 7
-            ("15:10", "16:00", 8, "3:10 PM", "4:00 PM"),  # Slot 8 (after second recess)
-            ("16:00", "16:50", 9, "4:00 PM", "4:50 PM"),  # Slot 9
-        ]
-
-        current_slot = None
-        for start_time_str, end_time_str, slot_num, start_12hr, end_12hr in slot_times:
-            start_time = datetime.strptime(start_time_str, "%H:%M").time()
-            end_time = datetime.strptime(end_time_str, "%H:%M").time()
-
-            if start_time <= current_time <= end_time:
-                current_slot = slot_num
-                break
-
-        # Format current time in 12-hour format
-        current_time_12hr = current_time.strftime("%I:%M %p").lstrip('0')
+        schedule, current_slot, _ = bell_schedules[institution].current(ist_now)
         current_date_ist = ist_now.strftime("%Y-%m-%d")
 
         return {
@@ -2703,19 +4400,11 @@ async def get_current_slot():
             "data": {
                 "current_slot": current_slot,
                 "current_day": current_day,
-                "current_time": current_time_12hr,
                 "current_date": current_date_ist,
                 "timezone": "IST",
-                "slot_times": [
-                    {
-                        "slot": slot_num,
-                        "start_24hr": start_time_str,
-                        "end_24hr": end_time_str,
-                        "start_12hr": start_12hr,
-                        "end_12hr": end_12hr
-                    }
-                    for start_time_str, end_time_str, slot_num, start_12hr, end_12hr in slot_times
-                ]
+                "institution": institution,
+                "schedule": schedule.name if schedule else None,
+                "slot_times": schedule.slot_times() if schedule else []
             },
             "message": f"Current slot: {current_slot}" if current_slot else "No active slot at this time"
         }
@@ -2723,6 +4412,74 @@ async def get_current_slot():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get current slot: {str(e)}")
 
+def current_class_response(firebase_id: str, role: str) -> dict:
+    """Resolve the class a teacher or student has right now from the timetable index (blocking)"""
+    ist_now = get_ist_now()
+    current_day = ist_now.weekday() + 1
+    _, current_slot, _ = bell_schedules[DEFAULT_INSTITUTION].current(ist_now)
+
+    data = {
+        "current_slot": current_slot,
+        "current_day": current_day,
+        "current_time": ist_now.strftime("%I:%M %p").lstrip('0'),
+        "current_date": ist_now.strftime("%Y-%m-%d"),
+        "timezone": "IST",
+        "current_class": None
+    }
+
+    if not SUPABASE_AVAILABLE:
+        return {"success": True, "data": data, "message": "No class at this time (demo mode)"}
+
+    timetable_index.ensure_fresh()
+
+    user_id = timetable_index.user_id(firebase_id)
+    if user_id is None:
+        return {"success": False, "message": f"{role.capitalize()} not found"}
+
+    if current_slot is None:
+        return {"success": True, "data": data, "message": "No active slot at this time"}
+
+    if role == "teacher":
+        class_ids = set(timetable_index.teacher_class_ids(user_id))
+    else:
+        class_ids = set(timetable_index.student_class_ids(user_id, approved_only=True))
+
+    scheduled = sorted(
+        timetable_index.classes_at(current_day, current_slot, class_ids),
+        key=lambda pair: pair[0]["id"]
+    )
+    if not scheduled:
+        return {"success": True, "data": data, "message": f"No class scheduled in slot {current_slot}"}
+
+    class_info, slot = scheduled[0]
+    data["current_class"] = {
+        "id": class_info["id"],
+        "name": class_info["name"],
+        "subject": class_info["subject"],
+        "teacher_name": timetable_index.teacher_name(class_info.get("teacher_id")),
+        "slot_id": slot["id"],
+        "slot_number": slot["slot_number"],
+        "start_time": convert_to_12hr_format(slot["start_time"]),
+        "end_time": convert_to_12hr_format(slot["end_time"])
+    }
+    return {"success": True, "data": data, "message": f"Current class: {class_info['name']}"}
+
+@app.get("/api/current-class/teacher/{teacher_firebase_id}")
+async def get_current_class_for_teacher(teacher_firebase_id: str):
+    """Get the class a teacher is scheduled to teach right now"""
+    try:
+        return await run_in_threadpool(current_class_response, teacher_firebase_id, "teacher")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get current class: {str(e)}")
+
+@app.get("/api/current-class/student/{student_firebase_id}")
+async def get_current_class_for_student(student_firebase_id: str):
+    """Get the class a student is scheduled to attend right now"""
+    try:
+        return await run_in_threadpool(current_class_response, student_firebase_id, "student")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get current class: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
+
+
+def format_sse(event: str, data: dict) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class FeedSubscription:
+    """One subscriber's bounded event buffer.
+
+    When the subscriber falls behind by more than ``max_buffer`` events the
+    oldest are dropped and counted, so a slow client never holds memory or
+    slows the write path.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_buffer: int):
+        self._loop = loop
+        self._events: Deque[Tuple[str, dict]] = deque(maxlen=max(1, max_buffer))
+        self._wakeup = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def _push(self, event: str, data: dict) -> None:
+        # Runs on the subscriber's loop
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append((event, data))
+        self._wakeup.set()
+
+    def _close(self) -> None:
+        self.closed = True
+        self._wakeup.set()
+
+    async def next_events(self, timeout_seconds: float) -> Tuple[List[Tuple[str, dict]], int]:
+        """Wait up to timeout_seconds; return buffered (event, data) pairs and how many were dropped"""
+        if not self._events and not self.closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout_seconds)
+            except asyncio.TimeoutError:
+                pass
+        self._wakeup.clear()
+        events, dropped = list(self._events), self.dropped
+        self._events.clear()
+        self.dropped = 0
+        return events, dropped
+
+
+class MarkFeed:
+    """Per-session fan-out of attendance marks to live subscribers.
+
+    ``publish`` may be called from any thread (request handlers or the
+    threadpool); each event is handed to the subscriber's event loop.
+    Only marks written by this process are seen.
+    """
+
+    def __init__(self, max_buffer: int = 100):
+        self.max_buffer = max_buffer
+        self._subscribers: Dict[str, Set[FeedSubscription]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, key: str) -> FeedSubscription:
+        """Register a subscriber for a session; call from the event loop"""
+        subscription = FeedSubscription(asyncio.get_running_loop(), self.max_buffer)
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, key: str, subscription: FeedSubscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def _subscribers_of(self, key: str) -> List[FeedSubscription]:
+        with self._lock:
+            return list(self._subscribers.get(key, ()))
+
+    def publish(self, key: str, event: str, data: dict) -> None:
+        """Queue an event for every subscriber of a session"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+            if subscribers:
+                self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._push, event, data)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(key, subscription)
+
+    def close(self, key: str) -> None:
+        """End every subscriber's stream for a session (e.g. password invalidated)"""
+        for subscription in self._subscribers_of(key):
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._close)
+            except RuntimeError:
+                self.unsubscribe(key, subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._subscribers),
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "published": self.published,
+                "max_buffer": self.max_buffer
+            }
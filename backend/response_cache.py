@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+class ResponseCache:
+    """Endpoint responses cached under ETags derived from table version counters.
+
+    Every write to a table bumps that table's counter in the shared store, so
+    an ETag built from the counters of the tables a response reads changes
+    exactly when the response could. Computing an ETag needs no database
+    query, which lets If-None-Match be answered with a 304 straight away.
+
+    Writes made outside the API do not bump counters, so ETags also roll over
+    every ``max_stale_seconds``.
+    """
+
+    def __init__(self, store, max_entries: int = 2000, max_stale_seconds: int = 300):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_stale_seconds = max_stale_seconds
+        self._bodies: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def _counter_key(table: str) -> str:
+        return f"table_version:{table}"
+
+    def bump(self, *tables: str) -> dict:
+        """Record a write to each table, invalidating responses that read it.
+
+        Returns the new version of each table.
+        """
+        return {table: self.store.incr(self._counter_key(table)) for table in tables}
+
+    def versions(self, tables: Iterable[str]) -> dict:
+        return {table: self.store.get_counter(self._counter_key(table)) for table in tables}
+
+    def etag(self, name: str, key: str, tables: Iterable[str], extra: str = "") -> str:
+        """Strong ETag for one response of endpoint name"""
+        epoch = int(time.time() // self.max_stale_seconds) if self.max_stale_seconds else 0
+        versions = ",".join(f"{table}={version}" for table, version in sorted(self.versions(tables).items()))
+        digest = hashlib.sha256(f"{name}|{key}|{versions}|{epoch}|{extra}".encode("utf-8")).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def get(self, etag: str) -> Optional[dict]:
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._bodies.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag: str, body: dict) -> None:
+        with self._lock:
+            self._bodies[etag] = body
+            self._bodies.move_to_end(etag)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._bodies),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified
+            }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches etag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
@@ -0,0 +1,83 @@
+import hashlib
+import hmac
+import re
+import time
+from typing import Optional, Tuple
+
+# "<class_id>-<slot>-<digits>": the code names its own session, so verifying
+# it needs no lookup
+ROTATING_CODE_PATTERN = re.compile(r"^(\d+)-(\d+)-(\d+)$")
+
+
+class RotatingCodeSigner:
+    """Stateless rotating attendance codes (TOTP-style).
+
+    The digits are HMAC-SHA256 of (class_id, slot, time-step) under a
+    per-class secret derived from the master secret, truncated as in
+    RFC 4226. Any worker holding the master secret can verify a code with a
+    constant-time compare; nothing is stored. A code is accepted for its own
+    step plus ``grace_steps`` earlier ones.
+    """
+
+    def __init__(self, secret: bytes, step_seconds: int = 30, digits: int = 6, grace_steps: int = 1):
+        self.secret = secret
+        self.step_seconds = max(1, step_seconds)
+        self.digits = digits
+        self.grace_steps = max(0, grace_steps)
+
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def _class_secret(self, class_id: int) -> bytes:
+        return hmac.new(self.secret, f"class:{class_id}".encode("utf-8"), hashlib.sha256).digest()
+
+    def _digits(self, class_id: int, slot_number: int, step: int) -> str:
+        message = f"{class_id}:{slot_number}:{step}".encode("utf-8")
+        digest = hmac.new(self._class_secret(class_id), message, hashlib.sha256).digest()
+        offset = digest[-1] & 0x0F
+        value = int.from_bytes(digest[offset:offset + 4], "big") & 0x7FFFFFFF
+        return str(value % 10 ** self.digits).zfill(self.digits)
+
+    def _step(self, now: Optional[float] = None) -> int:
+        return int((time.time() if now is None else now) // self.step_seconds)
+
+    def current(self, class_id: int, slot_number: int, now: Optional[float] = None) -> Tuple[str, float]:
+        """Return the code for this step and when it stops being accepted (unix seconds)"""
+        step = self._step(now)
+        self.issued += 1
+        code = f"{class_id}-{slot_number}-{self._digits(class_id, slot_number, step)}"
+        return code, (step + 1 + self.grace_steps) * self.step_seconds
+
+    @staticmethod
+    def parse(code: str) -> Optional[Tuple[int, int, str]]:
+        """Split a rotating code into (class_id, slot_number, digits), or None if it is not one"""
+        match = ROTATING_CODE_PATTERN.match(code or "")
+        if not match:
+            return None
+        return int(match.group(1)), int(match.group(2)), match.group(3)
+
+    def verify(self, code: str, now: Optional[float] = None) -> Optional[Tuple[int, int, float]]:
+        """Return (class_id, slot_number, accepted_until) for a live code, else None"""
+        parsed = self.parse(code)
+        if parsed is None:
+            return None
+
+        class_id, slot_number, digits = parsed
+        step = self._step(now)
+        for candidate in range(step, step - self.grace_steps - 1, -1):
+            if hmac.compare_digest(digits, self._digits(class_id, slot_number, candidate)):
+                self.verified += 1
+                return class_id, slot_number, (candidate + 1 + self.grace_steps) * self.step_seconds
+
+        self.rejected += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "step_seconds": self.step_seconds,
+            "grace_steps": self.grace_steps,
+            "issued": self.issued,
+            "verified": self.verified,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,276 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Optional Redis client for multi-host deployments
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+
+class SessionStore:
+    """Key/value store for short-lived sessions with per-key TTL.
+
+    Values are JSON-serializable dicts so every backend can hold them.
+    """
+
+    backend_name = "base"
+
+    def set(self, key: str, value: dict, ttl_seconds: float, only_if_absent: bool = False) -> bool:
+        """Store value under key for ttl_seconds; returns False if only_if_absent and key is live"""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the live value for key, or None if missing or expired"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        """Remove key; returns True if a live value was removed"""
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        """Atomically increment a persistent integer counter; returns the new value"""
+        raise NotImplementedError
+
+    def get_counter(self, key: str) -> int:
+        """Current value of a counter (0 if never incremented)"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release background resources"""
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process store; expired keys are reclaimed by a TTL heap sweeper thread"""
+
+    backend_name = "memory"
+
+    def __init__(self, sweep_interval_seconds: float = 5.0):
+        self._values: Dict[str, Tuple[float, dict]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop,
+            args=(sweep_interval_seconds,),
+            name="session-store-sweeper",
+            daemon=True
+        )
+        self._sweeper.start()
+
+    def _live_entry(self, key: str, now: float) -> Optional[Tuple[float, dict]]:
+        entry = self._values.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def set(self, key: str, value: dict, ttl_seconds: float, only_if_absent: bool = False) -> bool:
+        now = time.time()
+        expires_at = now + ttl_seconds
+        with self._lock:
+            if only_if_absent and self._live_entry(key, now) is not None:
+                return False
+            self._values[key] = (expires_at, value)
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+        return True
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._live_entry(key, time.time())
+        return entry[1] if entry else None
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._live_entry(key, time.time())
+            self._values.pop(key, None)
+        return entry is not None
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def sweep(self) -> int:
+        """Drop every expired key; returns how many were removed"""
+        removed = 0
+        now = time.time()
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._expiry_heap)
+                entry = self._values.get(key)
+                # Skip heap entries made stale by a later set() or delete()
+                if entry is not None and entry[0] == expires_at:
+                    del self._values[key]
+                    removed += 1
+        return removed
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store shared by every worker process on one host via a WAL-mode SQLite file"""
+
+    backend_name = "sqlite"
+
+    def __init__(self, path: str, sweep_interval_seconds: float = 30.0):
+        self.path = path
+        self._local = threading.local()
+        self._sweep_interval = sweep_interval_seconds
+        self._last_sweep = 0.0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _maybe_sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        if now - self._last_sweep >= self._sweep_interval:
+            self._last_sweep = now
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def set(self, key: str, value: dict, ttl_seconds: float, only_if_absent: bool = False) -> bool:
+        now = time.time()
+        conn = self._connection()
+        self._maybe_sweep(conn, now)
+        payload = json.dumps(value)
+        if only_if_absent:
+            # Replace only an expired row, otherwise insert
+            cursor = conn.execute(
+                "INSERT INTO sessions (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE sessions.expires_at <= ?",
+                (key, payload, now + ttl_seconds, now)
+            )
+            return cursor.rowcount > 0
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, payload, now + ttl_seconds)
+        )
+        return True
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT value FROM sessions WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, key: str) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key: str) -> int:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO counters (key, value) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                (key,)
+            )
+            value = conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get_counter(self, key: str) -> int:
+        row = self._connection().execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisSessionStore(SessionStore):
+    """Store on any Redis-protocol server (Redis, Valkey, KeyDB or a local stand-in)"""
+
+    backend_name = "redis"
+
+    def __init__(self, url: str, key_prefix: str = "attendance:session:"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def set(self, key: str, value: dict, ttl_seconds: float, only_if_absent: bool = False) -> bool:
+        stored = self.client.set(
+            self.key_prefix + key,
+            json.dumps(value),
+            px=max(1, int(ttl_seconds * 1000)),
+            nx=only_if_absent
+        )
+        return bool(stored)
+
+    def get(self, key: str) -> Optional[dict]:
+        payload = self.client.get(self.key_prefix + key)
+        return json.loads(payload) if payload else None
+
+    def delete(self, key: str) -> bool:
+        return self.client.delete(self.key_prefix + key) > 0
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.key_prefix + "counter:" + key))
+
+    def get_counter(self, key: str) -> int:
+        value = self.client.get(self.key_prefix + "counter:" + key)
+        return int(value) if value else 0
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """Build the store selected by SESSION_STORE_BACKEND (memory, sqlite or redis)"""
+    backend = (backend or os.getenv("SESSION_STORE_BACKEND", "memory")).lower()
+
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_STORE_PATH", "temp/sessions.sqlite3"))
+
+    if backend == "redis":
+        return RedisSessionStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+    if backend != "memory":
+        raise ValueError(f"Unknown session store backend: {backend}")
+
+    return InMemorySessionStore()
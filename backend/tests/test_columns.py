@@ -0,0 +1,276 @@
+"""Heavy columns (images, encodings) are only selected where an endpoint asks for them.
+
+columns() rejects heavy columns at import time, but a raw .select("...")
+string never goes through it. These tests read every .select() call in the
+backend's source, resolve its select list (string literals, f-strings,
+columns() calls and the constants built from them) and check it against
+HEAVY_COLUMNS.
+"""
+import ast
+import os
+from typing import Dict, List, Optional
+
+import pytest
+
+import columns as columns_module
+from columns import HEAVY_COLUMNS, HeavyColumnError, TABLE_COLUMNS, columns
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Functions allowed to select heavy columns (through columns(include_heavy=True)
+# or a constant built with it). Adding one here should be a deliberate choice.
+HEAVY_SELECT_FUNCTIONS = {
+    "lookup_recognition_encoding",
+    "get_profile_photos",
+    "get_profile_photo",
+    "get_enrolled_image",
+    "get_all_enrolled_images",
+    "migrate_image_column",
+    "load_instant_session_context",
+    "recognize_and_mark_instant_attendance",
+    "get_student_dashboard",
+}
+
+# Heavy columns that came from columns(include_heavy=True) carry this suffix
+OPTED_IN = "@opted-in"
+ALL_HEAVY = frozenset().union(*HEAVY_COLUMNS.values())
+
+
+class Unresolved(Exception):
+    """A select list that cannot be worked out from the source"""
+
+
+class SelectSite:
+    def __init__(self, path: str, line: int, function: Optional[str], table: Optional[str], select: str):
+        self.path = path
+        self.line = line
+        self.function = function
+        self.table = table
+        self.select = select
+
+    def __repr__(self):
+        return f"{os.path.basename(self.path)}:{self.line} ({self.function}) {self.table}: {self.select!r}"
+
+
+def mark_heavy(select: str) -> str:
+    return ", ".join(f"{column}{OPTED_IN}" if column in ALL_HEAVY else column for column in select.split(", "))
+
+
+class SelectCollector(ast.NodeVisitor):
+    """Collects every .select() call of a module with its resolved select list"""
+
+    def __init__(self, path: str, tree: ast.Module):
+        self.path = path
+        self.module_assigns = self.assignments(tree.body)
+        self.functions: List[ast.AST] = []
+        self.sites: List[SelectSite] = []
+        self.unresolved: List[str] = []
+        # (function name, parameter index) of selects whose list is a parameter
+        self.parameter_selects: Dict[str, int] = {}
+        self.calls: List[tuple] = []
+
+    @staticmethod
+    def assignments(body) -> Dict[str, ast.AST]:
+        assigns = {}
+        for node in body:
+            for child in ast.walk(node) if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) else ():
+                if isinstance(child, ast.Assign) and len(child.targets) == 1 and isinstance(child.targets[0], ast.Name):
+                    assigns[child.targets[0].id] = child.value
+        return assigns
+
+    def visit_function(self, node):
+        self.functions.append(node)
+        self.generic_visit(node)
+        self.functions.pop()
+
+    visit_FunctionDef = visit_function
+    visit_AsyncFunctionDef = visit_function
+
+    def current_function(self) -> Optional[str]:
+        # Nested helpers (lambdas, inner defs) belong to the outermost function
+        return self.functions[0].name if self.functions else None
+
+    def local_value(self, name: str) -> Optional[ast.AST]:
+        for function in reversed(self.functions):
+            for child in ast.walk(function):
+                if isinstance(child, ast.Assign) and len(child.targets) == 1 \
+                        and isinstance(child.targets[0], ast.Name) and child.targets[0].id == name:
+                    return child.value
+        return None
+
+    def parameter_of(self, name: str) -> Optional[tuple]:
+        """(function name, index) of the enclosing function parameter called name"""
+        for function in reversed(self.functions):
+            params = [arg.arg for arg in function.args.args]
+            if name in params:
+                return function.name, params.index(name)
+        return None
+
+    def resolve(self, node: ast.AST) -> str:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        if isinstance(node, ast.JoinedStr):
+            return "".join(self.resolve(value) for value in node.values)
+        if isinstance(node, ast.FormattedValue):
+            return self.resolve(node.value)
+        if isinstance(node, ast.Name):
+            value = self.local_value(node.id) or self.module_assigns.get(node.id)
+            if value is not None:
+                return self.resolve(value)
+            if isinstance(getattr(columns_module, node.id, None), str):
+                return mark_heavy(getattr(columns_module, node.id))
+            raise Unresolved(node.id)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "columns":
+            include_heavy = any(keyword.arg == "include_heavy" and getattr(keyword.value, "value", False)
+                                for keyword in node.keywords)
+            try:
+                args = [self.resolve(arg) for arg in node.args]
+            except Unresolved:
+                if include_heavy:
+                    # columns(table, ...) over a parameter: heavy by request
+                    return f"*{OPTED_IN}"
+                # columns() itself refuses heavy columns it was not asked for
+                return "light"
+            return mark_heavy(columns(*args, include_heavy=include_heavy))
+        raise Unresolved(ast.dump(node)[:60])
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Attribute) and node.func.attr == "select":
+            self.record(node, self.table_of(node.func.value), node.args[0] if node.args else ast.Constant("*"))
+        elif isinstance(node.func, ast.Name) and self.functions:
+            self.calls.append((node, list(self.functions)))
+        self.generic_visit(node)
+
+    def record(self, node: ast.Call, table: Optional[str], select_node: ast.AST):
+        parameter = self.parameter_of(select_node.id) if isinstance(select_node, ast.Name) else None
+        if parameter and self.local_value(select_node.id) is None:
+            # Checked at every call site of this helper instead
+            function, index = parameter
+            self.parameter_selects[function] = index
+            return
+        try:
+            select = self.resolve(select_node)
+        except Unresolved as unresolved:
+            self.unresolved.append(f"{os.path.basename(self.path)}:{node.lineno} {unresolved}")
+            return
+        self.sites.append(SelectSite(self.path, node.lineno, self.current_function(), table, select))
+
+    @staticmethod
+    def table_of(node: ast.AST) -> Optional[str]:
+        while isinstance(node, (ast.Call, ast.Attribute)):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "table":
+                first = node.args[0] if node.args else None
+                return first.value if isinstance(first, ast.Constant) else None
+            node = node.func if isinstance(node, ast.Call) else node.value
+        return None
+
+    def check_helper_calls(self):
+        """Selects passed through a helper's parameter, e.g. fetch_rows_by_ids(table, columns, ...)"""
+        for node, functions in self.calls:
+            index = self.parameter_selects.get(node.func.id)
+            if index is None or len(node.args) <= index:
+                continue
+            saved, self.functions = self.functions, functions
+            table = node.args[0].value if node.args and isinstance(node.args[0], ast.Constant) else None
+            self.record(node, table, node.args[index])
+            self.functions = saved
+
+
+def split_top_level(select: str) -> List[str]:
+    items, depth, current = [], 0, ""
+    for char in select:
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def selected_columns(table: Optional[str], select: str):
+    """Yield (table, column) for every column of a select list, embeds included"""
+    for item in split_top_level(select):
+        if "(" in item:
+            relation, nested = item.split("(", 1)
+            relation = relation.split(":")[-1].split("!")[0].strip()
+            yield from selected_columns(relation, nested.rsplit(")", 1)[0])
+        else:
+            yield table, item.split(":")[-1].split("::")[0].strip()
+
+
+def heavy_violations(site: SelectSite) -> List[str]:
+    violations = []
+    for table, column in selected_columns(site.table, site.select):
+        if column.endswith(OPTED_IN):
+            continue
+        heavy = HEAVY_COLUMNS.get(table, frozenset()) if table in TABLE_COLUMNS else ALL_HEAVY
+        if column == "*" and (heavy or table not in TABLE_COLUMNS):
+            violations.append(f"{site!r}: * on {table}")
+        elif column in heavy:
+            violations.append(f"{site!r}: {column}")
+    return violations
+
+
+def collect_sites():
+    sites, unresolved = [], []
+    for name in sorted(os.listdir(BACKEND_DIR)):
+        if not name.endswith(".py"):
+            continue
+        path = os.path.join(BACKEND_DIR, name)
+        with open(path, encoding="utf-8") as source:
+            tree = ast.parse(source.read(), filename=path)
+        collector = SelectCollector(path, tree)
+        collector.visit(tree)
+        collector.check_helper_calls()
+        sites.extend(collector.sites)
+        unresolved.extend(collector.unresolved)
+    return sites, unresolved
+
+
+SITES, UNRESOLVED = collect_sites()
+
+
+def test_every_select_list_is_checked():
+    assert SITES
+    assert UNRESOLVED == []
+
+
+def test_no_select_names_a_heavy_column_without_opting_in():
+    violations = [violation for site in SITES for violation in heavy_violations(site)]
+    assert violations == []
+
+
+def test_heavy_selects_only_in_known_functions():
+    heavy_functions = {
+        site.function for site in SITES
+        if any(column.endswith(OPTED_IN) for _, column in selected_columns(site.table, site.select))
+    }
+    assert heavy_functions == HEAVY_SELECT_FUNCTIONS
+
+
+@pytest.mark.parametrize("select, expected", [
+    ('select("id, profile_photo_url")', 1),
+    ('select("*")', 1),
+    ('select()', 1),
+    ('select("id, users!inner (name, profile_photo_url)")', 1),
+    ('select(f"{PHOTO}, users (id)")', 0),
+    ('select("id, name")', 0),
+])
+def test_checker_catches_raw_heavy_selects(select, expected):
+    source = f'PHOTO = columns("users", "profile_photo_url", include_heavy=True)\n' \
+             f'def endpoint():\n    supabase.table("users").{select}.execute()\n'
+    tree = ast.parse(source)
+    collector = SelectCollector("example.py", tree)
+    collector.visit(tree)
+    assert collector.unresolved == []
+    assert sum(len(heavy_violations(site)) for site in collector.sites) == expected
+
+
+def test_columns_rejects_heavy_columns_unless_requested():
+    with pytest.raises(HeavyColumnError):
+        columns("face_encodings", "user_id", "encoding")
+    assert columns("face_encodings", "encoding", include_heavy=True) == "encoding"
+    assert "profile_photo_url" not in columns("users")
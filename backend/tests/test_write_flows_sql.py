@@ -0,0 +1,212 @@
+"""Write functions and counters of database/performance_setup.sql against a real Postgres.
+
+Covers the outcome codes of the single round-trip write functions (section
+5) and the attendance counters their writes feed (section 1).
+
+Loads schema.sql and performance_setup.sql into a throwaway database and
+calls each function directly. Needs psycopg2 and a PostgreSQL server: set
+TEST_DATABASE_URL to a server the tests may create a database on, or install
+pgserver to start a private one. Skipped when neither is available.
+"""
+import os
+from datetime import date
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+import psycopg2.extras  # noqa: E402
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database")
+TEST_DATABASE = "attendance_write_flows_test"
+TODAY = date(2026, 10, 19)
+
+
+def server_uri() -> str:
+    uri = os.getenv("TEST_DATABASE_URL")
+    if uri:
+        return uri
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip("no PostgreSQL server: set TEST_DATABASE_URL or install pgserver")
+    server = pgserver.get_server(os.path.join(os.getenv("TMPDIR", "/tmp"), "attendance-test-pgdata"), cleanup_mode=None)
+    return server.get_uri()
+
+
+def with_database(uri: str, dbname: str) -> str:
+    return psycopg2.extensions.make_dsn(uri, dbname=dbname)
+
+
+@pytest.fixture(scope="module")
+def database():
+    uri = server_uri()
+    admin = psycopg2.connect(uri)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {TEST_DATABASE}")
+        cursor.execute(f"CREATE DATABASE {TEST_DATABASE}")
+
+    conn = psycopg2.connect(with_database(uri, TEST_DATABASE))
+    with conn.cursor() as cursor:
+        # schema.sql's row level security policies call Supabase's auth.uid()
+        cursor.execute("CREATE SCHEMA auth; CREATE FUNCTION auth.uid() RETURNS TEXT AS $$ SELECT NULL::text $$ LANGUAGE sql;")
+        for name in ("schema.sql", "performance_setup.sql"):
+            with open(os.path.join(DATABASE_DIR, name), encoding="utf-8") as sql:
+                cursor.execute(sql.read())
+    conn.commit()
+
+    yield conn
+
+    conn.close()
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {TEST_DATABASE}")
+    admin.close()
+
+
+@pytest.fixture
+def cur(database):
+    """A cursor over seeded data; everything is rolled back after the test"""
+    cursor = database.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute("INSERT INTO users (id, firebase_id, email, name, role) VALUES (1, 't1', 't1@example.com', 'Teacher', 'teacher')")
+    for n in range(1, 6):
+        cursor.execute(
+            "INSERT INTO users (id, firebase_id, email, name, role, student_id) VALUES (%s, %s, %s, %s, 'student', %s)",
+            (10 + n, f"s{n}", f"s{n}@example.com", f"Student {n}", f"STU{n:03d}")
+        )
+    cursor.execute("INSERT INTO classes (id, name, subject, class_code, teacher_id) VALUES (100, 'Math 101', 'Math', 'MATH', 1)")
+    cursor.execute("INSERT INTO classes (id, name, subject, class_code, teacher_id) VALUES (200, 'Physics', 'Physics', 'PHYS', 1)")
+    for student_id in (11, 12, 13):
+        cursor.execute("INSERT INTO class_enrollments (class_id, student_id, status) VALUES (100, %s, 'approved')", (student_id,))
+    cursor.execute("INSERT INTO class_enrollments (class_id, student_id, status) VALUES (100, 14, 'pending')")
+
+    yield cursor
+
+    cursor.close()
+    database.rollback()
+
+
+def call(cur, function: str, *args) -> dict:
+    placeholders = ", ".join(["%s"] * len(args))
+    cur.execute(f"SELECT * FROM {function}({placeholders})", args)
+    rows = cur.fetchall()
+    assert len(rows) == 1
+    return rows[0]
+
+
+def instant_mark(cur, student_firebase_id: str, class_id: int = 100) -> dict:
+    return call(cur, "instant_mark_attendance", student_firebase_id, class_id, 2, TODAY.isoweekday(), TODAY)
+
+
+def student_count(cur, class_id: int) -> int:
+    cur.execute("SELECT student_count FROM classes WHERE id = %s", (class_id,))
+    return cur.fetchone()["student_count"]
+
+
+def test_instant_mark_outcomes(cur):
+    first = instant_mark(cur, "s1")
+    assert first["outcome"] == "marked"
+    assert first["student_id"] == 11
+    assert first["enrollment_change"] is None
+
+    again = instant_mark(cur, "s1")
+    assert again["outcome"] == "already_marked"
+    assert again["marked_at"] == first["marked_at"]
+
+    assert instant_mark(cur, "nobody")["outcome"] == "student_not_found"
+    assert instant_mark(cur, "t1")["outcome"] == "not_student"
+
+    cur.execute("SELECT COUNT(*) AS marks FROM attendance WHERE class_id = 100")
+    assert cur.fetchone()["marks"] == 1
+
+
+def test_instant_mark_approves_a_pending_student(cur):
+    assert student_count(cur, 100) == 3
+
+    result = instant_mark(cur, "s4")
+    assert result["outcome"] == "marked"
+    assert result["enrollment_change"] == "approved"
+
+    cur.execute("SELECT status, approved_at FROM class_enrollments WHERE class_id = 100 AND student_id = 14")
+    enrollment = cur.fetchone()
+    assert enrollment["status"] == "approved"
+    assert enrollment["approved_at"] is not None
+    assert student_count(cur, 100) == 4
+
+
+def test_instant_mark_enrolls_a_new_student(cur):
+    result = instant_mark(cur, "s5")
+    assert result["outcome"] == "marked"
+    assert result["enrollment_change"] == "enrolled"
+    assert student_count(cur, 100) == 4
+
+
+def test_manual_mark_outcomes(cur):
+    args = (100, 2, TODAY.isoweekday(), TODAY)
+
+    created = call(cur, "manual_mark_attendance", "t1", "s2", *args, "absent")
+    assert created["outcome"] == "marked"
+    assert created["created"] is True
+
+    updated = call(cur, "manual_mark_attendance", "t1", "s2", *args, "present")
+    assert updated["outcome"] == "marked"
+    assert updated["created"] is False
+
+    assert call(cur, "manual_mark_attendance", "s1", "s2", *args, "present")["outcome"] == "unauthorized"
+    assert call(cur, "manual_mark_attendance", "nobody", "s2", *args, "present")["outcome"] == "teacher_not_found"
+    assert call(cur, "manual_mark_attendance", "t1", "nobody", *args, "present")["outcome"] == "student_not_found"
+
+    cur.execute("SELECT present_count, absent_count, total_count FROM attendance_student_stats WHERE student_id = 12")
+    assert dict(cur.fetchone()) == {"present_count": 1, "absent_count": 0, "total_count": 1}
+    cur.execute("SELECT present_count, absent_count, total_count FROM attendance_class_stats WHERE class_id = 100")
+    assert dict(cur.fetchone()) == {"present_count": 1, "absent_count": 0, "total_count": 1}
+
+
+def test_class_stats_follow_every_write_and_rebuild(cur):
+    for student in ("s1", "s2", "s3"):
+        instant_mark(cur, student)
+    cur.execute("UPDATE attendance SET status = 'absent' WHERE student_id = 13")
+    cur.execute("DELETE FROM attendance WHERE student_id = 12")
+
+    expected = {"present_count": 1, "absent_count": 1, "total_count": 2}
+    cur.execute("SELECT present_count, absent_count, total_count FROM attendance_class_stats WHERE class_id = 100")
+    assert dict(cur.fetchone()) == expected
+
+    cur.execute("SELECT rebuild_attendance_stats(ARRAY[100])")
+    cur.execute("SELECT present_count, absent_count, total_count FROM attendance_class_stats WHERE class_id = 100")
+    assert dict(cur.fetchone()) == expected
+
+
+def test_join_class_outcomes(cur):
+    joined = call(cur, "join_class", "s1", 200)
+    assert joined["outcome"] == "joined"
+    assert joined["status"] == "approved"
+
+    assert call(cur, "join_class", "s1", 200)["outcome"] == "already_enrolled"
+
+    # pending -> approved
+    assert call(cur, "join_class", "s4", 100)["outcome"] == "approved"
+    cur.execute("SELECT status FROM class_enrollments WHERE class_id = 100 AND student_id = 14")
+    assert cur.fetchone()["status"] == "approved"
+
+    assert call(cur, "join_class", "t1", 200)["outcome"] == "not_student"
+    assert call(cur, "join_class", "s1", 999)["outcome"] == "class_not_found"
+    assert call(cur, "join_class", "nobody", 200)["outcome"] == "student_not_found"
+
+
+def test_add_students_to_class_outcomes(cur):
+    added = call(cur, "add_students_to_class", "t1", 200, "STU001", "STU004")
+    assert (added["outcome"], added["added_count"], added["total_eligible"]) == ("added", 4, 4)
+
+    # Already enrolled students are skipped
+    added = call(cur, "add_students_to_class", "t1", 200, "STU001", "STU005")
+    assert (added["outcome"], added["added_count"], added["total_eligible"]) == ("added", 1, 5)
+    assert student_count(cur, 200) == 5
+
+    assert call(cur, "add_students_to_class", "t1", 200, "X", "Y")["outcome"] == "no_students"
+    assert call(cur, "add_students_to_class", "s1", 200, "STU001", "STU005")["outcome"] == "unauthorized"
+
+
+def test_performance_setup_can_be_rerun(database, cur):
+    with open(os.path.join(DATABASE_DIR, "performance_setup.sql"), encoding="utf-8") as sql:
+        cur.execute(sql.read())
+    assert instant_mark(cur, "s1")["outcome"] == "marked"
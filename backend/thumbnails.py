@@ -0,0 +1,80 @@
+import io
+import queue
+import threading
+from typing import Callable
+
+from PIL import Image, features
+
+THUMBNAIL_SIZE = 96
+
+# Variant name under which thumbnails are linked to their source blob
+THUMBNAIL_VARIANT = "thumb96"
+
+# WebP is smaller at the same quality; fall back to JPEG if Pillow lacks it
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+
+
+def make_thumbnail(data: bytes, size: int = THUMBNAIL_SIZE) -> bytes:
+    """Downscale an image so its longer side is at most size pixels"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format=THUMBNAIL_FORMAT, quality=80)
+        return output.getvalue()
+
+
+class ThumbnailWorker:
+    """Background thread that builds thumbnails for blobs off the request path.
+
+    ``submit(source_key)`` queues a blob; when its thumbnail is stored it is
+    linked as the source's THUMBNAIL_VARIANT and ``on_ready(source_key,
+    thumbnail_key)`` is called on the worker thread. A key already queued is
+    not queued again.
+    """
+
+    def __init__(self, blob_store, on_ready: Callable[[str, str], None], max_queue: int = 1000):
+        self.blob_store = blob_store
+        self.on_ready = on_ready
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="thumbnail-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, source_key: str) -> bool:
+        """Queue a thumbnail job; returns False if already queued or the queue is full"""
+        with self._lock:
+            if source_key in self._queued:
+                return False
+            try:
+                self._queue.put_nowait(source_key)
+            except queue.Full:
+                return False
+            self._queued.add(source_key)
+        return True
+
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def join(self) -> None:
+        """Block until every queued job has been processed"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            source_key = self._queue.get()
+            try:
+                data = self.blob_store.get(source_key)
+                if data is None:
+                    print(f"⚠️ Thumbnail source blob {source_key} not found")
+                    continue
+                thumbnail_key = self.blob_store.put(make_thumbnail(data))
+                self.blob_store.set_variant(source_key, THUMBNAIL_VARIANT, thumbnail_key)
+                self.on_ready(source_key, thumbnail_key)
+            except Exception as e:
+                print(f"⚠️ Thumbnail generation failed for {source_key}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(source_key)
+                self._queue.task_done()
@@ -0,0 +1,168 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class TimetableIndex:
+    """In-process index of timetable slots and the class data timetables show.
+
+    Slots are indexed by (day_of_week, slot_number) -> {class_id: slot} and by
+    class_id -> {(day_of_week, slot_number): slot}, alongside classes and
+    teacher names, so timetable and current-class lookups need no query.
+
+    The index remembers the table versions it was loaded at; ``ensure_fresh``
+    reloads it when any of them has moved, or after ``max_age_seconds`` to pick
+    up writes made outside the API. The load runs outside the read lock, so
+    lookups keep using the previous index until the new one is swapped in.
+
+    Per-user data is not part of that load: firebase_id -> user id and each
+    student's enrollments are fetched for one user on first use
+    (``user_loader``, ``enrollment_loader``). Enrollments are cached with the
+    class_enrollments version they were read at, so a burst of enrollment
+    writes refetches only the students that are looked up again.
+    """
+
+    TABLES = ("timetable_slots", "classes", "users")
+    ENROLLMENT_TABLE = "class_enrollments"
+
+    def __init__(self, loader: Callable[[], dict], versions: Callable[[Tuple[str, ...]], dict],
+                 user_loader: Callable[[str], Optional[int]], enrollment_loader: Callable[[int], List[dict]],
+                 max_age_seconds: int = 300):
+        self._loader = loader
+        self._versions = versions
+        self._user_loader = user_loader
+        self._enrollment_loader = enrollment_loader
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._loaded_versions: Optional[dict] = None
+        self._loaded_at = 0.0
+
+        self.by_day_slot: Dict[Tuple[int, int], Dict[int, dict]] = {}
+        self.by_class: Dict[int, Dict[Tuple[int, int], dict]] = {}
+        self.classes: Dict[int, dict] = {}            # class_id -> {id, name, subject, teacher_id}
+        self.teacher_names: Dict[int, str] = {}       # user id -> name
+        self._user_ids: Dict[str, Tuple[int, float]] = {}  # firebase_id -> (user id, fetched at)
+        self._enrollments: Dict[int, Tuple[int, float, Dict[int, str]]] = {}  # student id -> (version, fetched at, {class_id: status})
+
+    def _expired(self, loaded_at: float) -> bool:
+        return bool(self.max_age_seconds) and time.monotonic() - loaded_at >= self.max_age_seconds
+
+    def _is_current(self, versions: dict) -> bool:
+        with self._lock:
+            return self._loaded_versions == versions and not self._expired(self._loaded_at)
+
+    def ensure_fresh(self) -> None:
+        """Load on first use, and reload after any write to an indexed table (blocking)"""
+        current = self._versions(self.TABLES)
+        if self._is_current(current):
+            return
+        with self._reload_lock:
+            # Another thread may have reloaded while this one waited
+            current = self._versions(self.TABLES)
+            if self._is_current(current):
+                return
+            by_day_slot, by_class, classes, teacher_names = self._build(self._loader())
+            with self._lock:
+                self.by_day_slot, self.by_class = by_day_slot, by_class
+                self.classes, self.teacher_names = classes, teacher_names
+                self._loaded_versions = current
+                self._loaded_at = time.monotonic()
+            print(f"✅ Timetable index loaded: {sum(len(slots) for slots in by_class.values())} slots, {len(classes)} classes")
+
+    def _build(self, data: dict) -> tuple:
+        by_day_slot: Dict[Tuple[int, int], Dict[int, dict]] = {}
+        by_class: Dict[int, Dict[Tuple[int, int], dict]] = {}
+        classes = {class_info["id"]: class_info for class_info in data["classes"]}
+        teacher_names = {teacher["id"]: teacher["name"] for teacher in data["teachers"]}
+        for slot in data["slots"]:
+            self._add_slot(by_day_slot, by_class, slot)
+        return by_day_slot, by_class, classes, teacher_names
+
+    @staticmethod
+    def _add_slot(by_day_slot: dict, by_class: dict, slot: dict) -> None:
+        key = (slot["day_of_week"], slot["slot_number"])
+        # A slot row may have moved class or time; drop any old position first
+        for class_slots in by_class.values():
+            for old_key, old_slot in list(class_slots.items()):
+                if old_slot["id"] == slot["id"]:
+                    del class_slots[old_key]
+                    by_day_slot.get(old_key, {}).pop(old_slot["class_id"], None)
+        by_day_slot.setdefault(key, {})[slot["class_id"]] = slot
+        by_class.setdefault(slot["class_id"], {})[key] = slot
+
+    def upsert_slot(self, slot: dict, new_versions: Optional[dict] = None) -> None:
+        """Apply a slot written by this worker.
+
+        new_versions are the table versions after the write's bump; if they
+        are exactly one step ahead of the loaded ones, the index stays current
+        without a reload.
+        """
+        with self._lock:
+            if self._loaded_versions is None:
+                return
+            self._add_slot(self.by_day_slot, self.by_class, slot)
+            if new_versions:
+                expected = {table: self._loaded_versions.get(table, 0) + 1 for table in new_versions}
+                if new_versions == expected:
+                    self._loaded_versions.update(new_versions)
+
+    def user_id(self, firebase_id: str) -> Optional[int]:
+        """User id for a firebase_id, fetched on first use (blocking on a miss)"""
+        with self._lock:
+            cached = self._user_ids.get(firebase_id)
+        if cached and not self._expired(cached[1]):
+            return cached[0]
+
+        user_id = self._user_loader(firebase_id)
+        with self._lock:
+            if user_id is None:
+                self._user_ids.pop(firebase_id, None)
+            else:
+                self._user_ids[firebase_id] = (user_id, time.monotonic())
+        return user_id
+
+    def _student_enrollments(self, student_id: int) -> Dict[int, str]:
+        version = self._versions((self.ENROLLMENT_TABLE,))[self.ENROLLMENT_TABLE]
+        with self._lock:
+            cached = self._enrollments.get(student_id)
+        if cached and cached[0] == version and not self._expired(cached[1]):
+            return cached[2]
+
+        enrolled = {row["class_id"]: row["status"] for row in self._enrollment_loader(student_id)}
+        with self._lock:
+            self._enrollments[student_id] = (version, time.monotonic(), enrolled)
+        return enrolled
+
+    def slots_for_classes(self, class_ids) -> List[Tuple[dict, dict]]:
+        """(class_info, slot) pairs for the given classes, ordered by day and slot"""
+        with self._lock:
+            pairs = [
+                (self.classes[class_id], slot)
+                for class_id in class_ids if class_id in self.classes
+                for slot in self.by_class.get(class_id, {}).values()
+            ]
+        return sorted(pairs, key=lambda pair: (pair[1]["day_of_week"], pair[1]["slot_number"]))
+
+    def classes_at(self, day_of_week: int, slot_number: int, class_ids=None) -> List[Tuple[dict, dict]]:
+        """(class_info, slot) pairs scheduled at a day and slot, optionally limited to class_ids"""
+        with self._lock:
+            scheduled = self.by_day_slot.get((day_of_week, slot_number), {})
+            return [
+                (self.classes[class_id], slot)
+                for class_id, slot in scheduled.items()
+                if class_id in self.classes and (class_ids is None or class_id in class_ids)
+            ]
+
+    def teacher_class_ids(self, teacher_id: int) -> List[int]:
+        with self._lock:
+            return [class_id for class_id, class_info in self.classes.items() if class_info["teacher_id"] == teacher_id]
+
+    def student_class_ids(self, student_id: int, approved_only: bool = False) -> List[int]:
+        """Classes a student is enrolled in (blocking when their enrollments changed)"""
+        enrolled = self._student_enrollments(student_id)
+        return [class_id for class_id, status in enrolled.items() if not approved_only or status == "approved"]
+
+    def teacher_name(self, teacher_id: Optional[int], default: str = "Unknown") -> str:
+        with self._lock:
+            return self.teacher_names.get(teacher_id, default)
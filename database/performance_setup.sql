@@ -0,0 +1,540 @@
+-- Performance Setup for Face Recognition Attendance System
+-- Run this AFTER database_complete_setup.sql. Every statement is idempotent,
+-- so the whole file is safe to re-run after pulling new sections.
+
+-- ============================================================================
+-- 1. INCREMENTAL ATTENDANCE AGGREGATES
+-- ============================================================================
+
+-- Per (student, class) counters used by dashboards and analytics
+CREATE TABLE IF NOT EXISTS attendance_student_stats (
+    student_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    class_id INTEGER REFERENCES classes(id) ON DELETE CASCADE,
+    present_count INTEGER NOT NULL DEFAULT 0,
+    absent_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (student_id, class_id)
+);
+
+-- Per (class, date) counters used for daily attendance series
+CREATE TABLE IF NOT EXISTS attendance_class_date_stats (
+    class_id INTEGER REFERENCES classes(id) ON DELETE CASCADE,
+    attendance_date DATE NOT NULL,
+    present_count INTEGER NOT NULL DEFAULT 0,
+    absent_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (class_id, attendance_date)
+);
+
+-- Per class counters, so class totals are one row per class instead of a sum
+-- over every student's row
+CREATE TABLE IF NOT EXISTS attendance_class_stats (
+    class_id INTEGER PRIMARY KEY REFERENCES classes(id) ON DELETE CASCADE,
+    present_count INTEGER NOT NULL DEFAULT 0,
+    absent_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_attendance_student_stats_class ON attendance_student_stats(class_id);
+
+-- Apply +1/-1 for a single attendance row to every aggregate table
+CREATE OR REPLACE FUNCTION apply_attendance_stats_delta(
+    p_student_id INTEGER,
+    p_class_id INTEGER,
+    p_attendance_date DATE,
+    p_status VARCHAR(20),
+    p_sign INTEGER
+) RETURNS VOID AS $$
+DECLARE
+    present_delta INTEGER := CASE WHEN p_status = 'present' THEN p_sign ELSE 0 END;
+    absent_delta INTEGER := CASE WHEN p_status = 'absent' THEN p_sign ELSE 0 END;
+BEGIN
+    INSERT INTO attendance_student_stats (student_id, class_id, present_count, absent_count, total_count, updated_at)
+    VALUES (p_student_id, p_class_id, present_delta, absent_delta, p_sign, NOW())
+    ON CONFLICT (student_id, class_id) DO UPDATE SET
+        present_count = attendance_student_stats.present_count + EXCLUDED.present_count,
+        absent_count = attendance_student_stats.absent_count + EXCLUDED.absent_count,
+        total_count = attendance_student_stats.total_count + EXCLUDED.total_count,
+        updated_at = NOW();
+
+    INSERT INTO attendance_class_date_stats (class_id, attendance_date, present_count, absent_count, total_count, updated_at)
+    VALUES (p_class_id, p_attendance_date, present_delta, absent_delta, p_sign, NOW())
+    ON CONFLICT (class_id, attendance_date) DO UPDATE SET
+        present_count = attendance_class_date_stats.present_count + EXCLUDED.present_count,
+        absent_count = attendance_class_date_stats.absent_count + EXCLUDED.absent_count,
+        total_count = attendance_class_date_stats.total_count + EXCLUDED.total_count,
+        updated_at = NOW();
+
+    INSERT INTO attendance_class_stats (class_id, present_count, absent_count, total_count, updated_at)
+    VALUES (p_class_id, present_delta, absent_delta, p_sign, NOW())
+    ON CONFLICT (class_id) DO UPDATE SET
+        present_count = attendance_class_stats.present_count + EXCLUDED.present_count,
+        absent_count = attendance_class_stats.absent_count + EXCLUDED.absent_count,
+        total_count = attendance_class_stats.total_count + EXCLUDED.total_count,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep the aggregates in step with every write to attendance, whichever
+-- endpoint (instant, manual, bulk or legacy) performed it
+CREATE OR REPLACE FUNCTION maintain_attendance_stats() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND NEW.student_id IS NOT DISTINCT FROM OLD.student_id
+        AND NEW.class_id IS NOT DISTINCT FROM OLD.class_id
+        AND NEW.attendance_date IS NOT DISTINCT FROM OLD.attendance_date
+        AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.class_id IS NOT NULL AND OLD.student_id IS NOT NULL THEN
+        PERFORM apply_attendance_stats_delta(OLD.student_id, OLD.class_id, OLD.attendance_date, OLD.status, -1);
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.class_id IS NOT NULL AND NEW.student_id IS NOT NULL THEN
+        PERFORM apply_attendance_stats_delta(NEW.student_id, NEW.class_id, NEW.attendance_date, NEW.status, 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_maintain_attendance_stats ON attendance;
+CREATE TRIGGER trigger_maintain_attendance_stats
+    AFTER INSERT OR UPDATE OR DELETE ON attendance
+    FOR EACH ROW
+    EXECUTE FUNCTION maintain_attendance_stats();
+
+-- Recompute the aggregates from raw rows (all classes when p_class_ids is NULL)
+CREATE OR REPLACE FUNCTION rebuild_attendance_stats(p_class_ids INTEGER[] DEFAULT NULL) RETURNS INTEGER AS $$
+DECLARE
+    rebuilt_count INTEGER;
+BEGIN
+    DELETE FROM attendance_student_stats
+    WHERE p_class_ids IS NULL OR class_id = ANY(p_class_ids);
+
+    DELETE FROM attendance_class_date_stats
+    WHERE p_class_ids IS NULL OR class_id = ANY(p_class_ids);
+
+    DELETE FROM attendance_class_stats
+    WHERE p_class_ids IS NULL OR class_id = ANY(p_class_ids);
+
+    INSERT INTO attendance_student_stats (student_id, class_id, present_count, absent_count, total_count, updated_at)
+    SELECT student_id, class_id,
+           COUNT(*) FILTER (WHERE status = 'present'),
+           COUNT(*) FILTER (WHERE status = 'absent'),
+           COUNT(*),
+           NOW()
+    FROM attendance
+    WHERE class_id IS NOT NULL AND student_id IS NOT NULL
+    AND (p_class_ids IS NULL OR class_id = ANY(p_class_ids))
+    GROUP BY student_id, class_id;
+
+    GET DIAGNOSTICS rebuilt_count = ROW_COUNT;
+
+    INSERT INTO attendance_class_date_stats (class_id, attendance_date, present_count, absent_count, total_count, updated_at)
+    SELECT class_id, attendance_date,
+           COUNT(*) FILTER (WHERE status = 'present'),
+           COUNT(*) FILTER (WHERE status = 'absent'),
+           COUNT(*),
+           NOW()
+    FROM attendance
+    WHERE class_id IS NOT NULL AND student_id IS NOT NULL
+    AND (p_class_ids IS NULL OR class_id = ANY(p_class_ids))
+    GROUP BY class_id, attendance_date;
+
+    INSERT INTO attendance_class_stats (class_id, present_count, absent_count, total_count, updated_at)
+    SELECT class_id, SUM(present_count), SUM(absent_count), SUM(total_count), NOW()
+    FROM attendance_class_date_stats
+    WHERE p_class_ids IS NULL OR class_id = ANY(p_class_ids)
+    GROUP BY class_id;
+
+    RETURN rebuilt_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill once for existing installations
+SELECT rebuild_attendance_stats();
+
+-- ============================================================================
+-- 2. ATOMIC ATTENDANCE UPSERT
+-- ============================================================================
+
+-- Older installations added slot columns after the fact and may lack the
+-- unique key; drop duplicates (keeping the earliest mark) before adding it
+DELETE FROM attendance a
+USING attendance b
+WHERE a.id > b.id
+AND a.student_id = b.student_id
+AND a.class_id = b.class_id
+AND a.slot_number = b.slot_number
+AND a.attendance_date = b.attendance_date;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_class_slot_date
+    ON attendance(student_id, class_id, slot_number, attendance_date);
+
+-- Insert a mark in one statement. With p_overwrite the existing row takes the
+-- new status (teacher corrections); without it the first mark wins. Either way
+-- the caller learns whether the row was newly created.
+CREATE OR REPLACE FUNCTION upsert_attendance(
+    p_student_id INTEGER,
+    p_class_id INTEGER,
+    p_slot_number INTEGER,
+    p_day_of_week INTEGER,
+    p_attendance_date DATE,
+    p_status VARCHAR(20),
+    p_marked_by VARCHAR(50),
+    p_overwrite BOOLEAN DEFAULT FALSE
+) RETURNS TABLE (
+    attendance_id INTEGER,
+    attendance_status VARCHAR,
+    marked_at TIMESTAMP WITH TIME ZONE,
+    created BOOLEAN
+) AS $$
+BEGIN
+    IF p_overwrite THEN
+        RETURN QUERY
+        INSERT INTO attendance AS a (student_id, class_id, slot_number, day_of_week, attendance_date, status, marked_by)
+        VALUES (p_student_id, p_class_id, p_slot_number, p_day_of_week, p_attendance_date, p_status, p_marked_by)
+        ON CONFLICT (student_id, class_id, slot_number, attendance_date) DO UPDATE SET
+            status = EXCLUDED.status,
+            marked_by = EXCLUDED.marked_by,
+            updated_at = NOW()
+        RETURNING a.id, a.status::VARCHAR, a.created_at::TIMESTAMP WITH TIME ZONE, (a.xmax = 0);
+    ELSE
+        RETURN QUERY
+        INSERT INTO attendance AS a (student_id, class_id, slot_number, day_of_week, attendance_date, status, marked_by)
+        VALUES (p_student_id, p_class_id, p_slot_number, p_day_of_week, p_attendance_date, p_status, p_marked_by)
+        ON CONFLICT (student_id, class_id, slot_number, attendance_date) DO NOTHING
+        RETURNING a.id, a.status::VARCHAR, a.created_at::TIMESTAMP WITH TIME ZONE, TRUE;
+
+        IF NOT FOUND THEN
+            RETURN QUERY
+            SELECT a.id, a.status::VARCHAR, a.created_at::TIMESTAMP WITH TIME ZONE, FALSE
+            FROM attendance a
+            WHERE a.student_id = p_student_id
+            AND a.class_id = p_class_id
+            AND a.slot_number = p_slot_number
+            AND a.attendance_date = p_attendance_date;
+        END IF;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- 3. ENROLLED IMAGE THUMBNAILS
+-- ============================================================================
+-- Blob key of a small thumbnail of enrolled_image_url, filled in by the
+-- backend's thumbnail worker after enrollment.
+
+ALTER TABLE face_encodings ADD COLUMN IF NOT EXISTS thumbnail_key TEXT;
+
+-- ============================================================================
+-- 4. CLASS STUDENT COUNTS
+-- ============================================================================
+-- Approved enrollments per class, kept on the class row so class listings
+-- need no per-class count query.
+
+ALTER TABLE classes ADD COLUMN IF NOT EXISTS student_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION maintain_class_student_count() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'approved' THEN
+        UPDATE classes SET student_count = student_count - 1 WHERE id = OLD.class_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'approved' THEN
+        UPDATE classes SET student_count = student_count + 1 WHERE id = NEW.class_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_maintain_class_student_count ON class_enrollments;
+CREATE TRIGGER trigger_maintain_class_student_count
+    AFTER INSERT OR UPDATE OF status, class_id OR DELETE ON class_enrollments
+    FOR EACH ROW
+    EXECUTE FUNCTION maintain_class_student_count();
+
+-- Backfill (and repair after bulk edits made with triggers disabled)
+UPDATE classes c SET student_count = counts.approved
+FROM (
+    SELECT cl.id, COUNT(e.id) AS approved
+    FROM classes cl
+    LEFT JOIN class_enrollments e ON e.class_id = cl.id AND e.status = 'approved'
+    GROUP BY cl.id
+) counts
+WHERE c.id = counts.id AND c.student_count IS DISTINCT FROM counts.approved;
+
+-- ============================================================================
+-- 5. SINGLE ROUND-TRIP WRITE FLOWS
+-- ============================================================================
+-- Each function performs a whole multi-step write (lookups, checks and the
+-- write itself) in one rpc call. Failures that the API reports to the user
+-- come back as an outcome code rather than an exception.
+-- instant_mark_attendance backs the direct instant path only; with the
+-- attendance write-behind enabled, marks are journaled by the backend after
+-- it resolves the student itself. Outcomes are covered by
+-- backend/tests/test_write_flows_sql.py.
+
+-- Instant-password mark: resolve the student, enroll or approve them in the
+-- class if needed, then record the first mark for the slot.
+-- outcome: marked | already_marked | student_not_found | not_student
+-- enrollment_change: enrolled | approved | NULL
+CREATE OR REPLACE FUNCTION instant_mark_attendance(
+    p_student_firebase_id TEXT,
+    p_class_id INTEGER,
+    p_slot_number INTEGER,
+    p_day_of_week INTEGER,
+    p_attendance_date DATE,
+    p_marked_by VARCHAR(50) DEFAULT 'instant_password'
+) RETURNS TABLE (
+    outcome TEXT,
+    student_id INTEGER,
+    student_name TEXT,
+    enrollment_id INTEGER,
+    enrollment_change TEXT,
+    marked_at TIMESTAMP WITH TIME ZONE
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_student users%ROWTYPE;
+    v_enrollment_id INTEGER;
+    v_enrollment_status VARCHAR(20);
+    v_change TEXT;
+    v_marked_at TIMESTAMP WITH TIME ZONE;
+BEGIN
+    SELECT * INTO v_student FROM users WHERE firebase_id = p_student_firebase_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'student_not_found'::TEXT, NULL::INTEGER, NULL::TEXT, NULL::INTEGER, NULL::TEXT, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    IF v_student.role <> 'student' THEN
+        RETURN QUERY SELECT 'not_student'::TEXT, v_student.id, v_student.name::TEXT, NULL::INTEGER, NULL::TEXT, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    SELECT id, status INTO v_enrollment_id, v_enrollment_status
+    FROM class_enrollments
+    WHERE class_id = p_class_id AND student_id = v_student.id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO class_enrollments (class_id, student_id, status, enrolled_at, approved_at)
+        VALUES (p_class_id, v_student.id, 'approved', NOW(), NOW())
+        ON CONFLICT (class_id, student_id) DO NOTHING
+        RETURNING id INTO v_enrollment_id;
+        v_change := 'enrolled';
+    ELSIF v_enrollment_status <> 'approved' THEN
+        UPDATE class_enrollments SET status = 'approved', approved_at = NOW()
+        WHERE class_id = p_class_id AND student_id = v_student.id;
+        v_change := 'approved';
+    END IF;
+
+    INSERT INTO attendance (student_id, class_id, slot_number, day_of_week, attendance_date, status, marked_by)
+    VALUES (v_student.id, p_class_id, p_slot_number, p_day_of_week, p_attendance_date, 'present', p_marked_by)
+    ON CONFLICT (student_id, class_id, slot_number, attendance_date) DO NOTHING
+    RETURNING created_at INTO v_marked_at;
+
+    IF FOUND THEN
+        RETURN QUERY SELECT 'marked'::TEXT, v_student.id, v_student.name::TEXT, v_enrollment_id, v_change, v_marked_at;
+        RETURN;
+    END IF;
+
+    SELECT a.created_at INTO v_marked_at
+    FROM attendance a
+    WHERE a.student_id = v_student.id
+    AND a.class_id = p_class_id
+    AND a.slot_number = p_slot_number
+    AND a.attendance_date = p_attendance_date;
+
+    RETURN QUERY SELECT 'already_marked'::TEXT, v_student.id, v_student.name::TEXT, v_enrollment_id, v_change, v_marked_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Teacher's manual mark: check the teacher owns the class, resolve the
+-- student and create or overwrite the slot's mark.
+-- outcome: marked | teacher_not_found | unauthorized | student_not_found
+CREATE OR REPLACE FUNCTION manual_mark_attendance(
+    p_teacher_firebase_id TEXT,
+    p_student_firebase_id TEXT,
+    p_class_id INTEGER,
+    p_slot_number INTEGER,
+    p_day_of_week INTEGER,
+    p_attendance_date DATE,
+    p_status VARCHAR(20)
+) RETURNS TABLE (
+    outcome TEXT,
+    student_id INTEGER,
+    student_name TEXT,
+    created BOOLEAN,
+    marked_at TIMESTAMP WITH TIME ZONE
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_teacher_id INTEGER;
+    v_student users%ROWTYPE;
+    v_mark RECORD;
+BEGIN
+    SELECT id INTO v_teacher_id FROM users WHERE firebase_id = p_teacher_firebase_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'teacher_not_found'::TEXT, NULL::INTEGER, NULL::TEXT, NULL::BOOLEAN, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM classes WHERE id = p_class_id AND teacher_id = v_teacher_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'unauthorized'::TEXT, NULL::INTEGER, NULL::TEXT, NULL::BOOLEAN, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    SELECT * INTO v_student FROM users WHERE firebase_id = p_student_firebase_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'student_not_found'::TEXT, NULL::INTEGER, NULL::TEXT, NULL::BOOLEAN, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    SELECT * INTO v_mark FROM upsert_attendance(
+        v_student.id, p_class_id, p_slot_number, p_day_of_week, p_attendance_date, p_status, 'teacher', TRUE
+    );
+
+    RETURN QUERY SELECT 'marked'::TEXT, v_student.id, v_student.name::TEXT, v_mark.created, v_mark.marked_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Student joins a class directly; a pending enrollment is approved.
+-- outcome: joined | approved | already_enrolled | student_not_found |
+--          not_student | class_not_found
+CREATE OR REPLACE FUNCTION join_class(
+    p_student_firebase_id TEXT,
+    p_class_id INTEGER
+) RETURNS TABLE (
+    outcome TEXT,
+    class_name TEXT,
+    enrollment_id INTEGER,
+    student_id INTEGER,
+    status TEXT,
+    enrolled_at TIMESTAMP WITH TIME ZONE,
+    approved_at TIMESTAMP WITH TIME ZONE
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_student users%ROWTYPE;
+    v_class_name TEXT;
+    v_enrollment class_enrollments%ROWTYPE;
+    v_outcome TEXT;
+BEGIN
+    SELECT * INTO v_student FROM users WHERE firebase_id = p_student_firebase_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'student_not_found'::TEXT, NULL::TEXT, NULL::INTEGER, NULL::INTEGER, NULL::TEXT, NULL::TIMESTAMP WITH TIME ZONE, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    IF v_student.role <> 'student' THEN
+        RETURN QUERY SELECT 'not_student'::TEXT, NULL::TEXT, NULL::INTEGER, NULL::INTEGER, NULL::TEXT, NULL::TIMESTAMP WITH TIME ZONE, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    SELECT name INTO v_class_name FROM classes WHERE id = p_class_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'class_not_found'::TEXT, NULL::TEXT, NULL::INTEGER, NULL::INTEGER, NULL::TEXT, NULL::TIMESTAMP WITH TIME ZONE, NULL::TIMESTAMP WITH TIME ZONE;
+        RETURN;
+    END IF;
+
+    INSERT INTO class_enrollments AS e (class_id, student_id, status, enrolled_at, approved_at)
+    VALUES (p_class_id, v_student.id, 'approved', NOW(), NOW())
+    ON CONFLICT (class_id, student_id) DO NOTHING
+    RETURNING e.* INTO v_enrollment;
+
+    IF FOUND THEN
+        v_outcome := 'joined';
+    ELSE
+        UPDATE class_enrollments AS e SET status = 'approved', approved_at = NOW()
+        WHERE e.class_id = p_class_id AND e.student_id = v_student.id AND e.status <> 'approved'
+        RETURNING e.* INTO v_enrollment;
+
+        IF FOUND THEN
+            v_outcome := 'approved';
+        ELSE
+            SELECT e.* INTO v_enrollment FROM class_enrollments e
+            WHERE e.class_id = p_class_id AND e.student_id = v_student.id;
+            v_outcome := 'already_enrolled';
+        END IF;
+    END IF;
+
+    RETURN QUERY SELECT v_outcome, v_class_name, v_enrollment.id, v_enrollment.student_id,
+        v_enrollment.status::TEXT, v_enrollment.enrolled_at, v_enrollment.approved_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Teacher enrolls every student whose roll number is in a range.
+-- outcome: added | teacher_not_found | unauthorized | no_students
+CREATE OR REPLACE FUNCTION add_students_to_class(
+    p_teacher_firebase_id TEXT,
+    p_class_id INTEGER,
+    p_start_student_id TEXT,
+    p_end_student_id TEXT
+) RETURNS TABLE (
+    outcome TEXT,
+    added_count INTEGER,
+    total_eligible INTEGER
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_teacher_id INTEGER;
+    v_eligible INTEGER;
+    v_added INTEGER;
+BEGIN
+    SELECT id INTO v_teacher_id FROM users WHERE firebase_id = p_teacher_firebase_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'teacher_not_found'::TEXT, 0, 0;
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM classes WHERE id = p_class_id AND teacher_id = v_teacher_id;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'unauthorized'::TEXT, 0, 0;
+        RETURN;
+    END IF;
+
+    SELECT COUNT(*) INTO v_eligible
+    FROM users
+    WHERE role = 'student' AND student_id BETWEEN p_start_student_id AND p_end_student_id;
+
+    IF v_eligible = 0 THEN
+        RETURN QUERY SELECT 'no_students'::TEXT, 0, 0;
+        RETURN;
+    END IF;
+
+    INSERT INTO class_enrollments (class_id, student_id, status, approved_at, approved_by)
+    SELECT p_class_id, u.id, 'approved', NOW(), v_teacher_id
+    FROM users u
+    WHERE u.role = 'student' AND u.student_id BETWEEN p_start_student_id AND p_end_student_id
+    ORDER BY u.id
+    ON CONFLICT (class_id, student_id) DO NOTHING;
+
+    GET DIAGNOSTICS v_added = ROW_COUNT;
+
+    RETURN QUERY SELECT 'added'::TEXT, v_added, v_eligible;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- 6. PROFILE PHOTO KEYS
+-- ============================================================================
+-- Light stand-ins for users.profile_photo_url, which can still hold a legacy
+-- inline data: URL. Roster queries select these instead of the photo itself.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS has_profile_photo BOOLEAN
+    GENERATED ALWAYS AS (profile_photo_url IS NOT NULL AND profile_photo_url <> '') STORED;
+
+-- Blob key of the photo; NULL for no photo or a legacy data:/http URL
+ALTER TABLE users ADD COLUMN IF NOT EXISTS profile_photo_key TEXT
+    GENERATED ALWAYS AS (
+        CASE WHEN profile_photo_url ~ '^[0-9a-f]{64}$' THEN profile_photo_url END
+    ) STORED;
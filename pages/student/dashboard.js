@@ -1,7 +1,6 @@
 import { useState, useEffect } from 'react';
 import Layout from '../../src/components/Layout';
 import { useAuth } from '../../src/contexts/AuthContext';
-import { dbHelpers } from '../../src/lib/supabase';
 import { Calendar, Camera, CheckCircle, XCircle, Clock, User, TrendingUp, Award, Target, Timer } from 'lucide-react';
 import Link from 'next/link';
 
@@ -24,42 +23,39 @@ export default function StudentDashboard() {
   useEffect(() => {
     if (userProfile && currentUser) {
       fetchAttendanceData();
-      fetchProfilePhoto();
     }
   }, [userProfile, currentUser]);
 
   async function fetchAttendanceData() {
     try {
-      const today = new Date().toISOString().split('T')[0];
-      const weekAgo = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
-      const monthAgo = new Date(Date.now() - 30 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
-
-      // Get today's attendance - Use Firebase ID (currentUser.uid) instead of database ID
-      const { data: todayData } = await dbHelpers.getAttendanceByUser(currentUser.uid, today, today);
-
-      // Get this week's attendance
-      const { data: weekData } = await dbHelpers.getAttendanceByUser(currentUser.uid, weekAgo, today);
-
-      // Get this month's attendance
-      const { data: monthData } = await dbHelpers.getAttendanceByUser(currentUser.uid, monthAgo, today);
+      // Last 30 days of attendance, server-side totals and the profile photo in one call
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/dashboard/student/${currentUser.uid}`
+      );
+      const result = await response.json();
+      if (!result.success) {
+        throw new Error(result.message);
+      }
 
-      // Calculate stats
-      const presentDays = monthData?.filter(record => record.status === 'present').length || 0;
-      const absentDays = monthData?.filter(record => record.status === 'absent').length || 0;
-      const totalDays = monthData?.length || 0;
-      const percentage = totalDays > 0 ? Math.round((presentDays / totalDays) * 100) : 0;
+      const { student, date, summary, attendance } = result.data;
+      const weekAgo = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
+      const todayRecord = attendance.find(record => record.attendance_date === date);
 
       setAttendanceData({
-        today: todayData?.[0] || null,
-        thisWeek: weekData || [],
-        thisMonth: monthData || [],
+        today: todayRecord ? { ...todayRecord, timestamp: todayRecord.created_at } : null,
+        thisWeek: attendance.filter(record => record.attendance_date >= weekAgo),
+        thisMonth: attendance,
         stats: {
-          present: presentDays,
-          absent: absentDays,
-          total: totalDays,
-          percentage
+          present: summary.month.present,
+          absent: summary.month.absent,
+          total: summary.month.total,
+          percentage: Math.round(summary.month.attendance_percentage)
         }
       });
+
+      if (student.photo_url) {
+        setProfilePhoto(student.photo_url);
+      }
     } catch (error) {
       console.error('Error fetching attendance data:', error);
     } finally {
@@ -67,17 +63,6 @@ export default function StudentDashboard() {
     }
   }
 
-  async function fetchProfilePhoto() {
-    try {
-      const { data } = await dbHelpers.getProfilePhoto(currentUser.uid);
-      if (data && data.profile_photo_url) {
-        setProfilePhoto(data.profile_photo_url);
-      }
-    } catch (error) {
-      console.error('Error fetching profile photo:', error);
-    }
-  }
-
   if (loading) {
     return (
       <Layout>
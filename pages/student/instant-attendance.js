@@ -7,6 +7,11 @@ import toast from 'react-hot-toast';
 import axios from 'axios';
 import { Timer, Key, CheckCircle, AlertCircle, Clock, Camera, ArrowLeft, Shield, Sparkles, Eye, RotateCcw } from 'lucide-react';
 
+// A stored 6-digit password, or a rotating code (<class>-<slot>-<6 digits>)
+function isValidPasswordFormat(value) {
+  return /^\d{6}$/.test(value) || /^\d+-\d+-\d{6}$/.test(value);
+}
+
 export default function StudentInstantAttendance() {
   const { currentUser } = useAuth();
   const webcamRef = useRef(null);
@@ -53,10 +58,10 @@ export default function StudentInstantAttendance() {
       return;
     }
 
-    // Validate password format (should be 6 digits)
+    // Validate password format (6 digits, or a rotating code like 12-1-345678)
     const trimmedPassword = password.trim();
-    if (!/^\d{6}$/.test(trimmedPassword)) {
-      toast.error('Password must be exactly 6 digits');
+    if (!isValidPasswordFormat(trimmedPassword)) {
+      toast.error('Password must be 6 digits or the full rotating code shown by your teacher');
       return;
     }
 
@@ -145,17 +150,22 @@ export default function StudentInstantAttendance() {
       const blob = await response.blob();
       console.log('✅ Image converted to blob, size:', blob.size);
 
-      // Create form data
+      // Create form data; recognition and marking happen in one request
       const formData = new FormData();
       formData.append('image', blob, 'face.jpg');
-      formData.append('user_id', currentUser.uid); // Use Firebase UID
-      console.log('📤 Sending face recognition request for user:', currentUser.uid);
+      formData.append('password', password.trim());
+      formData.append('student_firebase_id', currentUser.uid); // Use Firebase UID
+      if (validatedData.attendance_token) {
+        formData.append('attendance_token', validatedData.attendance_token); // Skips re-checking the enrollment
+      }
+      console.log('📤 Sending recognize-and-mark request for user:', currentUser.uid);
 
-      // Send to face recognition API with timeout
-      console.log('📤 Making API call to:', `${process.env.NEXT_PUBLIC_API_URL}/recognize`);
+      // Send to the recognize-and-mark API with timeout
+      const apiUrl = `${process.env.NEXT_PUBLIC_API_URL}/api/instant-attendance/recognize-and-mark`;
+      console.log('📤 Making API call to:', apiUrl);
       const apiResponse = await Promise.race([
         axios.post(
-          `${process.env.NEXT_PUBLIC_API_URL}/recognize`,
+          apiUrl,
           formData,
           {
             headers: {
@@ -169,65 +179,56 @@ export default function StudentInstantAttendance() {
         )
       ]);
 
-      console.log('📥 Face recognition response:', apiResponse.data);
-
-      if (apiResponse.data.success && apiResponse.data.recognized) {
-        console.log('✅ Face recognized, marking attendance...');
-        // Face recognized, now mark attendance
-        const { data, error } = await dbHelpers.markInstantAttendance(password, currentUser.uid);
-
-        console.log('📥 Attendance marking response:', { data, error });
-
-        if (error) {
-          console.error('❌ Attendance marking failed:', error);
-          let errorMessage = error.message;
-          if (errorMessage.includes('expired')) {
-            errorMessage = 'Password has expired during face recognition. Please ask your teacher for a new one.';
-          } else if (errorMessage.includes('already marked')) {
-            errorMessage = 'Attendance was already marked during face recognition.';
-          }
-
-          toast.error(errorMessage);
-          setLastResult({ success: false, message: errorMessage });
-        } else {
-          console.log('🎉 Attendance marked successfully!');
-          const successMessage = `Attendance marked successfully for ${validatedData.class_name}!`;
-
-          // Show single success toast
-          toast.success(`🎉 ${successMessage}`, {
-            duration: 4000,
-            style: {
-              background: '#10B981',
-              color: 'white',
-              fontWeight: 'bold',
-              padding: '16px',
-              borderRadius: '12px',
-            },
-          });
+      console.log('📥 Recognize-and-mark response:', apiResponse.data);
+      const result = apiResponse.data;
+
+      if (result.success && result.marked) {
+        const data = result.data;
+        console.log('🎉 Attendance marked successfully!');
+        const successMessage = `Attendance marked successfully for ${validatedData.class_name}!`;
+
+        // Show single success toast
+        toast.success(`🎉 ${successMessage}`, {
+          duration: 4000,
+          style: {
+            background: '#10B981',
+            color: 'white',
+            fontWeight: 'bold',
+            padding: '16px',
+            borderRadius: '12px',
+          },
+        });
 
-          setLastResult({
-            success: true,
-            data: { ...data, class_name: validatedData.class_name },
-            message: successMessage
-          });
+        setLastResult({
+          success: true,
+          data: { ...data, class_name: validatedData.class_name },
+          message: successMessage
+        });
 
-          // Reset form after a short delay
-          setTimeout(() => {
-            setPassword('');
-            setStep(1);
-            setValidatedData(null);
-            resetLiveness();
-          }, 2000);
-        }
+        // Reset form after a short delay
+        setTimeout(() => {
+          setPassword('');
+          setStep(1);
+          setValidatedData(null);
+          resetLiveness();
+        }, 2000);
+      } else if (result.recognized) {
+        // Face matched but the mark could not be written
+        console.error('❌ Attendance marking failed:', result.message);
+        toast.error(result.message);
+        setLastResult({ success: false, message: result.message });
       } else {
-        console.log('❌ Face recognition failed:', apiResponse.data);
-        // Face not recognized or liveness check failed
-        let errorMessage = 'Face recognition failed. Please try again.';
+        console.log('❌ Recognize-and-mark rejected:', result);
+        let errorMessage = result.message || 'Face recognition failed. Please try again.';
 
-        if (!apiResponse.data.liveness_check) {
-          errorMessage = apiResponse.data.message || 'Liveness check failed. Please ensure you are a real person.';
-        } else if (!apiResponse.data.recognized) {
+        if (result.liveness_check === false) {
+          errorMessage = result.message || 'Liveness check failed. Please ensure you are a real person.';
+        } else if (result.liveness_check) {
           errorMessage = 'Face not recognized. Please ensure your face is enrolled and try again.';
+        } else if (errorMessage.includes('expired')) {
+          errorMessage = 'Password has expired. Please ask your teacher for a new one.';
+        } else if (errorMessage.includes('already marked')) {
+          errorMessage = 'Attendance was already marked for this class.';
         }
 
         toast.error(errorMessage);
@@ -506,20 +507,20 @@ export default function StudentInstantAttendance() {
                 <input
                   type="text"
                   value={password}
-                  onChange={(e) => setPassword(e.target.value.replace(/\D/g, '').slice(0, 6))}
+                  onChange={(e) => setPassword(e.target.value.replace(/[^\d-]/g, '').slice(0, 24))}
                   className="w-full px-4 py-3 border border-gray-300 rounded-xl text-center text-2xl font-mono tracking-wider focus:ring-2 focus:ring-blue-500 focus:border-transparent"
                   placeholder="000000"
-                  maxLength="6"
+                  maxLength="24"
                   required
                 />
                 <p className="text-xs text-gray-500 mt-1 text-center">
-                  Enter the 6-digit code provided by your teacher
+                  Enter the 6-digit code (or rotating code) provided by your teacher
                 </p>
               </div>
 
               <button
                 type="submit"
-                disabled={isSubmitting || password.length !== 6 || (Date.now() - lastSubmissionTime) < 2000}
+                disabled={isSubmitting || !isValidPasswordFormat(password) || (Date.now() - lastSubmissionTime) < 2000}
                 className="w-full bg-blue-600 hover:bg-blue-700 text-white font-semibold py-3 px-6 rounded-xl transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
               >
                 {isSubmitting ? (
@@ -1,7 +1,6 @@
 import { useState, useEffect } from 'react';
 import Layout from '../../src/components/Layout';
 import { useAuth } from '../../src/contexts/AuthContext';
-import { dbHelpers } from '../../src/lib/supabase';
 import {
   TrendingUp,
   Calendar,
@@ -59,27 +58,19 @@ export default function TeacherAnalytics() {
           startDate = new Date(today.getTime() - 7 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
       }
 
-      // Get teacher's classes and students
-      const { data: teacherClasses } = await dbHelpers.getClassesByTeacher(userProfile.firebase_id);
+      // Aggregation happens server-side; only the summarized series are returned
+      const params = new URLSearchParams({
+        teacher_firebase_id: userProfile.firebase_id,
+        start_date: startDate,
+        end_date: endDate
+      });
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/analytics?${params}`);
+      const result = await response.json();
 
-      // Get students enrolled in teacher's classes
-      let allStudents = [];
-      if (teacherClasses) {
-        for (const classItem of teacherClasses) {
-          const { data: classStudents } = await dbHelpers.getClassStudents(classItem.id);
-          if (classStudents) {
-            allStudents = [...allStudents, ...classStudents];
-          }
-        }
+      if (result.success) {
+        setAnalyticsData(result.data);
       }
 
-      // Get attendance data for teacher's classes only
-      const { data: attendanceData } = await dbHelpers.getAllAttendance(startDate, endDate, userProfile.firebase_id);
-
-      // Process analytics with teacher's data only
-      const analytics = processAnalyticsData(allStudents || [], attendanceData || [], startDate, endDate);
-      setAnalyticsData(analytics);
-
     } catch (error) {
       console.error('Error fetching analytics data:', error);
     } finally {
@@ -87,85 +78,6 @@ export default function TeacherAnalytics() {
     }
   }
 
-  function processAnalyticsData(students, attendanceData, startDate, endDate) {
-    const totalStudents = students.length;
-    
-    // Group attendance by date
-    const attendanceByDate = {};
-    const attendanceByStudent = {};
-
-    attendanceData.forEach(record => {
-      const date = record.attendance_date;
-      const studentId = record.student_id;
-
-      // By date
-      if (!attendanceByDate[date]) {
-        attendanceByDate[date] = { present: 0, total: 0 };
-      }
-      attendanceByDate[date].total++;
-      if (record.status === 'present') {
-        attendanceByDate[date].present++;
-      }
-
-      // By student
-      if (!attendanceByStudent[studentId]) {
-        attendanceByStudent[studentId] = { present: 0, total: 0, name: record.student_name || 'Unknown' };
-      }
-      attendanceByStudent[studentId].total++;
-      if (record.status === 'present') {
-        attendanceByStudent[studentId].present++;
-      }
-    });
-
-    // Calculate weekly stats
-    const weeklyStats = Object.entries(attendanceByDate).map(([date, stats]) => ({
-      date,
-      attendanceRate: totalStudents > 0 ? Math.round((stats.present / totalStudents) * 100) : 0,
-      present: stats.present,
-      absent: totalStudents - stats.present,
-      day: new Date(date).toLocaleDateString('en-US', { weekday: 'short' })
-    })).sort((a, b) => new Date(a.date) - new Date(b.date));
-
-    // Calculate student performance
-    const studentPerformance = Object.entries(attendanceByStudent).map(([studentId, stats]) => ({
-      studentId,
-      name: stats.name,
-      attendanceRate: stats.total > 0 ? Math.round((stats.present / stats.total) * 100) : 0,
-      present: stats.present,
-      total: stats.total,
-      absent: stats.total - stats.present
-    })).sort((a, b) => b.attendanceRate - a.attendanceRate);
-
-    // Calculate overall stats
-    const totalRecords = attendanceData.length;
-    const totalPresent = attendanceData.filter(r => r.status === 'present').length;
-    const averageAttendance = totalRecords > 0 ? Math.round((totalPresent / totalRecords) * 100) : 0;
-
-    // Find best and worst days
-    const dayStats = weeklyStats.reduce((acc, day) => {
-      if (!acc.best || day.attendanceRate > acc.best.attendanceRate) {
-        acc.best = day;
-      }
-      if (!acc.worst || day.attendanceRate < acc.worst.attendanceRate) {
-        acc.worst = day;
-      }
-      return acc;
-    }, {});
-
-    return {
-      weeklyStats,
-      monthlyStats: weeklyStats, // For now, same as weekly
-      studentPerformance,
-      overallStats: {
-        totalStudents,
-        averageAttendance,
-        bestDay: dayStats.best?.day || 'N/A',
-        worstDay: dayStats.worst?.day || 'N/A',
-        totalClasses: Object.keys(attendanceByDate).length
-      }
-    };
-  }
-
   if (loading) {
     return (
       <Layout>
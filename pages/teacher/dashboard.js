@@ -1,7 +1,6 @@
 import { useState, useEffect } from 'react';
 import Layout from '../../src/components/Layout';
 import { useAuth } from '../../src/contexts/AuthContext';
-import { dbHelpers } from '../../src/lib/supabase';
 import { Users, Calendar, CheckCircle, XCircle, TrendingUp, BarChart3, Award, Target } from 'lucide-react';
 import Link from 'next/link';
 
@@ -25,40 +24,22 @@ export default function TeacherDashboard() {
 
   async function fetchDashboardData() {
     try {
-      const today = new Date().toISOString().split('T')[0];
-
-      // Get teacher's classes to calculate total enrolled students
-      const { data: teacherClasses } = await dbHelpers.getClassesByTeacher(userProfile.firebase_id);
-
-      // Get today's attendance for teacher's classes
-      const { data: todayAttendance } = await dbHelpers.getAllAttendance(today, today, userProfile.firebase_id);
-
-      // Get recent attendance (last 7 days) for teacher's classes
-      const weekAgo = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
-      const { data: recentAttendance } = await dbHelpers.getAllAttendance(weekAgo, today, userProfile.firebase_id);
-
-      // Calculate total students enrolled in teacher's classes
-      let totalStudents = 0;
-      if (teacherClasses) {
-        // Use the student_count from the API response
-        totalStudents = teacherClasses.reduce((sum, classItem) => sum + (classItem.student_count || 0), 0);
+      // Classes, today's and this week's totals and recent marks in one call
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/dashboard/teacher/${userProfile.firebase_id}`
+      );
+      const result = await response.json();
+      if (!result.success) {
+        throw new Error(result.message);
       }
 
-      // Calculate stats
-      const todayPresent = todayAttendance?.filter(record => record.status === 'present').length || 0;
-      const todayAbsent = todayAttendance?.filter(record => record.status === 'absent').length || 0;
-
-      // Calculate overall attendance rate for the week
-      const totalRecords = recentAttendance?.length || 0;
-      const presentRecords = recentAttendance?.filter(record => record.status === 'present').length || 0;
-      const attendanceRate = totalRecords > 0 ? Math.round((presentRecords / totalRecords) * 100) : 0;
-
+      const { data } = result;
       setDashboardData({
-        totalStudents,
-        todayPresent,
-        todayAbsent,
-        attendanceRate,
-        recentAttendance: recentAttendance?.slice(0, 10) || [],
+        totalStudents: data.total_students,
+        todayPresent: data.today.present,
+        todayAbsent: data.today.absent,
+        attendanceRate: Math.round(data.week.attendance_percentage),
+        recentAttendance: data.recent_attendance,
         students: [] // Not needed for teacher dashboard
       });
     } catch (error) {
@@ -1,7 +1,6 @@
 import { useState, useEffect } from 'react';
 import Layout from '../../src/components/Layout';
 import { useAuth } from '../../src/contexts/AuthContext';
-import { dbHelpers } from '../../src/lib/supabase';
 import { Users, Search, Eye, X, Camera } from 'lucide-react';
 
 export default function EnrolledImages() {
@@ -10,6 +9,8 @@ export default function EnrolledImages() {
   const [filteredImages, setFilteredImages] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedImage, setSelectedImage] = useState(null);
   const [showImageModal, setShowImageModal] = useState(false);
 
@@ -23,19 +24,24 @@ export default function EnrolledImages() {
     filterImages();
   }, [enrolledImages, searchTerm]);
 
-  async function fetchEnrolledImages() {
+  async function fetchEnrolledImages(cursor = null) {
     try {
-      console.log('Fetching enrolled images...');
-      const { data, error } = await dbHelpers.getAllEnrolledImages();
+      const params = new URLSearchParams({ limit: '48' });
+      if (cursor !== null) {
+        params.set('after', cursor);
+      }
 
-      console.log('Enrolled images response:', { data, error });
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/all-enrolled-images?${params}`);
+      const result = await response.json();
 
-      if (error) {
-        console.error('Error fetching enrolled images:', error);
+      if (!result.success) {
+        console.error('Error fetching enrolled images:', result.message);
         return;
       }
 
-      setEnrolledImages(data || []);
+      const page = result.enrolled_images || [];
+      setEnrolledImages(previous => (cursor === null ? page : [...previous, ...page]));
+      setNextCursor(result.next_cursor);
     } catch (error) {
       console.error('Error fetching enrolled images:', error);
     } finally {
@@ -43,6 +49,12 @@ export default function EnrolledImages() {
     }
   }
 
+  async function loadMore() {
+    setLoadingMore(true);
+    await fetchEnrolledImages(nextCursor);
+    setLoadingMore(false);
+  }
+
   function filterImages() {
     if (!searchTerm) {
       setFilteredImages(enrolledImages);
@@ -88,7 +100,7 @@ export default function EnrolledImages() {
             <p className="text-gray-600">View all student enrolled face images</p>
           </div>
           <div className="text-sm text-gray-600">
-            Total Enrolled: <span className="font-semibold">{enrolledImages.length}</span>
+            Loaded: <span className="font-semibold">{enrolledImages.length}</span>
           </div>
         </div>
 
@@ -121,8 +133,9 @@ export default function EnrolledImages() {
                 <div key={student.firebase_id} className="border border-gray-200 rounded-lg p-4 hover:shadow-md transition-shadow">
                   <div className="text-center">
                     <img 
-                      src={student.enrolled_image_url} 
+                      src={student.thumbnail_url || student.enrolled_image_url} 
                       alt={student.name}
+                      loading="lazy"
                       className="w-24 h-24 rounded-full object-cover border-2 border-gray-200 mx-auto mb-3"
                     />
                     <h3 className="font-medium text-gray-900 mb-1">{student.name}</h3>
@@ -150,6 +163,18 @@ export default function EnrolledImages() {
               </p>
             </div>
           )}
+
+          {nextCursor !== null && (
+            <div className="text-center mt-6">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-4 py-2 text-sm text-blue-600 hover:text-blue-700 hover:bg-blue-50 rounded-lg transition-colors"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
 
         {/* Image Modal */}
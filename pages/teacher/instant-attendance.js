@@ -13,6 +13,10 @@ export default function InstantAttendance() {
   const [passwordExpiry, setPasswordExpiry] = useState(null);
   const [timeRemaining, setTimeRemaining] = useState(0);
   const [attendanceData, setAttendanceData] = useState([]);
+  const [liveAttendance, setLiveAttendance] = useState(null);
+  const [useRotatingCode, setUseRotatingCode] = useState(false);
+  const [rotatesEvery, setRotatesEvery] = useState(0);
+  const [feedPassword, setFeedPassword] = useState('');
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -36,6 +40,7 @@ export default function InstantAttendance() {
             invalidatePassword(instantPassword);
           }
           setInstantPassword('');
+          setFeedPassword('');
           setPasswordExpiry(null);
           toast('Instant password has expired', { icon: 'ℹ️' });
         }
@@ -47,6 +52,77 @@ export default function InstantAttendance() {
     };
   }, [passwordExpiry]);
 
+  // Rotating codes change every few seconds; keep the displayed one current
+  useEffect(() => {
+    let interval;
+    if (rotatesEvery && selectedClass && currentUser) {
+      interval = setInterval(async () => {
+        try {
+          const response = await fetch(
+            `${process.env.NEXT_PUBLIC_API_URL}/api/instant-password/rotating/${selectedClass.id}/current?slot_number=1&teacher_firebase_id=${currentUser.uid}`
+          );
+          const result = await response.json();
+          if (result.success) {
+            setInstantPassword(result.data.password);
+          }
+        } catch (error) {
+          console.error('Error refreshing rotating code:', error);
+        }
+      }, Math.max(1000, (rotatesEvery * 1000) / 3));
+    }
+
+    return () => {
+      if (interval) clearInterval(interval);
+    };
+  }, [rotatesEvery, selectedClass, currentUser]);
+
+  // Live feed of marks for the active session. A rotating session's feed is
+  // keyed on the class, so reconnects keep working after its codes rotate.
+  useEffect(() => {
+    if (!feedPassword || !currentUser) {
+      setLiveAttendance(null);
+      return;
+    }
+
+    const feedUrl = rotatesEvery && selectedClass
+      ? `${process.env.NEXT_PUBLIC_API_URL}/api/instant-password/rotating/${selectedClass.id}/events?slot_number=1&teacher_firebase_id=${currentUser.uid}`
+      : `${process.env.NEXT_PUBLIC_API_URL}/api/instant-password/${feedPassword}/events?teacher_firebase_id=${currentUser.uid}`;
+    const source = new EventSource(feedUrl);
+
+    source.addEventListener('snapshot', (event) => {
+      const snapshot = JSON.parse(event.data);
+      setLiveAttendance({
+        present: snapshot.present,
+        total: snapshot.total,
+        marks: snapshot.marks.slice().reverse()
+      });
+    });
+
+    source.addEventListener('mark', (event) => {
+      const mark = JSON.parse(event.data);
+      setLiveAttendance((current) => ({
+        present: mark.present,
+        total: mark.total,
+        marks: [mark, ...((current && current.marks) || [])]
+      }));
+    });
+
+    source.addEventListener('expired', () => {
+      source.close();
+    });
+
+    source.onerror = () => {
+      // A refused feed (expired session, wrong teacher) is not retried
+      if (source.readyState === EventSource.CLOSED) {
+        console.error('Live attendance feed closed');
+      }
+    };
+
+    return () => {
+      source.close();
+    };
+  }, [feedPassword, rotatesEvery, selectedClass, currentUser]);
+
   async function fetchClasses() {
     try {
       const { data, error } = await dbHelpers.getClassesByTeacher(currentUser.uid);
@@ -69,6 +145,11 @@ export default function InstantAttendance() {
       return;
     }
 
+    if (useRotatingCode) {
+      await generateRotatingCode();
+      return;
+    }
+
     try {
       // Call backend API to generate password
       const { data, error } = await dbHelpers.generateInstantPassword(
@@ -86,6 +167,8 @@ export default function InstantAttendance() {
         const expiry = new Date(data.expires_at).getTime();
 
         setInstantPassword(data.password);
+        setFeedPassword(data.password);
+        setRotatesEvery(0);
         setPasswordExpiry(expiry);
         setTimeRemaining(expiry - new Date().getTime());
 
@@ -99,6 +182,36 @@ export default function InstantAttendance() {
     }
   }
 
+  async function generateRotatingCode() {
+    try {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/instant-password/generate`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          class_id: selectedClass.id,
+          slot_number: 1, // slot number (default to 1)
+          teacher_firebase_id: currentUser.uid,
+          mode: 'rotating'
+        })
+      });
+      const result = await response.json();
+
+      if (!result.success) {
+        toast.error(result.message || 'Failed to generate rotating code');
+        return;
+      }
+
+      setInstantPassword(result.data.password);
+      setFeedPassword(result.data.password);
+      setRotatesEvery(result.data.rotates_every);
+      setPasswordExpiry(null);
+      toast.success(`Rotating code started! It changes every ${result.data.rotates_every} seconds.`);
+    } catch (error) {
+      console.error('Error generating rotating code:', error);
+      toast.error('Failed to generate rotating code. Please try again.');
+    }
+  }
+
   function copyPassword() {
     if (instantPassword) {
       navigator.clipboard.writeText(instantPassword);
@@ -286,6 +399,14 @@ export default function InstantAttendance() {
                 <p className="text-gray-600 mb-6">
                   Create a 6-digit password that students can use to mark attendance for the next 3 minutes
                 </p>
+                <label className="flex items-center justify-center space-x-2 text-sm text-gray-700 mb-6">
+                  <input
+                    type="checkbox"
+                    checked={useRotatingCode}
+                    onChange={(e) => setUseRotatingCode(e.target.checked)}
+                  />
+                  <span>Use a rotating code (changes every few seconds, harder to share)</span>
+                </label>
                 <button
                   onClick={generateInstantPassword}
                   className="bg-green-600 hover:bg-green-700 text-white font-semibold py-3 px-6 rounded-xl transition-colors"
@@ -310,17 +431,50 @@ export default function InstantAttendance() {
                     </button>
                     <div className="text-green-700 font-medium">
                       <Clock className="h-4 w-4 mr-1 inline" />
-                      {formatTime(timeRemaining)} remaining
+                      {rotatesEvery ? `Changes every ${rotatesEvery}s` : `${formatTime(timeRemaining)} remaining`}
                     </div>
                   </div>
-                  <div className="w-full bg-green-200 rounded-full h-2">
-                    <div 
-                      className="bg-green-600 h-2 rounded-full transition-all duration-1000"
-                      style={{ width: `${(timeRemaining / (3 * 60 * 1000)) * 100}%` }}
-                    ></div>
-                  </div>
+                  {!rotatesEvery && (
+                    <div className="w-full bg-green-200 rounded-full h-2">
+                      <div 
+                        className="bg-green-600 h-2 rounded-full transition-all duration-1000"
+                        style={{ width: `${(timeRemaining / (3 * 60 * 1000)) * 100}%` }}
+                      ></div>
+                    </div>
+                  )}
                 </div>
                 
+                {liveAttendance && (
+                  <div className="bg-gray-50 border border-gray-200 rounded-2xl p-6 mb-6 text-left">
+                    <div className="flex items-center justify-between mb-3">
+                      <h3 className="text-lg font-semibold text-gray-900">
+                        <Users className="h-5 w-5 mr-2 inline" />
+                        Live Attendance
+                      </h3>
+                      <span className="text-green-700 font-bold">
+                        {liveAttendance.present} / {liveAttendance.total} present
+                      </span>
+                    </div>
+                    {liveAttendance.marks.length === 0 ? (
+                      <p className="text-gray-500 text-sm">Waiting for students to mark attendance...</p>
+                    ) : (
+                      <div className="space-y-2 max-h-48 overflow-y-auto">
+                        {liveAttendance.marks.map((mark) => (
+                          <div key={mark.student_id} className="flex items-center justify-between text-sm">
+                            <span className="text-gray-900">
+                              <CheckCircle className="h-4 w-4 mr-1 inline text-green-600" />
+                              {mark.student_name}
+                            </span>
+                            <span className="text-gray-500">
+                              {new Date(mark.marked_at).toLocaleTimeString()}
+                            </span>
+                          </div>
+                        ))}
+                      </div>
+                    )}
+                  </div>
+                )}
+
                 <div className="flex space-x-4 justify-center">
                   <button
                     onClick={generateInstantPassword}
@@ -336,6 +490,8 @@ export default function InstantAttendance() {
                         await invalidatePassword(instantPassword);
                       }
                       setInstantPassword('');
+                      setFeedPassword('');
+                      setRotatesEvery(0);
                       setPasswordExpiry(null);
                       setTimeRemaining(0);
                       toast.success('Session stopped and password invalidated');
@@ -1,7 +1,6 @@
 import { useState, useEffect } from 'react';
 import Layout from '../../src/components/Layout';
 import { useAuth } from '../../src/contexts/AuthContext';
-import { dbHelpers } from '../../src/lib/supabase';
 import { Users, Search, CheckCircle, XCircle, Calendar, User, Eye, X, UserCheck, Filter } from 'lucide-react';
 
 export default function ManageStudents() {
@@ -27,61 +26,42 @@ export default function ManageStudents() {
 
   async function fetchStudents() {
     try {
-      // Get students enrolled in teacher's classes
-      const { data: teacherClasses } = await dbHelpers.getClassesByTeacher(userProfile.firebase_id);
-
-      let allStudents = [];
-      if (teacherClasses) {
-        for (const classItem of teacherClasses) {
-          const { data: classStudents } = await dbHelpers.getClassStudents(classItem.id);
-          if (classStudents) {
-            // Add class info to each student
-            const studentsWithClass = classStudents.map(student => ({
-              ...student,
-              class_name: classItem.name,
-              class_id: classItem.id
-            }));
-            allStudents = [...allStudents, ...studentsWithClass];
-          }
-        }
+      // Roster, today's attendance and photo thumbnails for all of the teacher's classes in one call
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/dashboard/teacher/${userProfile.firebase_id}`
+      );
+      const result = await response.json();
+      if (!result.success) {
+        throw new Error(result.message);
       }
 
+      const allStudents = result.data.students;
       setStudents(allStudents);
 
-      // Get today's attendance for teacher's classes
-      const today = new Date().toISOString().split('T')[0];
-      const { data: todayAttendance } = await dbHelpers.getAllAttendance(today, today, userProfile.firebase_id);
-
       // Create attendance lookup by student_id and class_id
       const attendanceLookup = {};
-      todayAttendance?.forEach(record => {
-        const key = `${record.student_id}_${record.class_id}`;
-        attendanceLookup[key] = record;
+      const photoLookup = {};
+      allStudents.forEach(student => {
+        if (student.today) {
+          attendanceLookup[`${student.id}_${student.class_id}`] = {
+            status: student.today.status,
+            created_at: student.today.marked_at
+          };
+        }
+        photoLookup[student.id] = student.thumbnail_url || student.photo_url;
       });
 
-        setAttendanceData(attendanceLookup);
+      setAttendanceData(attendanceLookup);
+      setProfilePhotos(photoLookup);
 
-        // Fetch profile photos for all students
-        const photoPromises = allStudents.map(async (student) => {
-          try {
-            const { data } = await dbHelpers.getProfilePhoto(student.firebase_id);
-            return {
-              id: student.id,
-              photo: data?.profile_photo_url || null
-            };
-          } catch (error) {
-            console.error(`Error fetching photo for ${student.name}:`, error);
-            return { id: student.id, photo: null };
-          }
-        });
-
-        const photoResults = await Promise.all(photoPromises);
-        const photoLookup = {};
-        photoResults.forEach(result => {
-          photoLookup[result.id] = result.photo;
-        });
-
-        setProfilePhotos(photoLookup);
+      // Photos not yet moved to the blob store are left out of the dashboard;
+      // fetch those few through the batched profile-photos endpoint
+      const legacyPhotoIds = [...new Set(
+        allStudents.filter(student => student.has_photo && !photoLookup[student.id]).map(student => student.firebase_id)
+      )];
+      if (legacyPhotoIds.length > 0) {
+        fetchLegacyPhotos(allStudents, legacyPhotoIds);
+      }
     } catch (error) {
       console.error('Error fetching students:', error);
     } finally {
@@ -89,6 +69,29 @@ export default function ManageStudents() {
     }
   }
 
+  async function fetchLegacyPhotos(allStudents, firebaseIds) {
+    try {
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/profile-photos?firebase_ids=${encodeURIComponent(firebaseIds.join(','))}`
+      );
+      const result = await response.json();
+      if (!result.success) {
+        throw new Error(result.message);
+      }
+
+      const legacyLookup = {};
+      allStudents.forEach(student => {
+        const photo = result.photos[student.firebase_id];
+        if (photo) {
+          legacyLookup[student.id] = photo.thumbnail_data_url || photo.thumbnail_url || photo.photo_url;
+        }
+      });
+      setProfilePhotos(current => ({ ...current, ...legacyLookup }));
+    } catch (error) {
+      console.error('Error fetching profile photos:', error);
+    }
+  }
+
   function filterStudents() {
     if (!searchTerm) {
       setFilteredStudents(students);